@@ -3,21 +3,37 @@ import { parseIcs, summarizeSchedule } from "./utils/ics";
 
 const WS_URL = import.meta.env.VITE_WS_URL || "ws://localhost:8765";
 const tabs = ["Status", "Conversation", "Core Info", "Highlights", "Calendar"];
+const HIGHLIGHTS_PAGE = 50;
 
-function useWebSocketClient(onContextSnapshot) {
+const mapHighlights = (items) =>
+  items.map((h) => ({
+    start_at: h.start_at || "",
+    stop_at: h.stop_at || "",
+    highlight: h.highlight || h,
+  }));
+
+function useWebSocketClient(onContextSnapshot, onHighlightsPage) {
   const [status, setStatus] = useState("disconnected");
   const [messages, setMessages] = useState([]);
   const [options, setOptions] = useState([]);
   const [lastSelected, setLastSelected] = useState(null);
   const [conversationLog, setConversationLog] = useState([]);
   const wsRef = React.useRef(null);
+  // Section versions from the last snapshot; the server only resends sections that changed.
+  const versionsRef = React.useRef({});
 
   useEffect(() => {
     const ws = new WebSocket(WS_URL);
     wsRef.current = ws;
     ws.onopen = () => {
       setStatus("connected");
-      ws.send(JSON.stringify({ type: "get_context" }));
+      ws.send(
+        JSON.stringify({
+          type: "get_context",
+          versions: versionsRef.current,
+          highlights_limit: HIGHLIGHTS_PAGE,
+        })
+      );
     };
     ws.onclose = () => setStatus("disconnected");
     ws.onerror = () => setStatus("error");
@@ -30,8 +46,13 @@ function useWebSocketClient(onContextSnapshot) {
         } else if (data.type === "selected") {
           setLastSelected(data.data);
           setConversationLog((prev) => [...prev, { role: "assistant", text: data.data }]);
-        } else if (data.type === "context_snapshot" && onContextSnapshot) {
-          onContextSnapshot(data);
+        } else if (data.type === "context_snapshot") {
+          versionsRef.current = data.versions || {};
+          if (onContextSnapshot) onContextSnapshot(data);
+        } else if (data.type === "context_not_modified") {
+          versionsRef.current = data.versions || versionsRef.current;
+        } else if (data.type === "highlights_page" && onHighlightsPage) {
+          onHighlightsPage(data);
         } else if (data.type === "conversation_highlight" && typeof data.data === "string") {
           setMessages((prev) => [...prev, { type: "conversation_highlight", data: data.data }]);
         }
@@ -40,7 +61,7 @@ function useWebSocketClient(onContextSnapshot) {
       }
     };
     return () => ws.close();
-  }, [onContextSnapshot]);
+  }, [onContextSnapshot, onHighlightsPage]);
 
   const send = (payload) => {
     const ws = wsRef.current;
@@ -71,6 +92,7 @@ function useWebSocketClient(onContextSnapshot) {
 function App() {
   const [coreLines, setCoreLines] = useState([]);
   const [highlights, setHighlights] = useState([]);
+  const [highlightsTotal, setHighlightsTotal] = useState(0);
   const [newLine, setNewLine] = useState("");
   const [newHighlight, setNewHighlight] = useState("");
   const [icsEvents, setIcsEvents] = useState([]);
@@ -85,12 +107,10 @@ function App() {
   const onContextSnapshot = React.useCallback((data) => {
     if (Array.isArray(data.core)) setCoreLines(data.core);
     if (Array.isArray(data.highlights)) {
-      const mapped = data.highlights.map((h) => ({
-        start_at: h.start_at || "",
-        stop_at: h.stop_at || "",
-        highlight: h.highlight || h,
-      }));
-      setHighlights(mapped);
+      setHighlights(mapHighlights(data.highlights));
+      setHighlightsTotal(
+        typeof data.highlights_total === "number" ? data.highlights_total : data.highlights.length
+      );
     }
     if (Array.isArray(data.events)) {
       const evs = data.events
@@ -115,8 +135,21 @@ function App() {
     }
   }, []);
 
+  const onHighlightsPage = React.useCallback((data) => {
+    if (!Array.isArray(data.data)) return;
+    setHighlights((prev) => [...prev.slice(0, data.offset), ...mapHighlights(data.data)]);
+    setHighlightsTotal(data.total);
+  }, []);
+
   const { status, messages, options, lastSelected, send, conversationLog, appendUserSpeech } =
-    useWebSocketClient(onContextSnapshot);
+    useWebSocketClient(onContextSnapshot, onHighlightsPage);
+
+  const loadMoreHighlights = () =>
+    send({ type: "get_highlights", offset: highlights.length, limit: HIGHLIGHTS_PAGE });
+  // The list is a slice of the server's; after an edit, reload that slice rather than patching it.
+  // The server handles a connection's messages in order, so this page already reflects the edit.
+  const reloadHighlights = (count) =>
+    send({ type: "get_highlights", offset: 0, limit: Math.max(count, HIGHLIGHTS_PAGE) });
 
   const startConversation = () => send({ type: "start_conversation" });
   const stopConversation = () => send({ type: "stop_conversation" });
@@ -136,15 +169,10 @@ function App() {
   };
   const addHighlight = () => {
     if (!newHighlight.trim()) return;
-    const newEntry = {
-      start_at: new Date().toISOString(),
-      stop_at: new Date().toISOString(),
-      highlight: newHighlight.trim(),
-    };
-    const updated = [...highlights, newEntry];
-    setHighlights(updated);
     send({ type: "add_highlight", data: newHighlight.trim() });
     setNewHighlight("");
+    // The server appends after all entries; show the new one if the whole list is loaded.
+    reloadHighlights(highlights.length + (highlights.length >= highlightsTotal ? 1 : 0));
   };
 
   const deleteCore = (i) => {
@@ -152,12 +180,13 @@ function App() {
     setCoreLines(updated);
     send({ type: "set_core_context", data: updated });
   };
-  const deleteHighlight = (i) =>
-    setHighlights((prev) => {
-      const updated = prev.filter((_, idx) => idx !== i);
-      send({ type: "delete_highlight", data: i });
-      return updated;
-    });
+  const deleteHighlight = (i) => {
+    const entry = highlights[i];
+    if (!entry) return;
+    const key = entry.start_at ? { start_at: entry.start_at, highlight: entry.highlight } : {};
+    send({ type: "delete_highlight", data: i, ...key });
+    reloadHighlights(highlights.length);
+  };
 
   const onIcsUpload = (e) => {
     const file = e.target.files?.[0];
@@ -323,6 +352,11 @@ function App() {
                 </li>
               ))}
             </ul>
+            {highlights.length < highlightsTotal && (
+              <button onClick={loadMoreHighlights}>
+                Load more ({highlightsTotal - highlights.length} remaining)
+              </button>
+            )}
           </section>
         )}
 
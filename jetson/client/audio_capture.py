@@ -0,0 +1,174 @@
+"""
+Callback-driven microphone capture into a lock-free ring buffer of frames.
+
+The sounddevice/PortAudio callback thread writes fixed-size int16 frames into
+a preallocated ring; readers (VAD/segmentation) consume them at their own
+pace. Capture never stops while the consumer is busy transcribing or
+sending, so speech onset is not lost to gaps between utterances.
+"""
+
+import threading
+import time
+
+import numpy as np
+
+
+class FrameRingBuffer:
+    """
+    Single-producer ring of fixed-size int16 frames.
+
+    The producer fills a slot and only then advances `write_seq`; each reader
+    keeps its own sequence number. Integer assignment is atomic under the GIL,
+    so no lock is needed. A reader that falls more than `capacity` frames
+    behind skips ahead and counts the overrun.
+    """
+
+    def __init__(self, frame_samples: int, capacity: int):
+        self.frame_samples = frame_samples
+        self.capacity = capacity
+        self._frames = np.zeros((capacity, frame_samples), dtype=np.int16)
+        self._times = np.zeros(capacity, dtype=np.float64)
+        self.write_seq = 0
+        self._data_ready = threading.Event()
+
+    def write(self, frame: np.ndarray, timestamp: float | None = None):
+        slot = self.write_seq % self.capacity
+        self._frames[slot] = frame
+        self._times[slot] = time.monotonic() if timestamp is None else timestamp
+        self.write_seq += 1
+        self._data_ready.set()
+
+    def reader(self, from_latest: bool = True) -> "FrameReader":
+        start = self.write_seq if from_latest else max(0, self.write_seq - self.capacity)
+        return FrameReader(self, start)
+
+
+class FrameReader:
+    """Independent read cursor over a FrameRingBuffer."""
+
+    def __init__(self, ring: FrameRingBuffer, seq: int):
+        self.ring = ring
+        self.seq = seq
+        self.dropped = 0
+        self.last_time = 0.0
+
+    def available(self) -> int:
+        return self.ring.write_seq - self.seq
+
+    def skip_to_latest(self):
+        self.seq = self.ring.write_seq
+
+    def _wait(self, timeout: float | None) -> bool:
+        ring = self.ring
+        if self.seq < ring.write_seq:
+            return True
+        ring._data_ready.clear()
+        if self.seq < ring.write_seq:
+            return True
+        return ring._data_ready.wait(timeout) and self.seq < ring.write_seq
+
+    def read_block(self, max_frames: int, timeout: float | None = None) -> tuple[np.ndarray, np.ndarray] | None:
+        """
+        Return up to max_frames pending frames as an (n, frame_samples) array
+        plus their capture times, or None if nothing arrived within timeout.
+        """
+        ring = self.ring
+        while True:
+            if not self._wait(timeout):
+                return None
+            end = ring.write_seq
+            if end - self.seq > ring.capacity:
+                self.dropped += end - self.seq - ring.capacity
+                self.seq = end - ring.capacity
+            end = min(end, self.seq + max_frames)
+            slots = np.arange(self.seq, end) % ring.capacity
+            frames = ring._frames[slots]
+            times = ring._times[slots]
+            if ring.write_seq - self.seq > ring.capacity:
+                continue
+            self.seq = end
+            self.last_time = float(times[-1])
+            return frames, times
+
+    def read(self, timeout: float | None = None) -> bytes | None:
+        """Return the next frame as bytes, or None if none arrived within timeout."""
+        ring = self.ring
+        while True:
+            if not self._wait(timeout):
+                return None
+            lag = ring.write_seq - self.seq
+            if lag > ring.capacity:
+                self.dropped += lag - ring.capacity
+                self.seq = ring.write_seq - ring.capacity
+            slot = self.seq % ring.capacity
+            frame = ring._frames[slot].tobytes()
+            self.last_time = float(ring._times[slot])
+            # The producer may have lapped us while copying; if so, retry from the new tail.
+            if ring.write_seq - self.seq > ring.capacity:
+                continue
+            self.seq += 1
+            return frame
+
+
+class MicCapture:
+    """Owns the input stream; its callback thread feeds the ring buffer."""
+
+    def __init__(
+        self,
+        sample_rate: int = 16000,
+        frame_ms: int = 30,
+        device=None,
+        buffer_seconds: float = 30.0,
+    ):
+        self.sample_rate = sample_rate
+        self.frame_samples = int(sample_rate * frame_ms / 1000)
+        capacity = max(1, int(buffer_seconds * 1000 / frame_ms))
+        self.ring = FrameRingBuffer(self.frame_samples, capacity)
+        self.device = device
+        self.status_errors = 0
+        self._carry = np.zeros(0, dtype=np.int16)
+        self._stream = None
+
+    def _callback(self, indata, frames, time_info, status):
+        if status:
+            self.status_errors += 1
+        samples = np.frombuffer(indata, dtype=np.int16)
+        if self._carry.size:
+            samples = np.concatenate((self._carry, samples))
+        n = self.frame_samples
+        full = samples.size // n
+        now = time.monotonic()
+        for i in range(full):
+            self.ring.write(samples[i * n:(i + 1) * n], now)
+        self._carry = samples[full * n:].copy()
+
+    def start(self):
+        import sounddevice as sd  # lazy import; not needed if using --file
+
+        if self._stream is not None:
+            return
+        self._stream = sd.RawInputStream(
+            samplerate=self.sample_rate,
+            blocksize=self.frame_samples,
+            device=self.device,
+            dtype="int16",
+            channels=1,
+            callback=self._callback,
+        )
+        self._stream.start()
+
+    def stop(self):
+        if self._stream is None:
+            return
+        try:
+            self._stream.stop()
+            self._stream.close()
+        finally:
+            self._stream = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
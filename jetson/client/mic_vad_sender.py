@@ -9,10 +9,23 @@ Dependencies:
 Environment:
     OPENAI_API_KEY   # for Whisper STT
     WS_URL           # ws://<server>:8765 (defaults below)
+    STT_BACKEND      # auto (default), cloud or local (PocketSphinx)
+    STT_LATENCY_BUDGET  # seconds; above this auto mode may switch to local STT
+
+Usage:
+    python -m jetson.client.mic_vad_sender --ws ws://<server>:8765
 
 Notes:
     - This runs locally on the Pi/Jetson, not on the server.
     - Audio is captured mono, 16 kHz. Adjust DEVICE_INDEX if needed.
+    - Capture runs continuously on the audio callback thread into a ring
+      buffer; VAD/segmentation reads from it in a worker thread, so the
+      event loop never blocks and no audio is lost between utterances.
+    - Transcription runs as an async task on a long-lived client with
+      in-memory WAV buffers, overlapping with capture of the next utterance.
+    - Transcripts go through a reconnecting transport: they are queued while
+      the link is down, reconnects back off with jitter from ~50 ms, and the
+      paused/listening state is restored from the server on every reconnect.
 """
 
 import argparse
@@ -20,13 +33,15 @@ import asyncio
 import collections
 import json
 import os
-import tempfile
 import time
-import wave
 
+import numpy as np
 import websockets
-import webrtcvad
-from openai import OpenAI
+
+from jetson.client.audio_capture import MicCapture
+from jetson.client.segmenter import EnergyGate, StreamingSegmenter
+from jetson.client.transport import PAUSE_TIMEOUT, ReconnectingSender
+from jetson.context.transcription import build_engine, read_wav_pcm
 
 WS_URL = os.getenv("WS_URL", "ws://localhost:8765")
 SAMPLE_RATE = 16000
@@ -34,66 +49,28 @@ FRAME_DURATION_MS = 30  # 10, 20, or 30 ms
 DEVICE_INDEX = None  # set to an integer device id if needed
 VAD_AGGRESSIVENESS = 2  # 0-3
 MIN_SPEECH_FRAMES = 5  # minimum voiced frames (~150ms at 30ms frames)
-PAUSE_TIMEOUT = 15.0  # seconds to auto-resume if no tts_done arrives
-
-
-def frame_generator(frame_duration_ms, audio, sample_rate):
-    n = int(sample_rate * frame_duration_ms / 1000) * 2  # 16-bit mono
-    for i in range(0, len(audio), n):
-        yield audio[i : i + n]
+CAPTURE_BUFFER_SECONDS = 30.0  # ring buffer size; audio older than this is dropped
+PRE_ROLL_MS = 300  # audio kept from before speech onset so first syllables are not clipped
+MIN_SILENCE = 0.3  # end-of-speech window for short replies (seconds)
+MAX_SILENCE = 1.2  # upper bound of the adaptive end-of-speech window (seconds)
+MAX_UTTERANCE = 15.0  # force an endpoint after this many seconds
 
 
 def vad_collect(audio_bytes, vad, frame_duration_ms):
-    frames = list(frame_generator(frame_duration_ms, audio_bytes, SAMPLE_RATE))
-    voiced = []
-    for f in frames:
-        if len(f) < int(SAMPLE_RATE * frame_duration_ms / 1000) * 2:
-            continue
-        if vad.is_speech(f, SAMPLE_RATE):
-            voiced.append(f)
-    return b"".join(frames) if len(voiced) >= MIN_SPEECH_FRAMES else b""
-
-
-def record_utterance(timeout=5.0, silence_timeout=1.0):
-    import sounddevice as sd  # lazy import; not needed if using --file
-    vad = webrtcvad.Vad(VAD_AGGRESSIVENESS)
-    buffer = []
-    silent_for = 0.0
-    total_time = 0.0
-    frame_size = int(SAMPLE_RATE * FRAME_DURATION_MS / 1000)
-    speech_frames = 0
-
-    with sd.RawInputStream(
-        samplerate=SAMPLE_RATE,
-        blocksize=frame_size,
-        device=DEVICE_INDEX,
-        dtype="int16",
-        channels=1,
-    ) as stream:
-        while total_time < timeout:
-            chunk, _ = stream.read(frame_size)
-            buffer.append(chunk)
-            total_time += FRAME_DURATION_MS / 1000
-            if not vad.is_speech(chunk, SAMPLE_RATE):
-                silent_for += FRAME_DURATION_MS / 1000
-            else:
-                speech_frames += 1
-                silent_for = 0.0
-            if silent_for >= silence_timeout and total_time > 0.5:
-                break
-    if speech_frames < MIN_SPEECH_FRAMES:
-        return b""
-    return b"".join(buffer)
-
-
-def transcribe_wav(path: str) -> str:
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key:
-        raise RuntimeError("Set OPENAI_API_KEY for Whisper STT.")
-    client = OpenAI(api_key=api_key)
-    with open(path, "rb") as f:
-        resp = client.audio.transcriptions.create(model="whisper-1", file=f, language="en")
-    return resp.text.strip()
+    frame_samples = int(SAMPLE_RATE * frame_duration_ms / 1000)
+    samples = np.frombuffer(audio_bytes, dtype=np.int16)
+    frames = samples[: samples.size // frame_samples * frame_samples].reshape(-1, frame_samples)
+    # Only frames that clear the energy gate are worth a VAD call; stop once enough are voiced.
+    gate = EnergyGate()
+    energies = gate.energies_db(frames)
+    gate.update(energies)
+    voiced = 0
+    for i in np.flatnonzero(gate.candidates(energies)):
+        if vad.is_speech(frames[i].tobytes(), SAMPLE_RATE):
+            voiced += 1
+            if voiced >= MIN_SPEECH_FRAMES:
+                return audio_bytes
+    return b""
 
 
 async def send_audio_data(text: str, url: str | None = None):
@@ -120,19 +97,13 @@ async def main():
 
     paused = False
     last_send_ts = 0.0
+    backend = build_engine()
 
-    async def process_audio(raw_bytes):
-        with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as tmp:
-            wav_path = tmp.name
-            with wave.open(wav_path, "wb") as wf:
-                wf.setnchannels(1)
-                wf.setsampwidth(2)
-                wf.setframerate(SAMPLE_RATE)
-                wf.writeframes(raw_bytes)
+    async def process_audio(raw_bytes, sample_rate=SAMPLE_RATE):
         try:
-            text = transcribe_wav(wav_path)
+            text, used, latency = await backend.transcribe_timed(raw_bytes, sample_rate)
             if text and len(text.strip()) >= 3:
-                print(f"Transcribed: {text}")
+                print(f"Transcribed ({used}, {latency:.2f}s): {text}")
                 if not args.no_send:
                     return await send_audio_data(text, url=ws_url)
         except Exception as exc:
@@ -140,73 +111,120 @@ async def main():
         return None
 
     if args.file:
-        with open(args.file, "rb") as f:
-            raw = f.read()
-        payload = await process_audio(raw)
+        raw, sample_rate = read_wav_pcm(args.file)
+        payload = await process_audio(raw, sample_rate)
         if payload:
             async with websockets.connect(ws_url) as ws:
                 await ws.send(json.dumps(payload))
+        await backend.aclose()
         return
 
-    while True:
-        paused = False
-        last_send_ts = 0.0
-        try:
-            async with websockets.connect(ws_url) as ws:
+    await backend.warmup()
+    # Transcription tasks in utterance order; the sender awaits them one by one.
+    pending = asyncio.Queue()
+
+    capture = MicCapture(
+        sample_rate=SAMPLE_RATE,
+        frame_ms=FRAME_DURATION_MS,
+        device=DEVICE_INDEX,
+        buffer_seconds=CAPTURE_BUFFER_SECONDS,
+    )
+    capture.start()
+    reader = capture.ring.reader()
+    segmenter = StreamingSegmenter(
+        sample_rate=SAMPLE_RATE,
+        frame_ms=FRAME_DURATION_MS,
+        vad_aggressiveness=VAD_AGGRESSIVENESS,
+        pre_roll_ms=PRE_ROLL_MS,
+        min_speech_frames=MIN_SPEECH_FRAMES,
+        min_silence=MIN_SILENCE,
+        max_silence=MAX_SILENCE,
+        max_utterance=MAX_UTTERANCE,
+    )
 
-                async def recv_loop():
-                    nonlocal paused, last_send_ts
-                    async for msg in ws:
-                        try:
-                            data = json.loads(msg)
-                            mtype = data.get("type")
-                            if mtype in {"options", "selected"}:
-                                paused = True
-                                if not last_send_ts:
-                                    last_send_ts = time.time()
-                                print(f"[WS] Received {mtype}, pausing capture.")
-                            elif mtype == "tts_done":
-                                paused = False
-                                last_send_ts = 0.0
-                                print("[WS] Received tts_done, resuming capture.")
-                            else:
-                                print(f"[WS] Received {mtype}")
-                        except Exception:
-                            continue
-
-                recv_task = asyncio.create_task(recv_loop())
-
-                try:
-                    while True:
-                        if paused:
-                            await asyncio.sleep(0.2)
-                            continue
-                        print("Listening...")
-                        raw = record_utterance()
-                        if not raw:
-                            continue
-                        payload = await process_audio(raw)
-                        if payload:
-                            await ws.send(json.dumps(payload))
-                            paused = True  # wait for selection/tts_done before sending next
-                            last_send_ts = time.time()
-                        if paused and last_send_ts and (time.time() - last_send_ts) > PAUSE_TIMEOUT:
-                            print("[WS] Pause timeout exceeded; resuming capture.")
-                            paused = False
-                            last_send_ts = 0.0
-                        if args.once:
-                            break
-                finally:
-                    recv_task.cancel()
-                    try:
-                        await recv_task
-                    except Exception:
-                        pass
+    def on_message(data):
+        nonlocal paused, last_send_ts
+        mtype = data.get("type")
+        if mtype == "sender_state":
+            # Handshake after (re)connect: adopt the server's TTS/selection state.
+            paused = bool(data.get("paused"))
+            last_send_ts = time.time() if paused else 0.0
+            print(f"[WS] Server state: {'paused (' + str(data.get('reason')) + ')' if paused else 'listening'}")
+        elif mtype in {"options", "selected"}:
+            paused = True
+            if not last_send_ts:
+                last_send_ts = time.time()
+            print(f"[WS] Received {mtype}, pausing capture.")
+        elif mtype == "tts_done":
+            paused = False
+            last_send_ts = 0.0
+            print("[WS] Received tts_done, resuming capture.")
+        else:
+            print(f"[WS] Received {mtype}")
+
+    transport = ReconnectingSender(ws_url, on_message=on_message, client_name="mic_vad_sender")
+
+    async def send_loop():
+        nonlocal paused, last_send_ts
+        while True:
+            task = await pending.get()
+            payload = await task
+            if not payload:
+                continue
+            if paused:
+                print("[WS] Dropping transcript received while paused.")
+                continue
+            # Queued across reconnects; sent as soon as the link is up.
+            transport.send(payload)
+            paused = True  # wait for selection/tts_done before sending next
+            last_send_ts = time.time()
+
+    transport_task = asyncio.create_task(transport.run())
+    send_task = asyncio.create_task(send_loop())
+    try:
+        while True:
+            if paused:
+                if last_send_ts and (time.time() - last_send_ts) > PAUSE_TIMEOUT:
+                    print("[WS] Pause timeout exceeded; resuming capture.")
+                    paused = False
+                    last_send_ts = 0.0
+                await asyncio.sleep(0.2)
+                # Discard audio captured while paused (e.g. our own TTS playback).
+                reader.skip_to_latest()
+                segmenter.reset()
+                continue
+            if send_task.done() or transport_task.done():
+                break
+            utterance = await asyncio.to_thread(segmenter.next_utterance, reader)
+            if utterance is None or paused:
+                continue
+            print(
+                f"Utterance {utterance.duration:.2f}s "
+                f"(endpoint {utterance.endpoint_latency * 1000:.0f} ms, "
+                f"silence window {utterance.silence_window:.2f}s, "
+                f"noise {utterance.noise_floor_db:.0f} dBFS)"
+            )
+            raw = utterance.pcm
             if args.once:
+                payload = await process_audio(raw)
+                if payload:
+                    transport.send(payload)
+                    await transport.connected.wait()
+                    while transport.pending():
+                        await asyncio.sleep(0.05)
                 break
-        except Exception as exc:
-            print(f"[WS] Connection error: {exc}, retrying in 2s")
-            await asyncio.sleep(2)
+            # Transcribe in the background and go straight back to segmenting.
+            pending.put_nowait(asyncio.create_task(process_audio(raw)))
+    finally:
+        transport.close()
+        for task in (send_task, transport_task):
+            task.cancel()
+            try:
+                await task
+            except (asyncio.CancelledError, Exception):
+                pass
+        capture.stop()
+        await backend.aclose()
 
 
 if __name__ == "__main__":
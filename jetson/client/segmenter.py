@@ -0,0 +1,255 @@
+"""
+Streaming utterance segmentation with pre-roll and adaptive endpointing.
+
+Frames are pushed one at a time (or pulled from a FrameReader). While idle,
+the last `pre_roll_ms` of audio is kept so the first syllables are included
+once speech onset is confirmed. Onset and offset are smoothed: onset needs
+several voiced frames in a short window, and a single voiced blip does not
+reset the trailing-silence counter.
+
+The end-of-speech silence window adapts per utterance:
+    - short replies ("yes", "no") end after `min_silence`
+    - longer speech waits for a multiple of the speaker's own mid-sentence
+      pause length, so slow speakers are not cut off mid-sentence
+    - a raised noise floor (less reliable VAD) lengthens the window
+and is clamped to [min_silence, max_silence].
+
+An EnergyGate runs ahead of webrtcvad: frame energies are computed in bulk
+with NumPy and only frames clearly above the adaptive noise floor are passed
+to the VAD, so long silences cost almost no CPU.
+"""
+
+import time
+from collections import deque
+
+import numpy as np
+import webrtcvad
+
+
+class Utterance:
+    """A segmented utterance plus its endpointing measurements."""
+
+    def __init__(
+        self,
+        pcm: bytes,
+        duration: float,
+        speech_duration: float,
+        silence_window: float,
+        endpoint_latency: float,
+        noise_floor_db: float,
+    ):
+        self.pcm = pcm
+        self.duration = duration
+        self.speech_duration = speech_duration
+        self.silence_window = silence_window
+        # Wall-clock seconds from the last voiced frame's capture to the end-of-speech decision.
+        self.endpoint_latency = endpoint_latency
+        self.noise_floor_db = noise_floor_db
+
+
+class EnergyGate:
+    """
+    Vectorized energy pre-filter with an adaptive noise floor.
+
+    The floor follows a low percentile of recent frame energies: it drops
+    quickly when the room gets quieter and rises slowly, so speech does not
+    drag it up. Frames less than `margin_db` above the floor are treated as
+    silence without consulting the VAD.
+    """
+
+    def __init__(self, margin_db: float = 6.0, floor_db: float = -60.0, max_floor_db: float = -20.0):
+        self.margin_db = margin_db
+        self.floor_db = floor_db
+        self.max_floor_db = max_floor_db
+
+    @staticmethod
+    def energies_db(frames: np.ndarray) -> np.ndarray:
+        """Per-frame RMS energy in dBFS for an (n, samples) int16 array."""
+        samples = frames.astype(np.float32)
+        rms = np.sqrt(np.mean(samples * samples, axis=1))
+        return 20.0 * np.log10(np.maximum(rms, 1.0) / 32768.0)
+
+    def candidates(self, energies: np.ndarray) -> np.ndarray:
+        """Boolean mask of frames loud enough to be worth running VAD on."""
+        return energies > self.floor_db + self.margin_db
+
+    def update(self, energies: np.ndarray):
+        if not energies.size:
+            return
+        level = float(np.percentile(energies, 10))
+        # Per-frame rates compounded over the block: fall fast, rise slowly.
+        rate = 0.3 if level < self.floor_db else 0.005
+        alpha = 1.0 - (1.0 - rate) ** energies.size
+        self.floor_db = min(self.floor_db + alpha * (level - self.floor_db), self.max_floor_db)
+
+
+class StreamingSegmenter:
+    def __init__(
+        self,
+        sample_rate: int = 16000,
+        frame_ms: int = 30,
+        vad_aggressiveness: int = 2,
+        pre_roll_ms: int = 300,
+        onset_window: int = 5,
+        onset_frames: int = 3,
+        min_speech_frames: int = 5,
+        min_silence: float = 0.3,
+        base_silence: float = 0.6,
+        max_silence: float = 1.2,
+        short_reply: float = 0.8,
+        pause_factor: float = 2.0,
+        max_utterance: float = 15.0,
+    ):
+        self.sample_rate = sample_rate
+        self.frame_sec = frame_ms / 1000
+        self.vad = webrtcvad.Vad(vad_aggressiveness)
+        self.onset_window = onset_window
+        self.onset_frames = onset_frames
+        self.min_speech_frames = min_speech_frames
+        self.min_silence = min_silence
+        self.base_silence = base_silence
+        self.max_silence = max_silence
+        self.short_reply = short_reply
+        self.pause_factor = pause_factor
+        self.max_utterance = max_utterance
+        self._pre_roll = deque(maxlen=max(onset_window, int(pre_roll_ms / frame_ms)))
+        self.gate = EnergyGate()
+        self._pending = deque()
+        self.vad_calls = 0
+        self.reset()
+
+    @property
+    def noise_floor_db(self) -> float:
+        return self.gate.floor_db
+
+    def reset(self):
+        """Drop any partial utterance and pre-roll (e.g. after a pause)."""
+        self._pre_roll.clear()
+        self._pending.clear()
+        self._triggered = False
+        self._frames = []
+        self._speech_frames = 0
+        self._voiced_run = 0
+        self._trailing_silence = 0
+        self._pause_ema = None
+        self._last_voiced_time = 0.0
+
+    def is_speech(self, frame: bytes) -> bool:
+        self.vad_calls += 1
+        return self.vad.is_speech(frame, self.sample_rate)
+
+    def classify(self, frames: np.ndarray) -> np.ndarray:
+        """Voiced mask for a block of frames; VAD only runs on gate candidates."""
+        energies = self.gate.energies_db(frames)
+        voiced = self.gate.candidates(energies)
+        self.gate.update(energies)
+        for i in np.flatnonzero(voiced):
+            voiced[i] = self.is_speech(frames[i].tobytes())
+        return voiced
+
+    def silence_window(self) -> float:
+        speech_time = self._speech_frames * self.frame_sec
+        if speech_time < self.short_reply:
+            window = self.min_silence
+        else:
+            window = self.base_silence
+            if self._pause_ema is not None:
+                window = max(window, self.pause_factor * self._pause_ema)
+        # Noisy rooms make VAD flicker; allow up to +30% above a -50 dBFS floor.
+        window *= 1.0 + min(max((self.noise_floor_db + 50.0) / 30.0, 0.0), 0.3)
+        return min(max(window, self.min_silence), self.max_silence)
+
+    def process(self, frame: bytes, timestamp: float | None = None, voiced: bool | None = None) -> Utterance | None:
+        """Feed one frame; returns an Utterance when end of speech is detected."""
+        timestamp = time.monotonic() if timestamp is None else timestamp
+        if voiced is None:
+            voiced = bool(self.classify(np.frombuffer(frame, dtype=np.int16)[None, :])[0])
+
+        if not self._triggered:
+            self._pre_roll.append((frame, voiced))
+            recent = list(self._pre_roll)[-self.onset_window:]
+            if sum(1 for _, v in recent if v) >= self.onset_frames:
+                self._triggered = True
+                self._frames = [f for f, _ in self._pre_roll]
+                self._speech_frames = sum(1 for _, v in self._pre_roll if v)
+                self._voiced_run = 1
+                self._last_voiced_time = timestamp
+                self._pre_roll.clear()
+            return None
+
+        self._frames.append(frame)
+        if voiced:
+            self._speech_frames += 1
+            self._voiced_run += 1
+            # Two voiced frames in a row end a pause; single blips are smoothed over.
+            if self._voiced_run >= 2:
+                if self._trailing_silence:
+                    pause = self._trailing_silence * self.frame_sec
+                    self._pause_ema = pause if self._pause_ema is None else 0.7 * self._pause_ema + 0.3 * pause
+                self._trailing_silence = 0
+            self._last_voiced_time = timestamp
+        else:
+            self._voiced_run = 0
+            self._trailing_silence += 1
+
+        duration = len(self._frames) * self.frame_sec
+        window = self.silence_window()
+        if self._trailing_silence * self.frame_sec >= window or duration >= self.max_utterance:
+            return self._finish(window, time.monotonic())
+        return None
+
+    def _finish(self, window: float, decided_at: float) -> Utterance | None:
+        frames, speech_frames = self._frames, self._speech_frames
+        last_voiced = self._last_voiced_time
+        self.reset()
+        if speech_frames < self.min_speech_frames:
+            return None
+        return Utterance(
+            pcm=b"".join(frames),
+            duration=len(frames) * self.frame_sec,
+            speech_duration=speech_frames * self.frame_sec,
+            silence_window=window,
+            endpoint_latency=max(0.0, decided_at - last_voiced),
+            noise_floor_db=self.noise_floor_db,
+        )
+
+    def process_block(self, frames: np.ndarray, timestamps=None) -> list[Utterance]:
+        """Feed an (n, samples) block of frames; returns any utterances that ended."""
+        if not len(frames):
+            return []
+        voiced = self.classify(frames)
+        if not self._triggered and not voiced.any():
+            # All silence while idle: only the tail matters, for the pre-roll.
+            for frame in frames[-self._pre_roll.maxlen:]:
+                self._pre_roll.append((frame.tobytes(), False))
+            return []
+        utterances = []
+        for i in range(len(frames)):
+            ts = None if timestamps is None else float(timestamps[i])
+            utterance = self.process(frames[i].tobytes(), ts, bool(voiced[i]))
+            if utterance is not None:
+                utterances.append(utterance)
+        return utterances
+
+    def next_utterance(self, reader, idle_timeout: float = 1.0, block_frames: int = 32) -> Utterance | None:
+        """
+        Pull frames from a FrameReader until an utterance ends (blocking; run in a thread).
+
+        Returns None after `idle_timeout` seconds without speech onset so callers
+        can check their own state; a partially collected utterance is kept.
+        """
+        if self._pending:
+            return self._pending.popleft()
+        idle_since = time.monotonic()
+        while True:
+            block = reader.read_block(block_frames, timeout=1.0)
+            if block is None:
+                return None
+            frames, times = block
+            self._pending.extend(self.process_block(frames, times))
+            if self._pending:
+                return self._pending.popleft()
+            if self._triggered:
+                idle_since = time.monotonic()
+            elif time.monotonic() - idle_since >= idle_timeout:
+                return None
@@ -0,0 +1,154 @@
+"""
+Reconnecting websocket transport for client senders.
+
+Outbound messages go into a bounded queue that lives across connections, so
+a transcript produced while the link is down is sent as soon as it comes
+back (the oldest message is dropped if the queue overflows). Reconnects use
+exponential backoff with full jitter starting in the tens of milliseconds,
+so a brief Wi-Fi blip costs milliseconds rather than a fixed sleep.
+
+On every (re)connect the transport sends a `sender_hello`; the server
+answers with `sender_state` so the client can restore its paused/listening
+state before anything queued is flushed. If the server is paused (TTS playing
+or a selection pending), whatever was queued while offline is stale and is
+dropped instead of being sent.
+"""
+
+import asyncio
+import json
+import random
+import time
+from collections import deque
+
+import websockets
+
+# A sender resumes listening this long after sending a transcript if no
+# selection or tts_done arrives; the server expires awaiting_selection to match.
+PAUSE_TIMEOUT = 15.0
+
+
+class ReconnectingSender:
+    def __init__(
+        self,
+        url: str,
+        on_message=None,
+        client_name: str = "sender",
+        max_queue: int = 32,
+        backoff_base: float = 0.05,
+        backoff_max: float = 5.0,
+        handshake_timeout: float = 1.0,
+    ):
+        self.url = url
+        self.on_message = on_message  # callable(dict), called for every JSON message received
+        self.client_name = client_name
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.handshake_timeout = handshake_timeout
+        self._outbox = deque(maxlen=max_queue)
+        self._outbox_ready = asyncio.Event()
+        self._state_received = asyncio.Event()
+        self.server_paused = False  # from the last sender_state
+        self.connected = asyncio.Event()
+        self.dropped = 0
+        self.reconnects = 0
+        self._closed = False
+
+    def send(self, payload: dict):
+        """Queue a message; it is delivered on the current or next connection."""
+        if len(self._outbox) == self._outbox.maxlen:
+            self.dropped += 1
+        self._outbox.append(payload)
+        self._outbox_ready.set()
+
+    def pending(self) -> int:
+        return len(self._outbox)
+
+    def close(self):
+        self._closed = True
+        self._outbox_ready.set()
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    async def run(self):
+        """Connect, flush and receive until close(); reconnects on any connection error."""
+        attempt = 0
+        while not self._closed:
+            connected_at = None
+            try:
+                async with websockets.connect(self.url, open_timeout=5) as ws:
+                    connected_at = time.monotonic()
+                    await self._serve(ws)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                # A connection that stayed up for a while resets the backoff; one
+                # that is accepted and dropped straight away keeps backing off.
+                if connected_at is not None and time.monotonic() - connected_at > 1.0:
+                    attempt = 0
+                delay = self._backoff(attempt)
+                attempt += 1
+                print(f"[WS] Connection error: {exc}, retrying in {delay * 1000:.0f} ms")
+                await asyncio.sleep(delay)
+            finally:
+                self.connected.clear()
+            if not self._closed:
+                self.reconnects += 1
+
+    async def _serve(self, ws):
+        self._state_received.clear()
+        await ws.send(json.dumps({"type": "sender_hello", "client": self.client_name}))
+        recv_task = asyncio.create_task(self._recv_loop(ws))
+        try:
+            # Let the server's sender_state land before flushing, so queued
+            # transcripts are judged against the restored paused state.
+            try:
+                await asyncio.wait_for(self._state_received.wait(), self.handshake_timeout)
+            except asyncio.TimeoutError:
+                pass
+            if self._state_received.is_set() and self.server_paused and self._outbox:
+                print(f"[WS] Server is paused; dropping {len(self._outbox)} queued message(s).")
+                self.dropped += len(self._outbox)
+                self._outbox.clear()
+            self.connected.set()
+            await self._flush_loop(ws, recv_task)
+        finally:
+            recv_task.cancel()
+            try:
+                await recv_task
+            except (asyncio.CancelledError, Exception):
+                pass
+
+    async def _flush_loop(self, ws, recv_task: asyncio.Task):
+        while not self._closed:
+            while self._outbox:
+                # Only dequeue once the send succeeded, so a drop mid-send keeps the message.
+                payload = self._outbox[0]
+                await ws.send(json.dumps(payload))
+                if self._outbox and self._outbox[0] is payload:
+                    self._outbox.popleft()
+            self._outbox_ready.clear()
+            if self._outbox:
+                continue
+            ready = asyncio.create_task(self._outbox_ready.wait())
+            try:
+                done, _ = await asyncio.wait({ready, recv_task}, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                ready.cancel()
+            if recv_task in done:
+                recv_task.result()  # re-raise the connection error, if any
+                raise ConnectionError("connection closed by server")
+
+    async def _recv_loop(self, ws):
+        async for msg in ws:
+            try:
+                data = json.loads(msg)
+            except ValueError:
+                continue
+            if not isinstance(data, dict):
+                continue
+            if data.get("type") == "sender_state":
+                self.server_paused = bool(data.get("paused"))
+                self._state_received.set()
+            if self.on_message is not None:
+                self.on_message(data)
@@ -1,74 +1,578 @@
+import calendar as _calendar
+import os
 import pathlib
-from datetime import datetime
+import re
+from datetime import datetime, timedelta, timezone
 import logging
+import json
+from bisect import bisect_right
+from heapq import merge
 
+try:
+    from zoneinfo import ZoneInfo
+except ImportError:  # pragma: no cover - Python < 3.9
+    ZoneInfo = None
 
-def _parse_dt(dt_str: str) -> datetime | None:
+
+# Recurring events are expanded within [now - PAST, now + FUTURE] unless a window is given.
+DEFAULT_WINDOW_PAST = timedelta(days=int(os.getenv("CALENDAR_WINDOW_PAST_DAYS", "30")))
+DEFAULT_WINDOW_FUTURE = timedelta(days=int(os.getenv("CALENDAR_WINDOW_FUTURE_DAYS", "365")))
+
+MAX_EMPTY_PERIODS = 1000  # periods in a row without an occurrence before a rule is abandoned
+WEEKDAYS = {"MO": 0, "TU": 1, "WE": 2, "TH": 3, "FR": 4, "SA": 5, "SU": 6}
+_DURATION_RE = re.compile(
+    r"^(?P<sign>[+-])?P(?:(?P<weeks>\d+)W)?(?:(?P<days>\d+)D)?"
+    r"(?:T(?:(?P<hours>\d+)H)?(?:(?P<minutes>\d+)M)?(?:(?P<seconds>\d+)S)?)?$"
+)
+_BYDAY_RE = re.compile(r"^(?P<ord>[+-]?\d+)?(?P<day>MO|TU|WE|TH|FR|SA|SU)$")
+
+# path -> (mtime_ns, size, ParsedCalendar)
+_cache: dict[str, tuple[int, int, "ParsedCalendar"]] = {}
+# path -> (index key, ScheduleIndex)
+_index_cache: dict[str, tuple[tuple, "ScheduleIndex"]] = {}
+# path -> (mtime_ns, size, EventContextIndex)
+_context_cache: dict[str, tuple[int, int, "EventContextIndex"]] = {}
+
+
+class ParsedCalendar:
+    """Parsed ICS file: single events sorted by start, plus recurring masters."""
+
+    def __init__(self, single: list[dict], recurring: list[dict], version: tuple):
+        self.single = single
+        self.recurring = recurring
+        self.version = version
+
+
+def _unfold(lines):
+    """Join RFC 5545 folded lines (continuations start with a space or tab)."""
+    current = None
+    for raw in lines:
+        raw = raw.rstrip("\r\n")
+        if raw[:1] in (" ", "\t") and current is not None:
+            current += raw[1:]
+            continue
+        if current is not None:
+            yield current
+        current = raw
+    if current is not None:
+        yield current
+
+
+def _split_property(line: str) -> tuple[str, dict, str] | None:
+    """Split 'NAME;PARAM=x;PARAM="y:z":value' into (NAME, params, value)."""
+    in_quotes = False
+    for i, ch in enumerate(line):
+        if ch == '"':
+            in_quotes = not in_quotes
+        elif ch == ":" and not in_quotes:
+            head, value = line[:i], line[i + 1:]
+            break
+    else:
+        return None
+    name, *raw_params = head.split(";")
+    params = {}
+    for raw in raw_params:
+        if "=" in raw:
+            key, val = raw.split("=", 1)
+            params[key.upper()] = val.strip('"')
+    return name.upper(), params, value
+
+
+def _unescape(value: str) -> str:
+    return (
+        value.replace("\\n", "\n")
+        .replace("\\N", "\n")
+        .replace("\\,", ",")
+        .replace("\\;", ";")
+        .replace("\\\\", "\\")
+    )
+
+
+def _to_local_naive(dt: datetime) -> datetime:
+    return dt.astimezone().replace(tzinfo=None)
+
+
+def _parse_dt(dt_str: str, params: dict | None = None) -> datetime | None:
+    """
+    Parse DATE-TIME/DATE values into naive local datetimes.
+
+    Handles UTC ('Z' suffix), TZID parameters and all-day DATE values.
+    """
+    params = params or {}
+    value = dt_str.strip()
     try:
-        return datetime.strptime(dt_str.strip(), "%Y%m%dT%H%M%S")
+        if params.get("VALUE") == "DATE" or (len(value) == 8 and value.isdigit()):
+            return datetime.strptime(value, "%Y%m%d")
+        if value.endswith("Z"):
+            dt = datetime.strptime(value[:-1], "%Y%m%dT%H%M%S").replace(tzinfo=timezone.utc)
+            return _to_local_naive(dt)
+        dt = datetime.strptime(value, "%Y%m%dT%H%M%S")
+        tzid = params.get("TZID")
+        if tzid and ZoneInfo is not None:
+            try:
+                return _to_local_naive(dt.replace(tzinfo=ZoneInfo(tzid)))
+            except Exception:
+                logging.warning(f"Unknown TZID '{tzid}'; treating '{value}' as local time")
+        return dt
     except ValueError as e:
         logging.warning(f"Failed to parse date string '{dt_str}': {e}")
         return None
 
 
-def load_events_from_ics(ics_path: str) -> list[dict]:
-    path = pathlib.Path(ics_path)
-    if not path.exists():
-        return []
+def _parse_duration(value: str) -> timedelta | None:
+    match = _DURATION_RE.match(value.strip())
+    if not match:
+        return None
+    parts = {k: int(v) for k, v in match.groupdict().items() if v and k != "sign"}
+    delta = timedelta(
+        weeks=parts.get("weeks", 0),
+        days=parts.get("days", 0),
+        hours=parts.get("hours", 0),
+        minutes=parts.get("minutes", 0),
+        seconds=parts.get("seconds", 0),
+    )
+    return -delta if match.group("sign") == "-" else delta
 
-    events = []
+
+def _parse_rrule(value: str) -> dict:
+    rule = {}
+    for part in value.split(";"):
+        if "=" in part:
+            key, val = part.split("=", 1)
+            rule[key.upper()] = val.upper()
+    return rule
+
+
+def _finish_event(ev: dict) -> dict | None:
+    start = ev.get("start")
+    if not isinstance(start, datetime):
+        return None
+    end = ev.get("end")
+    if not isinstance(end, datetime):
+        duration = ev.pop("duration", None)
+        if duration is not None:
+            end = start + duration
+        elif ev.get("all_day"):
+            end = start + timedelta(days=1)
+        else:
+            end = start
+        ev["end"] = end
+    ev.pop("duration", None)
+    ev.setdefault("summary", "")
+    return ev
+
+
+def _parse_ics(lines, version: tuple) -> ParsedCalendar:
+    """Stream VEVENTs out of unfolded ICS lines."""
+    single = []
+    recurring = []
+    overrides = {}  # uid -> set of overridden occurrence starts
     current = None
-    for line in path.read_text().splitlines():
-        line = line.strip()
-        if line == "BEGIN:VEVENT":
+    depth = 0  # nesting inside VEVENT (e.g. VALARM)
+    for line in _unfold(lines):
+        if not line:
+            continue
+        upper = line.upper()
+        if upper == "BEGIN:VEVENT":
             current = {}
-        elif line == "END:VEVENT":
-            if current:
-                events.append(current)
-            current = None
-        elif current is not None and ":" in line:
-            key, value = line.split(":", 1)
-            key = key.upper()
-            if key == "DTSTART":
-                current["start"] = _parse_dt(value)
-            elif key == "DTEND":
-                current["end"] = _parse_dt(value)
-            elif key == "SUMMARY":
-                current["summary"] = value
-            elif key == "LOCATION":
-                current["location"] = value
-    # filter invalid
-    valid = []
-    for ev in events:
-        if isinstance(ev.get("start"), datetime) and isinstance(ev.get("end"), datetime):
-            valid.append(ev)
-    return sorted(valid, key=lambda e: e["start"])
+            depth = 0
+            continue
+        if current is None:
+            continue
+        if upper.startswith("BEGIN:"):
+            depth += 1
+            continue
+        if upper.startswith("END:"):
+            if depth:
+                depth -= 1
+                continue
+            if upper == "END:VEVENT":
+                ev = _finish_event(current)
+                current = None
+                if ev is None:
+                    continue
+                if ev.get("recurrence_id") is not None:
+                    overrides.setdefault(ev.get("uid"), set()).add(ev["recurrence_id"])
+                if ev.get("rrule"):
+                    recurring.append(ev)
+                else:
+                    single.append(ev)
+            continue
+        if depth:
+            continue
+
+        prop = _split_property(line)
+        if prop is None:
+            continue
+        key, params, value = prop
+        if key == "DTSTART":
+            current["start"] = _parse_dt(value, params)
+            current["all_day"] = params.get("VALUE") == "DATE" or len(value.strip()) == 8
+        elif key == "DTEND":
+            current["end"] = _parse_dt(value, params)
+        elif key == "DURATION":
+            current["duration"] = _parse_duration(value)
+        elif key == "SUMMARY":
+            current["summary"] = _unescape(value)
+        elif key == "LOCATION":
+            current["location"] = _unescape(value)
+        elif key == "UID":
+            current["uid"] = value
+        elif key == "RRULE":
+            current["rrule"] = _parse_rrule(value)
+        elif key == "EXDATE":
+            exdates = current.setdefault("exdates", set())
+            for item in value.split(","):
+                dt = _parse_dt(item, params)
+                if dt is not None:
+                    exdates.add(dt)
+        elif key == "RECURRENCE-ID":
+            current["recurrence_id"] = _parse_dt(value, params)
+
+    # Occurrences replaced by a RECURRENCE-ID override are excluded from the master.
+    for ev in recurring:
+        replaced = overrides.get(ev.get("uid"))
+        if replaced:
+            ev.setdefault("exdates", set()).update(replaced)
+
+    single.sort(key=lambda e: e["start"])
+    return ParsedCalendar(single, recurring, version)
+
+
+def load_calendar(ics_path: str) -> ParsedCalendar | None:
+    """Parse an ICS file once per (mtime, size); later calls hit the cache."""
+    path = pathlib.Path(ics_path)
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    key = str(path.resolve())
+    cached = _cache.get(key)
+    if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+        return cached[2]
+    version = (key, stat.st_mtime_ns, stat.st_size)
+    try:
+        with path.open("r", encoding="utf-8", errors="replace") as f:
+            parsed = _parse_ics(f, version)
+    except OSError as e:
+        logging.warning(f"Failed to read calendar '{ics_path}': {e}")
+        return None
+    _cache[key] = (stat.st_mtime_ns, stat.st_size, parsed)
+    return parsed
+
+
+def _month_days(year: int, month: int, rule: dict, dtstart: datetime) -> list[int]:
+    """Days of a month selected by BYMONTHDAY/BYDAY (or DTSTART's day)."""
+    _, ndays = _calendar.monthrange(year, month)
+    days = set()
+    if "BYMONTHDAY" in rule:
+        for item in rule["BYMONTHDAY"].split(","):
+            n = int(item)
+            day = n if n > 0 else ndays + n + 1
+            if 1 <= day <= ndays:
+                days.add(day)
+    elif "BYDAY" in rule:
+        for item in rule["BYDAY"].split(","):
+            match = _BYDAY_RE.match(item)
+            if not match:
+                continue
+            weekday = WEEKDAYS[match.group("day")]
+            first = (weekday - _calendar.weekday(year, month, 1)) % 7 + 1
+            candidates = list(range(first, ndays + 1, 7))
+            if match.group("ord"):
+                n = int(match.group("ord"))
+                if -len(candidates) <= n <= len(candidates) and n != 0:
+                    days.add(candidates[n - 1 if n > 0 else n])
+            else:
+                days.update(candidates)
+    elif dtstart.day <= ndays:
+        days.add(dtstart.day)
+    return sorted(days)
+
+
+def _rrule_starts(ev: dict, window_start: datetime, window_end: datetime):
+    """
+    Yield occurrence starts of a recurring event in order, stopping once a
+    period begins at or after window_end (later occurrences cannot overlap),
+    or after MAX_EMPTY_PERIODS periods in a row without an occurrence (a rule
+    such as BYMONTHDAY=30 with BYMONTH=2 never matches).
+    """
+    rule = ev["rrule"]
+    dtstart = ev["start"]
+    freq = rule.get("FREQ")
+    interval = max(int(rule.get("INTERVAL", "1") or 1), 1)
+    duration = ev["end"] - dtstart
+    skip_ahead = "COUNT" not in rule
+
+    if freq in ("DAILY", "WEEKLY"):
+        step = timedelta(days=interval if freq == "DAILY" else 7 * interval)
+        period_start = dtstart
+        if freq == "WEEKLY":
+            period_start = dtstart - timedelta(days=dtstart.weekday())
+        if skip_ahead and window_start - duration > period_start + step:
+            # Jump straight to the period containing the window; nothing before it can overlap.
+            period_start += step * ((window_start - duration - period_start) // step - 1)
+        byday = sorted(
+            WEEKDAYS[item[-2:]] for item in rule.get("BYDAY", "").split(",") if item[-2:] in WEEKDAYS
+        )
+        if freq == "WEEKLY" and not byday:
+            byday = [dtstart.weekday()]
+        empty = 0
+        while period_start < window_end and empty < MAX_EMPTY_PERIODS:
+            produced = False
+            if freq == "WEEKLY":
+                for weekday in byday:
+                    candidate = period_start + timedelta(days=weekday)
+                    if candidate >= dtstart:
+                        produced = True
+                        yield candidate
+            elif not byday or period_start.weekday() in byday:
+                produced = True
+                yield period_start
+            empty = 0 if produced else empty + 1
+            period_start += step
+    elif freq == "MONTHLY":
+        n = empty = 0
+        while empty < MAX_EMPTY_PERIODS:
+            month_index = dtstart.month - 1 + n * interval
+            year, month = dtstart.year + month_index // 12, month_index % 12 + 1
+            if datetime(year, month, 1) >= window_end:
+                return
+            produced = False
+            for day in _month_days(year, month, rule, dtstart):
+                candidate = dtstart.replace(year=year, month=month, day=day)
+                if candidate >= dtstart:
+                    produced = True
+                    yield candidate
+            empty = 0 if produced else empty + 1
+            n += 1
+    elif freq == "YEARLY":
+        months = [int(m) for m in rule["BYMONTH"].split(",")] if "BYMONTH" in rule else [dtstart.month]
+        n = empty = 0
+        while empty < MAX_EMPTY_PERIODS:
+            year = dtstart.year + n * interval
+            if year > window_end.year:
+                return
+            produced = False
+            for month in sorted(months):
+                for day in _month_days(year, month, rule, dtstart):
+                    candidate = dtstart.replace(year=year, month=month, day=day)
+                    if candidate >= dtstart:
+                        produced = True
+                        yield candidate
+            empty = 0 if produced else empty + 1
+            n += 1
+    else:
+        logging.warning(f"Unsupported RRULE frequency '{freq}' for '{ev.get('summary')}'")
+        yield dtstart
+
+
+def _expand(ev: dict, window_start: datetime, window_end: datetime):
+    """Lazily yield occurrences of a recurring event overlapping the window."""
+    rule = ev["rrule"]
+    duration = ev["end"] - ev["start"]
+    count = int(rule["COUNT"]) if "COUNT" in rule else None
+    until = _parse_dt(rule["UNTIL"]) if "UNTIL" in rule else None
+    exdates = ev.get("exdates") or set()
+    seen = 0
+    for start in _rrule_starts(ev, window_start, window_end):
+        if count is not None and seen >= count:
+            return
+        if until is not None and start > until:
+            return
+        if start >= window_end:
+            return
+        seen += 1
+        if start + duration <= window_start or start in exdates:
+            continue
+        occurrence = {k: v for k, v in ev.items() if k not in ("rrule", "exdates")}
+        occurrence["start"] = start
+        occurrence["end"] = start + duration
+        occurrence["recurring"] = True
+        yield occurrence
+
+
+def iter_events(
+    ics_path: str,
+    window_start: datetime | None = None,
+    window_end: datetime | None = None,
+):
+    """
+    Lazily yield events in start order, expanding recurrences within the window.
+
+    Single (non-recurring) events are all yielded when no window is given.
+    """
+    parsed = load_calendar(ics_path)
+    if parsed is None:
+        return
+    singles = parsed.single
+    if window_start is not None or window_end is not None:
+        lo = window_start or datetime.min
+        hi = window_end or datetime.max
+        singles = (ev for ev in singles if ev["end"] > lo and ev["start"] < hi)
+    if not parsed.recurring:
+        yield from singles
+        return
+    now = datetime.now()
+    window_start = window_start or now - DEFAULT_WINDOW_PAST
+    window_end = window_end or now + DEFAULT_WINDOW_FUTURE
+    expansions = [_expand(ev, window_start, window_end) for ev in parsed.recurring]
+    yield from merge(singles, *expansions, key=lambda e: e["start"])
+
+
+def load_events_from_ics(
+    ics_path: str,
+    window_start: datetime | None = None,
+    window_end: datetime | None = None,
+) -> list[dict]:
+    return list(iter_events(ics_path, window_start, window_end))
 
 
 def _fmt_event(ev: dict) -> str:
     loc = f" @ {ev['location']}" if ev.get("location") else ""
+    if ev.get("all_day"):
+        return f"{ev['summary']} ({ev['start'].strftime('%b %d')}, all day){loc}"
     return f"{ev['summary']} ({ev['start'].strftime('%b %d %H:%M')} - {ev['end'].strftime('%H:%M')}){loc}"
 
 
-def summarize_schedule(events: list[dict], now: datetime | None = None) -> str:
+class ScheduleIndex:
+    """
+    Sorted interval index over events for O(log n) schedule queries.
+
+    Events are kept in start order with a running maximum of end times, so
+    "active at t" only walks back over events that can still overlap t.
+    """
+
+    def __init__(self, events: list[dict], version: tuple | None = None):
+        self.version = version
+        self.events = sorted(events, key=lambda e: e["start"])
+        self._starts = [ev["start"] for ev in self.events]
+        self._max_end = []
+        latest = None
+        for ev in self.events:
+            latest = ev["end"] if latest is None or ev["end"] > latest else latest
+            self._max_end.append(latest)
+        self._by_end = sorted(self.events, key=lambda e: e["end"])
+        self._ends = [ev["end"] for ev in self._by_end]
+
+    def __len__(self) -> int:
+        return len(self.events)
+
+    def active_events(self, t: datetime) -> list[dict]:
+        """Events with start <= t < end, in start order."""
+        active = []
+        i = bisect_right(self._starts, t) - 1
+        while i >= 0 and self._max_end[i] > t:
+            if self.events[i]["end"] > t:
+                active.append(self.events[i])
+            i -= 1
+        active.reverse()
+        return active
+
+    def active_at(self, t: datetime) -> dict | None:
+        active = self.active_events(t)
+        return active[0] if active else None
+
+    def last_before(self, t: datetime, k: int) -> list[dict]:
+        """The k events that ended most recently at or before t (oldest first)."""
+        j = bisect_right(self._ends, t)
+        return self._by_end[max(0, j - k):j]
+
+    def next_after(self, t: datetime, k: int) -> list[dict]:
+        """The next k events starting after t."""
+        i = bisect_right(self._starts, t)
+        return self.events[i:i + k]
+
+
+def load_schedule_index(ics_path: str, now: datetime | None = None) -> ScheduleIndex:
+    """Build (or reuse) the schedule index for the current calendar version."""
+    parsed = load_calendar(ics_path)
+    if parsed is None:
+        return ScheduleIndex([])
+    # Recurrences are expanded relative to today, so such indexes are rebuilt daily.
+    key = parsed.version if not parsed.recurring else parsed.version + ((now or datetime.now()).date(),)
+    cached = _index_cache.get(ics_path)
+    if cached and cached[0] == key:
+        return cached[1]
+    index = ScheduleIndex(list(iter_events(ics_path)), version=key)
+    _index_cache[ics_path] = (key, index)
+    return index
+
+
+def _parse_iso(value: str) -> datetime | None:
+    value = value.strip()
+    if value.endswith("Z"):
+        value = value[:-1] + "+00:00"
+    try:
+        dt = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    return _to_local_naive(dt) if dt.tzinfo else dt
+
+
+def event_key(summary: str, start: datetime, end: datetime) -> tuple:
+    return (summary, start.replace(microsecond=0), end.replace(microsecond=0))
+
+
+class EventContextIndex:
+    """
+    Event contexts keyed by (summary, start, end) instead of formatted strings.
+
+    Keys in event_contexts.json look like "summary|start|end"; starts and ends
+    may be naive local ISO times or UTC ISO strings from the frontend, and all
+    of them resolve to the same parsed key.
+    """
+
+    def __init__(self, mapping: dict):
+        self._contexts = {}
+        for raw_key, ctx in mapping.items():
+            parts = str(raw_key).rsplit("|", 2)
+            if len(parts) != 3:
+                continue
+            start, end = _parse_iso(parts[1]), _parse_iso(parts[2])
+            if start is None or end is None:
+                continue
+            self._contexts[event_key(parts[0], start, end)] = ctx
+
+    def __len__(self) -> int:
+        return len(self._contexts)
+
+    def get(self, ev: dict, default: str = "") -> str:
+        if not ev or not ev.get("start") or not ev.get("end"):
+            return default
+        return self._contexts.get(event_key(ev.get("summary", ""), ev["start"], ev["end"]), default)
+
+
+def load_event_context_index(json_path: str) -> EventContextIndex:
+    """Load event contexts into an EventContextIndex, cached by file mtime and size."""
+    path = pathlib.Path(json_path)
+    try:
+        stat = path.stat()
+    except OSError:
+        return EventContextIndex({})
+    cached = _context_cache.get(json_path)
+    if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+        return cached[2]
+    try:
+        mapping = json.loads(path.read_text(encoding="utf-8"))
+    except Exception as e:
+        logging.warning(f"Failed to read event contexts '{json_path}': {e}")
+        mapping = {}
+    index = EventContextIndex(mapping if isinstance(mapping, dict) else {})
+    _context_cache[json_path] = (stat.st_mtime_ns, stat.st_size, index)
+    return index
+
+
+def summarize_schedule(events: "list[dict] | ScheduleIndex", now: datetime | None = None) -> str:
     now = now or datetime.now()
-    if not events:
+    index = events if isinstance(events, ScheduleIndex) else ScheduleIndex(events)
+    if not len(index):
         return "No events scheduled."
 
-    current = None
-    prev_events = []
-    next_events = []
-
-    for ev in events:
-        if ev["start"] <= now < ev["end"]:
-            current = ev
-        elif ev["end"] <= now:
-            prev_events.append(ev)
-        else:
-            next_events.append(ev)
-
-    prev_events = prev_events[-2:] if prev_events else []
-    next_events = next_events[:2] if next_events else []
+    active = index.active_events(now)
+    current = active[-1] if active else None
+    prev_events = index.last_before(now, 2)
+    next_events = index.next_after(now, 2)
 
     parts = []
     if current:
@@ -83,11 +587,10 @@ def summarize_schedule(events: list[dict], now: datetime | None = None) -> str:
         )
 
     if not parts:
-        parts.append("No active events; upcoming schedule: " + "; ".join(_fmt_event(ev) for ev in events[:3]))
+        parts.append("No active events; upcoming schedule: " + "; ".join(_fmt_event(ev) for ev in index.events[:3]))
 
     return " | ".join(parts)
 
 
 def load_and_summarize_schedule(ics_path: str, now: datetime | None = None) -> str:
-    events = load_events_from_ics(ics_path)
-    return summarize_schedule(events, now=now)
+    return summarize_schedule(load_schedule_index(ics_path, now=now), now=now)
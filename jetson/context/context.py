@@ -1,6 +1,10 @@
 
 class Context:
-    def __init__(self, audio_text: str | None = None, image = None):
+    def __init__(self, audio_text: str | None = None, image = None, image_mime: str = "image/jpeg"):
         self.audio_text = audio_text
+        # base64 string (JSON messages) or memoryview over a binary frame
         self.image = image
-        self.response: str | None = None
+        self.image_mime = image_mime
+        self.response: list[str] | str | None = None
+        self.source: str | None = None  # "llm" or "fallback" (local options after an LLM miss)
+        self.fallback_reason: str | None = None  # why the LLM was not used, when source is "fallback"
@@ -0,0 +1,70 @@
+"""
+Local fallback options for when the LLM misses its turn deadline.
+
+Builds three generic replies (agree / disagree / follow-up question) from
+the device user's most frequent past selections in
+user_context/conversation_logs.log, so the user always has something to
+say. Defaults cover a fresh install with no history.
+"""
+
+import json
+import logging
+import os
+import pathlib
+import re
+from collections import Counter
+
+CONVERSATION_LOG = "user_context/conversation_logs.log"
+DEFAULT_OPTIONS = ("Yes, that sounds good.", "No, thank you.", "Could you say that again?")
+
+_NEGATIVE = re.compile(r"^(no|nope|nah|not|never|sorry|i don't|i do not|i can't|i cannot|i won't|don't)\b", re.IGNORECASE)
+
+_cache = {}  # path -> ((mtime_ns, size), options)
+
+
+def bucket_reply(text: str) -> int:
+    """0 = agree/positive, 1 = disagree/negative, 2 = question."""
+    if text.rstrip().endswith("?"):
+        return 2
+    if _NEGATIVE.match(text.strip()):
+        return 1
+    return 0
+
+
+def _build(path: pathlib.Path) -> tuple[str, str, str]:
+    counts = [Counter(), Counter(), Counter()]
+    with path.open("r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if not isinstance(record, dict) or record.get("role") != "user":
+                continue
+            text = record.get("text")
+            if isinstance(text, str) and text.strip():
+                text = text.strip()
+                counts[bucket_reply(text)][text] += 1
+    return tuple(
+        bucket.most_common(1)[0][0] if bucket else default
+        for bucket, default in zip(counts, DEFAULT_OPTIONS)
+    )
+
+
+def fallback_options(log_path: str = CONVERSATION_LOG) -> list[str]:
+    """Most frequent past agree/disagree/question selections (cached by file mtime)."""
+    path = pathlib.Path(log_path)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return list(DEFAULT_OPTIONS)
+    key = (stat.st_mtime_ns, stat.st_size)
+    cached = _cache.get(log_path)
+    if cached is None or cached[0] != key:
+        try:
+            cached = (key, _build(path))
+        except Exception as exc:
+            logging.getLogger(__name__).error(f"Failed to build fallback options: {exc}")
+            return list(DEFAULT_OPTIONS)
+        _cache[log_path] = cached
+    return list(cached[1])
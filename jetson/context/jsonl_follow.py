@@ -0,0 +1,63 @@
+"""
+Incremental reader for append-mostly JSONL files (logs, highlights).
+
+Remembers the byte offset it has consumed up to; each `read_new()` returns
+only the complete lines appended since. If the file shrank or the bytes
+just before the offset changed (it was rewritten, e.g. a highlight was
+deleted), the caller is told to rebuild and everything is returned again.
+"""
+
+import json
+import pathlib
+
+
+class JsonlFollower:
+    TAIL_CHECK = 64  # bytes before the offset compared to detect rewrites
+
+    def __init__(self, path: str):
+        self.path = pathlib.Path(path)
+        self._offset = 0
+        self._tail = b""
+
+    def reset(self):
+        self._offset = 0
+        self._tail = b""
+
+    def read_new(self) -> tuple[list[dict], bool]:
+        """Return (records appended since the last call, whether the file was rewritten)."""
+        rewritten = False
+        try:
+            size = self.path.stat().st_size
+        except OSError:
+            rewritten = self._offset > 0
+            self.reset()
+            return [], rewritten
+        with self.path.open("rb") as f:
+            if size < self._offset or not self._tail_matches(f):
+                rewritten = True
+                self.reset()
+            if size == self._offset:
+                return [], rewritten
+            f.seek(self._offset)
+            chunk = f.read()
+        # Only consume complete lines; a half-written last line waits for the next call.
+        end = chunk.rfind(b"\n") + 1
+        if not end:
+            return [], rewritten
+        records = []
+        for line in chunk[:end].splitlines():
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(record, dict):
+                records.append(record)
+        self._offset += end
+        self._tail = chunk[:end][-self.TAIL_CHECK:]
+        return records, rewritten
+
+    def _tail_matches(self, f) -> bool:
+        if not self._offset:
+            return True
+        f.seek(self._offset - len(self._tail))
+        return f.read(len(self._tail)) == self._tail
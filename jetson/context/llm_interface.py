@@ -1,40 +1,231 @@
+import base64
+import json
 import logging
 import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
 import requests
 
+from jetson.metrics import metrics
+
+
+def _image_part(image, image_mime: str) -> dict:
+    """Build an inline image part from base64 text or raw bytes/memoryview."""
+    if isinstance(image, str):
+        data = image.split(",", 1)[1] if image.startswith("data:") else image
+    else:
+        data = base64.b64encode(image).decode("ascii")
+    return {"inline_data": {"mime_type": image_mime, "data": data}}
+
+
+class LLMError(Exception):
+    """The LLM request failed or returned unusable output."""
+
+    def __init__(self, message: str, status: int | None = None):
+        super().__init__(message)
+        self.status = status
+
+
+class LLMOutputError(LLMError):
+    """The LLM answered, but not in the requested format (worth a retry)."""
+
+
+class LLMTimeout(LLMError):
+    """No answer arrived before the turn deadline."""
+
+
+class LLMCacheMiss(LLMError):
+    """The referenced cachedContents entry was rejected (expired or deleted)."""
 
-def query_gemini(gemini_prompt: str) -> str:
+
+GEMINI_MODEL = "models/gemini-2.5-flash"
+GEMINI_URL = f"https://generativelanguage.googleapis.com/v1beta/{GEMINI_MODEL}:generateContent"
+GEMINI_CACHE_URL = "https://generativelanguage.googleapis.com/v1beta/cachedContents"
+LLM_TURN_DEADLINE = float(os.getenv("LLM_TURN_DEADLINE", "8.0"))  # seconds per turn, retries included
+LLM_HEDGE_MIN = float(os.getenv("LLM_HEDGE_MIN", "1.0"))  # never hedge earlier than this
+
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="llm")
+
+
+class LatencyTracker:
+    """Rolling window of request latencies; the hedge threshold is their p95."""
+
+    def __init__(self, window: int = 100, min_samples: int = 20, default: float = 3.0):
+        self._samples = deque(maxlen=window)
+        self.min_samples = min_samples
+        self.default = default
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def p95(self) -> float:
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return self.default
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+
+latency = LatencyTracker()
+
+
+def _headers() -> dict:
     api_key = os.getenv('GEMINI_API_KEY')
 
     if not api_key:
         raise ValueError("GEMINI_API_KEY environment variable not set.")
 
-    # Gemini 2.5 Flash (fast path)
-    url = "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash:generateContent"
+    return {
+        'x-goog-api-key': api_key,
+        'Content-Type': 'application/json'
+    }
+
 
+def _post(parts: list, generation_config: dict | None, timeout: float, cached_content: str | None = None) -> str:
     payload = {
         "contents": [
             {
-                "parts": [
-                    {
-                        "text": gemini_prompt
-                    }
-                ]
+                "role": "user",
+                "parts": parts
             }
         ]
     }
-    headers = {
-        'x-goog-api-key': api_key,
-        'Content-Type': 'application/json'
-    }
+    if generation_config:
+        payload["generationConfig"] = generation_config
+    if cached_content:
+        payload["cachedContent"] = cached_content
 
+    start = time.monotonic()
+    response = requests.post(GEMINI_URL, headers=_headers(), json=payload, timeout=timeout)
+    if cached_content and response.status_code in (400, 403, 404):
+        raise LLMCacheMiss(f"Cached prefix {cached_content} rejected ({response.status_code})")
+    response.raise_for_status()
+    result = response.json()
+    text = result['candidates'][0]['content']['parts'][0]['text']
+    elapsed = time.monotonic() - start
+    latency.record(elapsed)
+    metrics.observe("llm.request_seconds", elapsed)
+    return text
+
+
+def create_cached_content(text: str, ttl_seconds: int, timeout: float = 10.0) -> str:
+    """
+    Register `text` with Gemini's context cache; returns the cachedContents name.
+
+    Raises LLMError (with the HTTP status, if any) when the API refuses, e.g.
+    because the prefix is below the model's minimum cacheable size.
+    """
+    payload = {
+        "model": GEMINI_MODEL,
+        "contents": [{"role": "user", "parts": [{"text": text}]}],
+        "ttl": f"{int(ttl_seconds)}s",
+    }
     try:
-        response = requests.post(url, headers=headers, json=payload)
-        response.raise_for_status()
-        
-        result = response.json()
-        return result['candidates'][0]['content']['parts'][0]['text']
-        
+        response = requests.post(GEMINI_CACHE_URL, headers=_headers(), json=payload, timeout=timeout)
     except Exception as e:
-        logging.getLogger(__name__).error(f"Gemini Error: {e}")
-        return "There was an error with gemini processing your request."
+        raise LLMError(f"Gemini cache request failed: {e}") from e
+    if response.status_code >= 400:
+        raise LLMError(f"Gemini cache request refused ({response.status_code}): {response.text[:200]}", response.status_code)
+    return response.json()["name"]
+
+
+def _generate(
+    parts: list,
+    generation_config: dict | None = None,
+    deadline: float | None = None,
+    cached_content: str | None = None,
+) -> str:
+    """
+    Send the request, hedged: if it has not answered by the p95 latency, an
+    identical request is raced against it and the first success wins.
+    Raises LLMTimeout once `deadline` (time.monotonic()) passes.
+    """
+    _headers()  # fail fast without an API key
+    started = time.monotonic()
+    if deadline is None:
+        deadline = started + LLM_TURN_DEADLINE
+    remaining = deadline - started
+    if remaining <= 0:
+        raise LLMTimeout("LLM deadline already passed")
+
+    pending = {_executor.submit(_post, parts, generation_config, remaining, cached_content)}
+    hedge_at = time.monotonic() + max(LLM_HEDGE_MIN, latency.p95())
+    hedged = False
+    error = None
+    while pending:
+        now = time.monotonic()
+        if now >= deadline:
+            break
+        wait_until = deadline if hedged else min(hedge_at, deadline)
+        done, pending = wait(pending, timeout=wait_until - now, return_when=FIRST_COMPLETED)
+        for future in done:
+            try:
+                return future.result()
+            except LLMCacheMiss:
+                raise  # the caller re-sends with the prefix inline; a hedge would fail the same way
+            except Exception as e:
+                error = e
+                logging.getLogger(__name__).error(f"Gemini Error: {e}")
+        if not hedged and time.monotonic() < deadline and (not pending or time.monotonic() >= hedge_at):
+            # Slow (or failed) first attempt: race a duplicate against it.
+            hedged = True
+            metrics.incr("llm.hedged")
+            pending.add(_executor.submit(_post, parts, generation_config, deadline - time.monotonic(), cached_content))
+    if pending or error is None:
+        raise LLMTimeout(f"No Gemini response within {deadline - started:.1f}s deadline")
+    raise LLMError(f"Gemini request failed: {error}") from error
+
+
+def _parts(gemini_prompt: str, image, image_mime: str) -> list:
+    parts = [{"text": gemini_prompt}]
+    if image is not None:
+        parts.append(_image_part(image, image_mime))
+    return parts
+
+
+def query_gemini(
+    gemini_prompt: str,
+    image=None,
+    image_mime: str = "image/jpeg",
+    deadline: float | None = None,
+    cached_content: str | None = None,
+) -> str:
+    """
+    Free-text completion (Gemini 2.5 Flash). Raises LLMError on failure.
+
+    `cached_content` names a cachedContents entry that is prepended to the prompt.
+    """
+    return _generate(_parts(gemini_prompt, image, image_mime), deadline=deadline, cached_content=cached_content)
+
+
+def query_gemini_json(
+    gemini_prompt: str,
+    schema: dict,
+    image=None,
+    image_mime: str = "image/jpeg",
+    fast: bool = False,
+    deadline: float | None = None,
+    cached_content: str | None = None,
+) -> dict:
+    """
+    Structured completion constrained to `schema` (Gemini responseSchema).
+
+    `fast` disables thinking, for quick retries. Raises LLMError on request
+    failure, LLMOutputError if the output is not a JSON object.
+    """
+    config = {"responseMimeType": "application/json", "responseSchema": schema}
+    if fast:
+        config["thinkingConfig"] = {"thinkingBudget": 0}
+    text = _generate(_parts(gemini_prompt, image, image_mime), config, deadline, cached_content)
+    try:
+        data = json.loads(text)
+    except ValueError as e:
+        raise LLMOutputError(f"Gemini returned invalid JSON: {e}") from e
+    if not isinstance(data, dict):
+        raise LLMOutputError("Gemini returned JSON that is not an object")
+    return data
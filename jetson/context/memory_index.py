@@ -0,0 +1,181 @@
+"""
+Local vector index over conversation memories for per-turn retrieval.
+
+Highlights (and optionally individual conversation turns) are embedded into
+unit vectors and kept in one float32 NumPy matrix; a query is a single
+matrix-vector product plus a partial sort (top-k cosine similarity).
+
+The index follows its JSONL source file incrementally: appended lines are
+read from the last offset and embedded on the next search; a file that was
+rewritten (a highlight deleted or edited) is re-indexed from scratch.
+
+Embedders:
+    HashingEmbedder   default stand-in: hashed word/bigram/char-trigram
+                      features, no model download, deterministic
+    SentenceEmbedder  on-device sentence-transformers model
+                      (MEMORY_EMBEDDER=sentence-transformers, optional)
+"""
+
+import hashlib
+import logging
+import os
+import re
+import threading
+
+import numpy as np
+
+from jetson.context.jsonl_follow import JsonlFollower
+
+MEMORY_EMBEDDER = os.getenv("MEMORY_EMBEDDER", "hashing").lower()
+MEMORY_TOP_K = int(os.getenv("MEMORY_TOP_K", "3"))
+MEMORY_MIN_SCORE = float(os.getenv("MEMORY_MIN_SCORE", "0.1"))
+
+logger = logging.getLogger(__name__)
+
+_WORD = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+_STOPWORDS = frozenset(
+    "a an and are as at be but by do does for from had has have how i in is it its me my of on or "
+    "so that the their them they this to was we were what when where who why will with you your".split()
+)
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercase content words, possessives stripped ("Daisy's" -> "daisy")."""
+    return [w.split("'")[0] for w in _WORD.findall(text.lower()) if w not in _STOPWORDS]
+
+
+class HashingEmbedder:
+    """Feature-hashing bag of words, bigrams and character trigrams, L2-normalized."""
+
+    def __init__(self, dim: int = 512):
+        self.dim = dim
+
+    def _slot(self, feature: str) -> tuple[int, float]:
+        digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+        value = int.from_bytes(digest, "little")
+        return value % self.dim, 1.0 if value >> 63 else -1.0
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            words = tokenize(text)
+            features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+            for word in words:
+                padded = f"#{word}#"
+                features.extend(padded[i:i + 3] for i in range(len(padded) - 2))
+            for feature in features:
+                slot, sign = self._slot(feature)
+                out[row, slot] += sign
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        return out / np.maximum(norms, 1e-9)
+
+
+class SentenceEmbedder:
+    """On-device sentence-transformers model (optional dependency)."""
+
+    def __init__(self, model_name: str = "all-MiniLM-L6-v2"):
+        from sentence_transformers import SentenceTransformer  # lazy import; optional dependency
+
+        self._model = SentenceTransformer(model_name)
+        self.dim = self._model.get_sentence_embedding_dimension()
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        vectors = self._model.encode(texts, normalize_embeddings=True, convert_to_numpy=True)
+        return np.asarray(vectors, dtype=np.float32)
+
+
+def build_embedder():
+    if MEMORY_EMBEDDER == "sentence-transformers":
+        try:
+            return SentenceEmbedder(os.getenv("MEMORY_EMBEDDER_MODEL", "all-MiniLM-L6-v2"))
+        except Exception as exc:
+            logger.warning(f"Sentence embedder unavailable ({exc}); using hashing embedder.")
+    return HashingEmbedder()
+
+
+class MemoryIndex:
+    """Append-only matrix of unit vectors with top-k cosine search."""
+
+    def __init__(self, embedder=None, capacity: int = 256):
+        self.embedder = embedder or build_embedder()
+        self._vectors = np.zeros((capacity, self.embedder.dim), dtype=np.float32)
+        self.texts = []
+        self.meta = []
+
+    def __len__(self):
+        return len(self.texts)
+
+    def add(self, texts: list[str], meta: list[dict] | None = None):
+        if not texts:
+            return
+        vectors = self.embedder.embed(texts)
+        n, needed = len(self.texts), len(self.texts) + len(texts)
+        if needed > len(self._vectors):
+            grown = np.zeros((max(needed, 2 * len(self._vectors)), self.embedder.dim), dtype=np.float32)
+            grown[:n] = self._vectors[:n]
+            self._vectors = grown
+        self._vectors[n:needed] = vectors
+        self.texts.extend(texts)
+        self.meta.extend(meta or [{} for _ in texts])
+
+    def clear(self):
+        self.texts = []
+        self.meta = []
+
+    def search(self, query: str, k: int = MEMORY_TOP_K, min_score: float = MEMORY_MIN_SCORE) -> list[tuple[float, str, dict]]:
+        n = len(self.texts)
+        if not n or not query or not query.strip():
+            return []
+        scores = self._vectors[:n] @ self.embedder.embed([query])[0]
+        k = min(k, n)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(float(scores[i]), self.texts[i], self.meta[i]) for i in top if scores[i] >= min_score]
+
+
+class JsonlMemory:
+    """
+    A MemoryIndex kept in sync with a JSONL file.
+
+    `extract(record)` returns the text to index for a line (or None to skip it).
+    """
+
+    def __init__(self, path: str, extract, index: MemoryIndex | None = None):
+        self.follower = JsonlFollower(path)
+        self.extract = extract
+        self.index = index or MemoryIndex()
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        """Index lines appended since the last call; rebuild if the file was rewritten."""
+        with self._lock:
+            self._refresh()
+
+    def _refresh(self):
+        records, rewritten = self.follower.read_new()
+        if rewritten:
+            self.index.clear()
+        texts, meta = [], []
+        for record in records:
+            text = self.extract(record)
+            if text:
+                texts.append(text)
+                meta.append(record)
+        self.index.add(texts, meta)
+
+    def search(self, query: str, k: int = MEMORY_TOP_K, min_score: float = MEMORY_MIN_SCORE) -> list[tuple[float, str, dict]]:
+        with self._lock:
+            self._refresh()
+            return self.index.search(query, k, min_score)
+
+
+def highlight_text(record: dict) -> str | None:
+    text = record.get("highlight")
+    return text.strip() if isinstance(text, str) and text.strip() else None
+
+
+def turn_text(record: dict) -> str | None:
+    text = record.get("text")
+    if record.get("role") not in ("user", "addressee") or not isinstance(text, str) or not text.strip():
+        return None
+    return f"{record['role']}: {text.strip()}"
@@ -0,0 +1,101 @@
+"""
+Gemini context caching for the static part of the option prompt.
+
+The prompt is split into a stable prefix (instructions, core context,
+schedule summary, event context) and a per-turn suffix (time, recent turns,
+utterance). The prefix is versioned by its content hash and registered once
+with Gemini's cachedContents API; later turns send only the suffix and
+reference the cache, saving input tokens and prefill time.
+
+Caching is best-effort (LLM_PROMPT_CACHE=auto|off). Prefixes below the
+model's minimum cacheable size, refused registrations and expired entries
+all fall back to sending the prefix inline.
+"""
+
+import hashlib
+import logging
+import os
+import threading
+import time
+
+from jetson.context.llm_interface import LLMError, create_cached_content
+
+LLM_PROMPT_CACHE = os.getenv("LLM_PROMPT_CACHE", "auto").lower()
+PROMPT_CACHE_TTL = int(os.getenv("LLM_PROMPT_CACHE_TTL", "3600"))  # seconds
+MIN_CACHE_CHARS = 4096  # ~1024 tokens, Gemini 2.5 Flash's minimum cache size
+DISABLE_SECONDS = 600.0  # back off this long when the API does not support caching
+
+logger = logging.getLogger(__name__)
+
+
+def prefix_version(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+class PrefixCache:
+    """Maps prefix versions to live cachedContents names."""
+
+    def __init__(self, enabled: bool | None = None, ttl: int = PROMPT_CACHE_TTL, min_chars: int = MIN_CACHE_CHARS):
+        self.enabled = LLM_PROMPT_CACHE != "off" if enabled is None else enabled
+        self.ttl = ttl
+        self.min_chars = min_chars
+        self._entries = {}  # version -> (name, expires_at)
+        self._rejected = set()  # versions the API refused to cache
+        self._inflight = set()
+        self._disabled_until = 0.0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, prefix: str, register: bool = True) -> str | None:
+        """
+        Return the cache name for `prefix`, registering it if needed.
+
+        Returns None (send the prefix inline) when caching is off or not
+        possible, or while another thread is registering the same prefix.
+        """
+        if not self.enabled or len(prefix) < self.min_chars:
+            return None
+        version = prefix_version(prefix)
+        with self._lock:
+            entry = self._entries.get(version)
+            # Re-register a minute before expiry rather than racing it.
+            if entry is not None and entry[1] - 60 > time.monotonic():
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+            if (
+                not register
+                or version in self._rejected
+                or version in self._inflight
+                or time.monotonic() < self._disabled_until
+            ):
+                return None
+            self._inflight.add(version)
+        try:
+            name = create_cached_content(prefix, self.ttl)
+        except LLMError as exc:
+            with self._lock:
+                if exc.status in (400, 413):
+                    self._rejected.add(version)  # e.g. below the minimum size for this model
+                else:
+                    self._disabled_until = time.monotonic() + DISABLE_SECONDS
+            logger.warning(f"Prompt prefix caching unavailable: {exc}")
+            return None
+        except Exception as exc:
+            logger.warning(f"Prompt prefix caching unavailable: {exc}")
+            return None
+        finally:
+            with self._lock:
+                self._inflight.discard(version)
+        logger.info(f"Registered prompt prefix {version} as {name}")
+        with self._lock:
+            self._entries[version] = (name, time.monotonic() + self.ttl)
+        return name
+
+    def invalidate(self, prefix: str):
+        with self._lock:
+            self._entries.pop(prefix_version(prefix), None)
+
+
+prefix_cache = PrefixCache()
@@ -0,0 +1,100 @@
+"""
+Precompiled prompt templates with per-section token estimates.
+
+A template is plain text with `{section}` placeholders. It is parsed once
+into literal and field segments; rendering appends strings to a list and
+joins them once. A line whose placeholders all render empty is dropped, so
+optional context ("Schedule context: {schedule}") needs no if-chains. Lines
+between `{#section}` and `{/section}` (each on its own line) are dropped
+when that section is empty, for headers above multi-line sections.
+
+Token counts are estimated (~4 characters per token for English) per
+section, plus "template" for the fixed wording, and can be pushed to
+jetson.metrics as `prompt.tokens.<template>.<section>`.
+"""
+
+import string
+import textwrap
+
+from jetson.metrics import metrics
+
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+class RenderedPrompt:
+    def __init__(self, text: str, tokens: dict):
+        self.text = text
+        self.tokens = tokens  # section -> estimated tokens
+
+    @property
+    def total_tokens(self) -> int:
+        return sum(self.tokens.values())
+
+    def __str__(self):
+        return self.text
+
+
+class PromptTemplate:
+    def __init__(self, name: str, source: str):
+        self.name = name
+        self._lines = []  # [(segments, fields, guards)], segment = (is_field, text_or_name)
+        self.fields = []
+        guards = []
+        for line in textwrap.dedent(source).strip("\n").splitlines(keepends=True):
+            marker = line.strip()
+            if marker.startswith("{#") and marker.endswith("}"):
+                guards.append(marker[2:-1])
+                self._add_field(guards[-1])
+                continue
+            if marker.startswith("{/") and marker.endswith("}"):
+                if not guards or guards[-1] != marker[2:-1]:
+                    raise ValueError(f"Template {name}: unbalanced block {marker}")
+                guards.pop()
+                continue
+            segments, fields = [], []
+            for literal, field, _, _ in string.Formatter().parse(line):
+                if literal:
+                    segments.append((False, literal))
+                if field is not None:
+                    segments.append((True, field))
+                    fields.append(field)
+                    self._add_field(field)
+            self._lines.append((segments, fields, tuple(guards)))
+        if guards:
+            raise ValueError(f"Template {name}: unclosed block {{#{guards[-1]}}}")
+
+    def _add_field(self, field: str):
+        if field not in self.fields:
+            self.fields.append(field)
+
+    def render(self, **sections) -> RenderedPrompt:
+        values = {field: str(sections.get(field) or "") for field in self.fields}
+        out = []
+        literal_chars = 0
+        used = set()
+        for segments, fields, guards in self._lines:
+            if fields and not any(values[f] for f in fields):
+                continue
+            if not all(values[g] for g in guards):
+                continue
+            for is_field, text in segments:
+                if is_field:
+                    out.append(values[text])
+                    used.add(text)
+                else:
+                    out.append(text)
+                    literal_chars += len(text)
+        tokens = {"template": (literal_chars + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN}
+        for field in self.fields:
+            tokens[field] = estimate_tokens(values[field]) if field in used else 0
+        return RenderedPrompt("".join(out), tokens)
+
+    def record(self, rendered: RenderedPrompt):
+        """Send per-section token estimates to metrics."""
+        for section, count in rendered.tokens.items():
+            metrics.observe(f"prompt.tokens.{self.name}.{section}", count)
+        metrics.observe(f"prompt.tokens.{self.name}.total", rendered.total_tokens)
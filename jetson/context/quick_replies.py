@@ -0,0 +1,142 @@
+"""
+Instant quick replies learned from the user's own selection history.
+
+conversation_logs.log holds, per session, what the addressee said and which
+option the user picked next. Those (utterance -> reply) pairs go into an
+inverted index over utterance words and bigrams. A new utterance is scored
+with TF-IDF against past utterances, and the replies of the best matches are
+returned in well under 10 ms, so the server can show them as provisional
+options while the LLM call is still running.
+
+The index follows the log incrementally (appended lines only) and is rebuilt
+if the file is rewritten.
+"""
+
+import logging
+import math
+import threading
+from collections import Counter, defaultdict
+
+from jetson.context.fallback_options import DEFAULT_OPTIONS, bucket_reply
+from jetson.context.jsonl_follow import JsonlFollower
+from jetson.context.memory_index import tokenize
+
+CONVERSATION_LOG = "user_context/conversation_logs.log"
+
+logger = logging.getLogger(__name__)
+
+
+def _terms(text: str) -> list[str]:
+    words = tokenize(text)
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+class QuickReplyIndex:
+    def __init__(self, log_path: str = CONVERSATION_LOG):
+        self.follower = JsonlFollower(log_path)
+        self._lock = threading.Lock()
+        self._clear()
+
+    def _clear(self):
+        self._postings = defaultdict(dict)  # term -> {pair_id: term count}
+        self._pair_ids = {}  # (utterance, reply) -> pair_id; repeats add weight
+        self._replies = []  # pair_id -> reply text
+        self._lengths = []  # pair_id -> number of terms
+        self._weights = []  # pair_id -> times seen
+        self._reply_counts = Counter()
+        self._last_utterance = {}  # session_id -> addressee text awaiting a reply
+
+    def __len__(self):
+        return sum(self._weights)
+
+    def _add_pair(self, utterance: str, reply: str):
+        key = (utterance.lower(), reply)
+        pair_id = self._pair_ids.get(key)
+        if pair_id is not None:
+            self._weights[pair_id] += 1
+            self._reply_counts[reply] += 1
+            return
+        terms = Counter(_terms(utterance))
+        if not terms:
+            return
+        pair_id = self._pair_ids[key] = len(self._replies)
+        self._replies.append(reply)
+        self._lengths.append(sum(terms.values()))
+        self._weights.append(1)
+        self._reply_counts[reply] += 1
+        for term, count in terms.items():
+            self._postings[term][pair_id] = count
+
+    def refresh(self):
+        with self._lock:
+            self._refresh()
+
+    def _refresh(self):
+        records, rewritten = self.follower.read_new()
+        if rewritten:
+            self._clear()
+        for record in records:
+            text = record.get("text")
+            if not isinstance(text, str) or not text.strip():
+                continue
+            session = record.get("session_id")
+            role = record.get("role")
+            if role == "addressee":
+                self._last_utterance[session] = text.strip()
+            elif role == "user":
+                utterance = self._last_utterance.pop(session, None)
+                if utterance:
+                    self._add_pair(utterance, text.strip())
+
+    def suggest(self, utterance: str, k: int = 3) -> list[str]:
+        """
+        Up to k distinct past replies to utterances like this one, best first.
+
+        Replies are scored by summed TF-IDF similarity of their utterances,
+        with a small boost for replies the user picks often.
+        """
+        with self._lock:
+            self._refresh()
+            n = len(self._replies)
+            if not n or not utterance:
+                return []
+            scores = defaultdict(float)
+            for term in set(_terms(utterance)):
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + n / len(postings))
+                for pair_id, count in postings.items():
+                    scores[pair_id] += idf * count / self._lengths[pair_id] * self._weights[pair_id]
+            by_reply = defaultdict(float)
+            for pair_id, score in scores.items():
+                by_reply[self._replies[pair_id]] += score
+            ranked = sorted(
+                by_reply.items(),
+                key=lambda item: item[1] * (1 + 0.1 * math.log(self._reply_counts[item[0]])),
+                reverse=True,
+            )
+            return [reply for reply, _ in ranked[:k]]
+
+    def provisional_options(self, utterance: str) -> list[str] | None:
+        """
+        Three options (agree, disagree, question) for display before the LLM
+        answers, or None if nothing in the history matches the utterance.
+        """
+        candidates = self.suggest(utterance, k=10)
+        if not candidates:
+            return None
+        slots = [None, None, None]
+        for reply in candidates:
+            bucket = bucket_reply(reply)
+            if slots[bucket] is None:
+                slots[bucket] = reply
+        # Empty buckets get the user's most frequent reply of that kind, as in fallback_options.
+        with self._lock:
+            for reply, _ in self._reply_counts.most_common():
+                if all(slots):
+                    break
+                bucket = bucket_reply(reply)
+                if slots[bucket] is None:
+                    slots[bucket] = reply
+        return [slot or default for slot, default in zip(slots, DEFAULT_OPTIONS)]
@@ -1,23 +1,165 @@
 import logging
+import os
+import time
 from datetime import datetime
 
 from jetson.context.context import Context
-from jetson.context.llm_interface import query_gemini
+from jetson.context.fallback_options import fallback_options
+from jetson.context.llm_interface import (
+    LLM_TURN_DEADLINE,
+    LLMCacheMiss,
+    LLMError,
+    LLMOutputError,
+    query_gemini,
+    query_gemini_json,
+)
+from jetson.context.prompt_cache import prefix_cache
+from jetson.context.prompt_template import PromptTemplate, RenderedPrompt, estimate_tokens
+from jetson.metrics import metrics
 
+# "json" (default): Gemini responseSchema with one field per option; "text": legacy 'a|b|c' output.
+LLM_OUTPUT_MODE = os.getenv("LLM_OUTPUT_MODE", "json").lower()
 
-def _history_prefix(history: list) -> str:
-    """Format conversation history into a short prefix."""
-    now_iso = datetime.now().isoformat()
-    parts = [f"Current time: {now_iso}"]
-    if not history:
-        return "\n".join(parts) + "\n"
+OPTION_FIELDS = ("agree", "disagree", "question")
+OPTIONS_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "agree": {"type": "STRING", "description": "Concise response that agrees and is positive."},
+        "disagree": {"type": "STRING", "description": "Concise response that disagrees or is negative."},
+        "question": {"type": "STRING", "description": "Concise follow-up question."},
+    },
+    "required": list(OPTION_FIELDS),
+    "propertyOrdering": list(OPTION_FIELDS),
+}
+JSON_INSTRUCTION = "Return the three options as JSON with the fields agree, disagree and question."
+TEXT_INSTRUCTION = "Return only the three options, separated by '|'."
+
+PROMPT_PREFIX_VERSION = 1  # bump when the static prompt wording changes
+
+# Session-stable part; cached server-side by content (see prompt_cache), so
+# nothing that changes per turn (time, history, utterance) may go in here.
+OPTIONS_PREFIX = PromptTemplate(
+    "options_prefix",
+    f"""
+    [prompt v{PROMPT_PREFIX_VERSION}]
+    You are an assistant helping someone with speech impediments to come up with responses.
+    Ensure that one response agrees and is positive, another disagrees or is negative and the last option is a follow-up question.
+    {{output_format}}
+    Information on device user (who you are coming up with responses for): {{core}}
+    Schedule context: {{schedule}}
+    Event context: {{event}}
+    """,
+)
+
+_TURN_HEAD = """
+    {#memories}
+    Relevant memories from earlier conversations:
+    {memories}
+    {/memories}
+    Current time: {time}
+    {#history}
+    Conversation so far:
+    {history}
+    {/history}
+"""
+OPTIONS_TURN_AUDIO_IMAGE = PromptTemplate(
+    "options_turn",
+    _TURN_HEAD + """    Give three concise responses after hearing: "{utterance}" and seeing the attached image.\n""",
+)
+OPTIONS_TURN_IMAGE = PromptTemplate(
+    "options_turn",
+    _TURN_HEAD + """    Give three concise responses after seeing the attached image.\n""",
+)
+OPTIONS_TURN_AUDIO = PromptTemplate(
+    "options_turn",
+    _TURN_HEAD + """    Give three concise responses after hearing this text: {utterance}.\n""",
+)
+
+
+def _history_lines(history: list) -> str:
+    """Format conversation history as one 'role: text' line per turn."""
+    lines = []
     for turn in history:
         role = turn.get("role", "user")
         text = turn.get("text", "")
         if isinstance(text, list):
             text = "; ".join([str(t) for t in text if t])
-        parts.append(f"{role}: {text}")
-    return parts[0] + "\nConversation so far:\n" + "\n".join(parts[1:]) + "\n"
+        lines.append(f"{role}: {text}")
+    return "\n".join(lines)
+
+
+def parse_options(raw) -> list[str] | None:
+    """
+    Validate model output as exactly three non-empty options.
+
+    Accepts the structured form ({"agree", "disagree", "question"}) or the
+    legacy 'a|b|c' string; returns None if the output is malformed.
+    """
+    if isinstance(raw, dict):
+        opts = [raw.get(field) for field in OPTION_FIELDS]
+    elif isinstance(raw, str):
+        opts = raw.split("|")
+    else:
+        return None
+    if len(opts) != 3 or not all(isinstance(o, str) and o.strip() for o in opts):
+        return None
+    return [o.strip() for o in opts]
+
+
+def build_static_prefix(schedule_context: str = "", core_context: str = "", event_context: str = "") -> RenderedPrompt:
+    """The part of the option prompt that stays the same for a whole session."""
+    return OPTIONS_PREFIX.render(
+        output_format=JSON_INSTRUCTION if LLM_OUTPUT_MODE == "json" else TEXT_INSTRUCTION,
+        core=core_context,
+        schedule=schedule_context,
+        event=event_context,
+    )
+
+
+def _query_options(prefix: str, suffix: str, image, image_mime: str, fast: bool, deadline: float | None):
+    """One LLM call; the prefix is referenced from Gemini's cache when possible."""
+    # Never register here: that is a blocking API call. warm_prompt_cache does it off the turn.
+    cached = prefix_cache.lookup(prefix, register=False)
+    for cached_content in ((cached, None) if cached else (None,)):
+        prompt = suffix if cached_content else prefix + "\n" + suffix
+        metrics.observe("prompt.tokens.sent", estimate_tokens(prompt))
+        try:
+            if LLM_OUTPUT_MODE == "json":
+                return query_gemini_json(
+                    prompt,
+                    OPTIONS_SCHEMA,
+                    image=image,
+                    image_mime=image_mime,
+                    fast=fast,
+                    deadline=deadline,
+                    cached_content=cached_content,
+                )
+            return query_gemini(prompt, image=image, image_mime=image_mime, deadline=deadline, cached_content=cached_content)
+        except LLMCacheMiss as exc:
+            logging.getLogger(__name__).warning(f"{exc}; sending the prompt prefix inline.")
+            prefix_cache.invalidate(prefix)
+
+
+def _generate_options(
+    prefix: str,
+    suffix: str,
+    image=None,
+    image_mime: str = "image/jpeg",
+    deadline: float | None = None,
+) -> list[str]:
+    """Query the LLM for three options, retrying once (fast) on malformed output."""
+    logger = logging.getLogger(__name__)
+    for attempt in range(2):
+        try:
+            raw = _query_options(prefix, suffix, image, image_mime, attempt > 0, deadline)
+        except LLMOutputError as exc:
+            logger.warning(f"Malformed LLM output (attempt {attempt + 1}): {exc}")
+            continue
+        opts = parse_options(raw)
+        if opts is not None:
+            return opts
+        logger.warning(f"Malformed LLM options (attempt {attempt + 1}): {raw!r}")
+    raise LLMError("LLM returned malformed options twice")
 
 
 def set_response(
@@ -26,60 +168,59 @@ def set_response(
     schedule_context: str = "",
     core_context: str = "",
     event_context: str = "",
+    memories: str = "",
 ) -> bool:
     logging.getLogger(__name__).debug(f"Calling LLM with context: {context}")
-    prefix = _history_prefix(history or [])
-    if schedule_context:
-        prefix = prefix + f"Schedule context: {schedule_context}\n"
-    if core_context:
-        prefix = prefix + f"Information on device user (who you are coming up with responses for): {core_context}\n"
-    if event_context:
-        prefix = prefix + f"Event context: {event_context}\n"
+    # One deadline for the whole turn, including hedged requests and the retry.
+    started = time.monotonic()
+    deadline = started + LLM_TURN_DEADLINE
+    # Empty text (e.g. a camera frame with audio_data="") counts as no utterance: a
+    # template line whose only field is empty is dropped, instruction included.
+    heard = bool(context.audio_text and context.audio_text.strip())
+    if context.image is not None and heard:
+        template = OPTIONS_TURN_AUDIO_IMAGE
+    elif context.image is not None:
+        template = OPTIONS_TURN_IMAGE
+    elif heard:
+        template = OPTIONS_TURN_AUDIO
+    else:
+        logging.getLogger(__name__).error("No input data received in context.")
+        return False
+
+    prefix = build_static_prefix(schedule_context, core_context, event_context)
+    turn = template.render(
+        time=datetime.now().isoformat(),
+        history=_history_lines(history or []),
+        utterance=context.audio_text,
+        memories=memories,
+    )
+    OPTIONS_PREFIX.record(prefix)
+    template.record(turn)
     try:
-        if context.image is not None and context.audio_text is not None:
-            response = query_gemini(
-                f"""You are helping someone with speech impediments to come up with responses. {prefix}. 
-                Give three concise responses after hearing: "{context.audio_text}" and seeing this image: {context.image}.
-                Ensure that one response agrees and is positive, another disagrees or is negative and the last option is a follow-up question.
-                Return only the three options, separated by '|'.
-                """
-            )
-            context.response = response
-            return True
-        
-        elif context.image is not None and context.audio_text is None:
-            response = query_gemini(
-                f"""You are an assistant helping someone with speech impediments to come up with responses.
-                {prefix}. 
-                Give three concise responses after seeing this image: {context.image}.
-                Ensure that one response agrees and is positive, another disagrees or is negative and the last option is a follow-up question.
-                Return only the three options, separated by '|'.
-                """
-
-            )
-            context.response = response
-            return True
-        
-        elif context.image is None and context.audio_text is not None:
-            response = query_gemini(
-                f"""You are an assistant helping someone with speech impediments to come up with responses.
-                {prefix}. 
-                Give three concise responses after hearing this text: {context.audio_text}.
-                Ensure that one response agrees and is positive, another disagrees or is negative and the last option is a follow-up question.
-                Return only the three options, separated by '|'.
-                """
-            )
-            context.response = response
-            return True
-
-        else:
-            logging.getLogger(__name__).error("No input data received in context.")
-            return False
+        context.response = _generate_options(
+            prefix.text,
+            turn.text,
+            image=context.image,
+            image_mime=context.image_mime,
+            deadline=deadline,
+        )
+        context.source = "llm"
+        metrics.observe("llm.turn_seconds", time.monotonic() - started)
+        return True
 
     except Exception as e:
-        logging.getLogger(__name__).error(f"LLM Error: {e}")
-        context.response = "Default response as long as the api key is not set."
-        return False
+        # Never leave the user with nothing: offer their usual replies instead.
+        logging.getLogger(__name__).error(f"LLM Error: {e}; using fallback options")
+        context.response = fallback_options()
+        context.source = "fallback"
+        context.fallback_reason = str(e) or type(e).__name__
+        metrics.incr("llm.fallbacks")
+        return True
+
+
+def warm_prompt_cache(schedule_context: str = "", core_context: str = "", event_context: str = ""):
+    """Register (or renew) the session's static prefix off the turn path (blocking; run in a thread)."""
+    prefix_cache.lookup(build_static_prefix(schedule_context, core_context, event_context).text)
 
 
 def create_context(data: dict) -> Context:
@@ -94,5 +235,6 @@ def create_context(data: dict) -> Context:
         image_data = data.get("image_data")
         logging.getLogger(__name__).info(f"Received image data from HoloLens")
         context.image = image_data
+        context.image_mime = data.get("image_mime") or "image/jpeg"
 
     return context
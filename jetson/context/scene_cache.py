@@ -0,0 +1,117 @@
+"""
+Perceptual-hash dedup for camera frames.
+
+Consecutive HoloLens frames of the same scene would otherwise trigger
+identical multimodal LLM calls. Each frame is reduced to a 64-bit difference
+hash (dHash) with NumPy; a frame whose hash is within a small Hamming distance
+of a recent one (and that comes with the same utterance) reuses that response.
+
+Decoding JPEG/PNG needs Pillow; without it frames fall back to an exact
+content digest, so only byte-identical frames are deduplicated.
+"""
+
+import base64
+import hashlib
+import io
+import logging
+import os
+from collections import deque
+
+import numpy as np
+
+HASH_SIZE = 8
+SCENE_HASH_THRESHOLD = int(os.getenv("SCENE_HASH_THRESHOLD", "6"))  # differing bits out of 64
+SCENE_CACHE_SIZE = int(os.getenv("SCENE_CACHE_SIZE", "16"))
+
+
+def _image_bytes(image):
+    """Return raw encoded image bytes from base64 text or a bytes-like object."""
+    if isinstance(image, str):
+        data = image.split(",", 1)[1] if image.startswith("data:") else image
+        return base64.b64decode(data)
+    return image
+
+
+def _decode_gray(buf) -> np.ndarray | None:
+    try:
+        from PIL import Image  # lazy import; optional dependency
+    except ImportError:
+        return None
+    try:
+        img = Image.open(io.BytesIO(buf))
+        # JPEG draft mode decodes at reduced scale, which is all a 9x8 hash needs.
+        img.draft("L", (HASH_SIZE * 8, HASH_SIZE * 8))
+        return np.asarray(img.convert("L"), dtype=np.float32)
+    except Exception as exc:
+        logging.getLogger(__name__).warning(f"Failed to decode frame for hashing: {exc}")
+        return None
+
+
+def _block_mean(gray: np.ndarray, rows: int, cols: int) -> np.ndarray:
+    """Area-downsample a grayscale image to rows x cols block means."""
+    h, w = gray.shape
+    if h < rows or w < cols:
+        gray = np.repeat(np.repeat(gray, -(-rows // h), axis=0), -(-cols // w), axis=1)
+        h, w = gray.shape
+    row_edges = np.linspace(0, h, rows + 1).astype(np.intp)
+    col_edges = np.linspace(0, w, cols + 1).astype(np.intp)
+    sums = np.add.reduceat(np.add.reduceat(gray, row_edges[:-1], axis=0), col_edges[:-1], axis=1)
+    counts = np.outer(np.diff(row_edges), np.diff(col_edges))
+    return sums / counts
+
+
+def perceptual_hash(gray: np.ndarray) -> int:
+    """64-bit dHash: compare each block with its right-hand neighbour."""
+    grid = _block_mean(gray, HASH_SIZE, HASH_SIZE + 1)
+    bits = grid[:, 1:] > grid[:, :-1]
+    return int.from_bytes(np.packbits(bits.ravel()).tobytes(), "big")
+
+
+def frame_signature(image) -> tuple[int, bool] | None:
+    """
+    Hash a frame for dedup.
+
+    Returns (hash, exact) where exact=True means the hash is a content digest
+    (no image decoder available) and only matches identical frames.
+    """
+    try:
+        buf = _image_bytes(image)
+    except Exception as exc:
+        logging.getLogger(__name__).warning(f"Failed to read frame for hashing: {exc}")
+        return None
+    gray = _decode_gray(buf)
+    if gray is not None and gray.size:
+        return perceptual_hash(gray), False
+    digest = hashlib.blake2b(buf, digest_size=8).digest()
+    return int.from_bytes(digest, "big"), True
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+class SceneCache:
+    """Bounded per-session cache of recent scene hashes and their responses."""
+
+    def __init__(self, capacity: int = SCENE_CACHE_SIZE, threshold: int = SCENE_HASH_THRESHOLD):
+        self.threshold = threshold
+        self._entries = deque(maxlen=capacity)
+        self.hits = 0
+        self.misses = 0
+
+    def match(self, signature: tuple[int, bool], audio_text: str | None):
+        """Return the cached response for a near-identical scene and utterance, or None."""
+        frame_hash, exact = signature
+        for entry_hash, entry_exact, entry_text, response in reversed(self._entries):
+            if entry_text != audio_text or entry_exact != exact:
+                continue
+            limit = 0 if exact else self.threshold
+            if hamming(frame_hash, entry_hash) <= limit:
+                self.hits += 1
+                return response
+        self.misses += 1
+        return None
+
+    def add(self, signature: tuple[int, bool], audio_text: str | None, response):
+        frame_hash, exact = signature
+        self._entries.append((frame_hash, exact, audio_text, response))
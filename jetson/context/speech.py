@@ -1,21 +1,43 @@
-import asyncio
-import websockets
 import queue
 import threading
 
+import speech_recognition as sr
+
+from jetson.context.transcription import LOCAL_SAMPLE_RATE, GoogleWebBackend, PocketSphinxBackend
+
+
+# Shared backends so the PocketSphinx model is loaded once per process.
+_sphinx = PocketSphinxBackend()
+_google_web = GoogleWebBackend()
+
 
 class VoiceCollector:
     """
     Collects audio data from the microphone in the background using the 
     speech_recognition library's non-blocking listener.
+
+    Raw audio is appended to a single bytearray as phrases arrive (linear
+    time, capped at `max_seconds`), and each phrase is also handed to
+    consumers iterating over the collector, so they can start transcribing
+    while recording continues:
+
+        vc.start()
+        for chunk in vc:          # sr.AudioData per phrase; ends after stop()
+            print(offline_stt(chunk))
     """
-    def __init__(self):
+    def __init__(self, max_seconds: float = 300.0, max_pending_chunks: int = 64):
         self.recognizer = sr.Recognizer()
         self.mic = sr.Microphone()
-        self.audio_queue = queue.Queue()
+        self.max_seconds = max_seconds
+        self.audio_queue = queue.Queue(maxsize=max_pending_chunks)  # phrases not yet consumed
         self.listening = False  # The state flag
         # Holds the function provided by listen_in_background to stop listening.
         self.stop_listening_callback = None 
+        self._buffer = bytearray()
+        self._buffer_lock = threading.Lock()
+        self._sample_rate = None
+        self._sample_width = None
+        self.dropped_bytes = 0
 
     def _listen_callback(self, recognizer, audio):
         """
@@ -24,8 +46,40 @@ class VoiceCollector:
         """
         # Only process audio if the start() method hasn't been cancelled by stop()
         # This check is good practice but less critical than the one in start()
-        if self.listening:
-            self.audio_queue.put(audio)
+        if not self.listening:
+            return
+        with self._buffer_lock:
+            if self._sample_rate is None:
+                self._sample_rate = audio.sample_rate
+                self._sample_width = audio.sample_width
+            self._buffer += audio.frame_data
+            # Keep memory bounded: drop the oldest audio beyond max_seconds.
+            limit = int(self.max_seconds * self._sample_rate) * self._sample_width
+            excess = len(self._buffer) - limit
+            if excess > 0:
+                del self._buffer[:excess]
+                self.dropped_bytes += excess
+        self._offer(audio)
+
+    def _offer(self, item):
+        # A consumer that falls behind loses the oldest phrases, not the newest.
+        while True:
+            try:
+                self.audio_queue.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    self.audio_queue.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def __iter__(self):
+        """Yield each recorded phrase as sr.AudioData until stop() is called."""
+        while True:
+            item = self.audio_queue.get()
+            if item is None:
+                return
+            yield item
 
     def start(self):
         """
@@ -38,7 +92,12 @@ class VoiceCollector:
             print("--- WARNING: VoiceCollector is already listening. Ignoring start() call. ---")
             return
             
-        self.audio_queue = queue.Queue()
+        self.audio_queue = queue.Queue(maxsize=self.audio_queue.maxsize)
+        with self._buffer_lock:
+            self._buffer = bytearray()
+            self._sample_rate = None
+            self._sample_width = None
+            self.dropped_bytes = 0
         self.listening = True # Set the state immediately before starting the listener
 
         # --- Refinement: Ambient noise adjustment only needs to be done once,
@@ -62,6 +121,13 @@ class VoiceCollector:
             phrase_time_limit=3
         )
 
+    def audio_data(self):
+        """Snapshot of everything recorded so far as one sr.AudioData (None if empty)."""
+        with self._buffer_lock:
+            if not self._buffer:
+                return None
+            return sr.AudioData(bytes(self._buffer), self._sample_rate, self._sample_width)
+
     def stop(self):
         """
         Stop capturing audio, safely terminate the background thread, 
@@ -83,30 +149,21 @@ class VoiceCollector:
             print("--- DEBUG: stop_listening callback returned successfully ---")
 
         self.listening = False # Reset the state
-        
-        # Retrieve all collected audio chunks from the queue
-        items = list(self.audio_queue.queue)
-        
-        if not items:
-            return None
+        # Wake up any iterating consumer.
+        self._offer(None)
+
+        # The chunks were appended as they arrived; this is a single copy.
+        return self.audio_data()
 
-        # Combine all recorded AudioData objects into a single object
-        combined = items[0]
-        for frame in items[1:]:
-            combined = sr.AudioData(
-                combined.frame_data + frame.frame_data,
-                combined.sample_rate,
-                combined.sample_width
-            )
-        return combined
+
+def _audio_pcm(audio_data) -> bytes:
+    return audio_data.get_raw_data(convert_rate=LOCAL_SAMPLE_RATE, convert_width=2)
 
 
 def offline_stt(audio_data):
     """Convert audio to text using offline PocketSphinx."""
-    recognizer = sr.Recognizer()
     try:
-        text = recognizer.recognize_sphinx(audio_data)
-        return text
+        return _sphinx.transcribe_sync(_audio_pcm(audio_data), LOCAL_SAMPLE_RATE)
     except Exception as e:
         print("Speech recognition error:", e)
         return ""
@@ -117,14 +174,8 @@ def online_stt_web(audio_data):
     Convert audio to text using the free online Google Web Speech API.
     (Requires internet access)
     """
-    recognizer = sr.Recognizer()
     try:
-        # We use recognize_google() instead of recognize_sphinx()
-        text = recognizer.recognize_google(audio_data)
-        return text
-    except sr.UnknownValueError:
-        print("Google Web Speech API could not understand audio")
-        return ""
+        return _google_web.transcribe_sync(_audio_pcm(audio_data), LOCAL_SAMPLE_RATE)
     except sr.RequestError as e:
         # Check for network issues or service limits
         print(f"Could not request results from Google Web Speech API; {e}")
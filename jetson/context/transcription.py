@@ -0,0 +1,345 @@
+"""
+Speech-to-text backends and the engine that picks between them.
+
+A backend turns 16-bit mono PCM into text. Audio stays in memory (an
+in-memory WAV is built only for APIs that need a file), and API clients are
+created once and reused so their keep-alive connections skip per-utterance
+TLS setup.
+
+Backends:
+    WhisperBackend       cloud, OpenAI Whisper (OPENAI_API_KEY)
+    GoogleWebBackend     cloud, free Google Web Speech API via SpeechRecognition
+    PocketSphinxBackend  local CPU, streams partial hypotheses
+
+SttEngine chooses local or cloud per utterance from a latency budget and
+whether the cloud backend is currently reachable (STT_BACKEND=auto|cloud|local,
+STT_LATENCY_BUDGET seconds).
+"""
+
+import asyncio
+import io
+import logging
+import os
+import threading
+import time
+import wave
+
+import numpy as np
+
+LOCAL_SAMPLE_RATE = 16000
+
+
+def pcm_to_wav(pcm: bytes | bytearray | memoryview, sample_rate: int = 16000, sample_width: int = 2) -> io.BytesIO:
+    """Wrap raw mono PCM in an in-memory WAV file positioned at the start."""
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(sample_width)
+        wf.setframerate(sample_rate)
+        wf.writeframes(pcm)
+    buf.seek(0)
+    return buf
+
+
+def read_wav_pcm(path: str) -> tuple[bytes, int]:
+    """Read a mono 16-bit WAV file into (pcm, sample_rate)."""
+    with wave.open(path, "rb") as wf:
+        if wf.getnchannels() != 1 or wf.getsampwidth() != 2:
+            raise ValueError(f"{path}: expected mono 16-bit PCM WAV")
+        return wf.readframes(wf.getnframes()), wf.getframerate()
+
+
+def resample_pcm(pcm: bytes | bytearray | memoryview, from_rate: int, to_rate: int) -> bytes:
+    """Linear-interpolation resample of 16-bit mono PCM."""
+    if from_rate == to_rate:
+        return bytes(pcm)
+    samples = np.frombuffer(pcm, dtype=np.int16).astype(np.float32)
+    if not samples.size:
+        return b""
+    n_out = int(round(samples.size * to_rate / from_rate))
+    positions = np.linspace(0, samples.size - 1, n_out)
+    return np.interp(positions, np.arange(samples.size), samples).astype(np.int16).tobytes()
+
+
+class TranscriptionBackend:
+    """Interface for STT backends; `transcribe` is a coroutine so it overlaps with capture."""
+
+    name = "base"
+    local = False  # True if it runs on-device without network access
+
+    async def transcribe(self, pcm: bytes, sample_rate: int = 16000) -> str:
+        # Blocking backends only implement transcribe_sync; run them off the event loop.
+        return await asyncio.to_thread(self.transcribe_sync, pcm, sample_rate)
+
+    def transcribe_sync(self, pcm: bytes, sample_rate: int = 16000) -> str:
+        raise NotImplementedError
+
+    async def warmup(self):
+        """Optionally open connections/load models ahead of the first utterance."""
+
+    async def aclose(self):
+        """Release clients or models held by the backend."""
+
+
+class WhisperBackend(TranscriptionBackend):
+    """OpenAI Whisper over a single long-lived async client."""
+
+    name = "whisper"
+
+    def __init__(self, model: str = "whisper-1", language: str = "en", timeout: float = 30.0):
+        self.model = model
+        self.language = language
+        self.timeout = timeout
+        self._client = None
+
+    def _get_client(self):
+        if self._client is None:
+            from openai import AsyncOpenAI  # lazy import; only needed for cloud STT
+
+            api_key = os.getenv("OPENAI_API_KEY")
+            if not api_key:
+                raise RuntimeError("Set OPENAI_API_KEY for Whisper STT.")
+            # The client's HTTP pool keeps the TLS connection alive between utterances.
+            self._client = AsyncOpenAI(api_key=api_key, timeout=self.timeout, max_retries=1)
+        return self._client
+
+    async def transcribe(self, pcm: bytes, sample_rate: int = 16000) -> str:
+        client = self._get_client()
+        resp = await client.audio.transcriptions.create(
+            model=self.model,
+            file=("utterance.wav", pcm_to_wav(pcm, sample_rate), "audio/wav"),
+            language=self.language,
+        )
+        return resp.text.strip()
+
+    async def warmup(self):
+        # Establish the connection (DNS + TLS) before the first utterance.
+        try:
+            await self._get_client().models.retrieve(self.model)
+        except Exception as exc:
+            logging.getLogger(__name__).warning(f"Whisper warmup failed: {exc}")
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+
+
+class GoogleWebBackend(TranscriptionBackend):
+    """Free Google Web Speech API through SpeechRecognition (requires internet access)."""
+
+    name = "google_web"
+
+    def __init__(self, language: str = "en-US"):
+        self.language = language
+        self._recognizer = None
+
+    def transcribe_sync(self, pcm: bytes, sample_rate: int = 16000) -> str:
+        import speech_recognition as sr  # lazy import; optional dependency
+
+        if self._recognizer is None:
+            self._recognizer = sr.Recognizer()
+        audio = sr.AudioData(bytes(pcm), sample_rate, 2)
+        try:
+            return self._recognizer.recognize_google(audio, language=self.language).strip()
+        except sr.UnknownValueError:
+            return ""
+
+
+class PocketSphinxStream:
+    """
+    Incremental decoding session; `feed` returns the current partial hypothesis.
+
+    Holds the backend's decoder until `finish` is called (use as a context manager).
+    """
+
+    def __init__(self, backend: "PocketSphinxBackend", sample_rate: int):
+        self._backend = backend
+        self._sample_rate = sample_rate
+        self._backend._lock.acquire()
+        self._decoder = backend._get_decoder()
+        self._decoder.start_utt()
+        self._open = True
+
+    def feed(self, pcm: bytes) -> str:
+        pcm = resample_pcm(pcm, self._sample_rate, LOCAL_SAMPLE_RATE)
+        self._decoder.process_raw(pcm, False, False)
+        hyp = self._decoder.hyp()
+        return hyp.hypstr.strip() if hyp else ""
+
+    def finish(self) -> str:
+        if not self._open:
+            return ""
+        try:
+            self._decoder.end_utt()
+            hyp = self._decoder.hyp()
+            return hyp.hypstr.strip() if hyp else ""
+        finally:
+            self._open = False
+            self._backend._lock.release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.finish()
+
+
+class PocketSphinxBackend(TranscriptionBackend):
+    """On-device CMU PocketSphinx; low latency, lower accuracy than cloud models."""
+
+    name = "pocketsphinx"
+    local = True
+
+    def __init__(self):
+        self._decoder = None
+        self._lock = threading.Lock()
+
+    def _get_decoder(self):
+        if self._decoder is None:
+            from pocketsphinx import Decoder  # lazy import; loads the acoustic model once
+
+            try:
+                self._decoder = Decoder(samprate=LOCAL_SAMPLE_RATE)  # pocketsphinx >= 5
+            except TypeError:
+                self._decoder = Decoder(Decoder.default_config())
+        return self._decoder
+
+    def stream(self, sample_rate: int = 16000) -> PocketSphinxStream:
+        return PocketSphinxStream(self, sample_rate)
+
+    def transcribe_sync(self, pcm: bytes, sample_rate: int = 16000) -> str:
+        with self.stream(sample_rate) as session:
+            session.feed(pcm)
+            return session.finish()
+
+    async def warmup(self):
+        await asyncio.to_thread(self._get_decoder)
+
+
+class SttEngine:
+    """
+    Picks a backend per utterance.
+
+    The cloud backend is preferred while its smoothed latency fits the budget;
+    otherwise the faster of the two is used. Because the cloud estimate only
+    changes when cloud is used, an utterance is sent to the cloud as a probe
+    every `probe_every` local utterances or `probe_interval` seconds, so one
+    slow call does not pin the engine to the local backend; only one probe is
+    in flight at a time. A cloud failure marks it offline for
+    `offline_cooldown` seconds and the utterance is retried locally.
+
+    Calls may overlap, so the backend and latency of each call are returned by
+    transcribe_timed() rather than kept on the engine.
+    """
+
+    def __init__(
+        self,
+        cloud: TranscriptionBackend | None = None,
+        local: TranscriptionBackend | None = None,
+        mode: str | None = None,
+        latency_budget: float | None = None,
+        offline_cooldown: float = 30.0,
+        probe_every: int = 10,
+        probe_interval: float = 60.0,
+    ):
+        self.cloud = cloud
+        self.local = local
+        self.mode = (mode or os.getenv("STT_BACKEND", "auto")).lower()
+        self.latency_budget = latency_budget if latency_budget is not None else float(os.getenv("STT_LATENCY_BUDGET", "2.0"))
+        self.offline_cooldown = offline_cooldown
+        self.probe_every = probe_every
+        self.probe_interval = probe_interval
+        self._latency = {}  # backend name -> EWMA seconds
+        self._cloud_measured_at = 0.0
+        self._local_since_cloud = 0  # local utterances since the cloud estimate was updated
+        self._probing = False  # a probe is in flight
+        self._offline_until = 0.0
+        self._lock = threading.Lock()
+
+    def _cloud_available(self) -> bool:
+        return self.cloud is not None and time.monotonic() >= self._offline_until
+
+    def choose(self) -> tuple[TranscriptionBackend | None, bool]:
+        """The backend for the next utterance, and whether the call is a cloud probe."""
+        if self.mode == "local" and self.local is not None:
+            return self.local, False
+        if self.mode == "cloud" and self.cloud is not None:
+            return self.cloud, False
+        if not self._cloud_available():
+            return self.local or self.cloud, False
+        if self.local is None:
+            return self.cloud, False
+        with self._lock:
+            cloud_est = self._latency.get(self.cloud.name)
+            local_est = self._latency.get(self.local.name)
+            if cloud_est is None or cloud_est <= self.latency_budget:
+                return self.cloud, False
+            if not self._probing and (
+                self._local_since_cloud >= self.probe_every
+                or time.monotonic() - self._cloud_measured_at >= self.probe_interval
+            ):
+                self._probing = True  # the estimate is stale; the probe's latency replaces it
+                return self.cloud, True
+            if local_est is None or local_est < cloud_est:
+                return self.local, False
+            return self.cloud, False
+
+    def _record(self, backend: TranscriptionBackend, latency: float, probe: bool):
+        with self._lock:
+            prev = None if probe else self._latency.get(backend.name)
+            if backend is self.cloud:
+                self._cloud_measured_at = time.monotonic()
+                self._local_since_cloud = 0
+            else:
+                self._local_since_cloud += 1
+            self._latency[backend.name] = latency if prev is None else 0.8 * prev + 0.2 * latency
+
+    async def transcribe_timed(self, pcm: bytes, sample_rate: int = 16000) -> tuple[str, str, float]:
+        """Transcribe and return (text, backend name, seconds) for this call."""
+        backend, probe = self.choose()
+        if backend is None:
+            raise RuntimeError("No STT backend configured.")
+        claimed = probe
+        try:
+            start = time.monotonic()
+            try:
+                text = await backend.transcribe(pcm, sample_rate)
+            except Exception as exc:
+                if backend is not self.cloud or self.local is None:
+                    raise
+                logging.getLogger(__name__).warning(f"Cloud STT failed ({exc}); using local backend for {self.offline_cooldown:.0f}s.")
+                self._offline_until = time.monotonic() + self.offline_cooldown
+                backend, probe = self.local, False
+                start = time.monotonic()
+                text = await backend.transcribe(pcm, sample_rate)
+            latency = time.monotonic() - start
+            self._record(backend, latency, probe)
+        finally:
+            if claimed:
+                with self._lock:
+                    self._probing = False
+        return text, backend.name, latency
+
+    async def transcribe(self, pcm: bytes, sample_rate: int = 16000) -> str:
+        text, _, _ = await self.transcribe_timed(pcm, sample_rate)
+        return text
+
+    async def warmup(self):
+        for backend in (self.cloud, self.local):
+            if backend is None:
+                continue
+            try:
+                await backend.warmup()
+            except Exception as exc:
+                logging.getLogger(__name__).warning(f"STT backend {backend.name} unavailable: {exc}")
+
+    async def aclose(self):
+        for backend in (self.cloud, self.local):
+            if backend is not None:
+                await backend.aclose()
+
+
+def build_engine() -> SttEngine:
+    """Default engine: Whisper in the cloud with PocketSphinx as the local fallback."""
+    return SttEngine(cloud=WhisperBackend(), local=PocketSphinxBackend())
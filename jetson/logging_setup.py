@@ -0,0 +1,138 @@
+"""
+Non-blocking logging for the server.
+
+Callers only format the record and put it on a bounded queue (QueueHandler);
+a background QueueListener thread does the console and file I/O, so a slow
+disk or terminal never stalls the event loop. If the queue fills up, records
+are dropped and counted rather than blocking.
+
+Environment:
+    LOG_LEVEL          root level (default DEBUG; unknown names fall back to INFO)
+    LOG_FORMAT         text (default) or json (one object per line)
+    LOG_MAX_BYTES      rotate the log file at this size (default 10 MB)
+    LOG_BACKUPS        rotated files kept (default 3)
+    LOG_DEBUG_SAMPLE   keep 1 in N DEBUG records per call site (default 1 = all);
+                       the first record from each call site is always kept
+"""
+
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+from datetime import datetime
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "DEBUG").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_BACKUPS = int(os.getenv("LOG_BACKUPS", "3"))
+LOG_DEBUG_SAMPLE = max(1, int(os.getenv("LOG_DEBUG_SAMPLE", "1")))
+QUEUE_SIZE = 10000
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "msg": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class DebugSampler(logging.Filter):
+    """Keep every Nth DEBUG record per call site (file, line); other levels pass."""
+
+    def __init__(self, every: int):
+        super().__init__()
+        self.every = every
+        self._counts = {}
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.every <= 1 or record.levelno != logging.DEBUG:
+            return True
+        key = (record.pathname, record.lineno)
+        with self._lock:
+            n = self._counts.get(key, 0)
+            self._counts[key] = n + 1
+            if n % self.every == 0:
+                return True
+            self.dropped += 1
+        return False
+
+
+_exc_formatter = logging.Formatter()
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops (and counts) records instead of blocking when full."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The stock prepare() folds the traceback into msg and clears exc_info, so the
+        # listener's formatter could not tell them apart. Merge the args now, but keep
+        # the traceback as exc_text; both formatters render it from there.
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = _exc_formatter.formatException(record.exc_info)
+            record.exc_info = None  # tracebacks do not survive the queue
+        record.message = record.msg
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def configure_logging(log_path: str = "jetson_server.log") -> logging.handlers.QueueListener:
+    """Route the root logger through a queue to console and a rotating file."""
+    formatter = JsonFormatter() if LOG_FORMAT == "json" else logging.Formatter(TEXT_FORMAT)
+    console_handler = logging.StreamHandler(sys.stdout)
+    console_handler.setFormatter(formatter)
+    file_handler = logging.handlers.RotatingFileHandler(
+        log_path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS, encoding="utf-8"
+    )
+    # Each run starts a fresh file; the previous run's log becomes <log_path>.1.
+    if file_handler.stream.tell() > 0:
+        file_handler.doRollover()
+    file_handler.setFormatter(formatter)
+
+    queue_handler = DroppingQueueHandler(queue.Queue(QUEUE_SIZE))
+    queue_handler.addFilter(DebugSampler(LOG_DEBUG_SAMPLE))
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    level = logging.getLevelName(LOG_LEVEL)
+    root.setLevel(level if isinstance(level, int) else logging.INFO)
+    root.addHandler(queue_handler)
+
+    listener = logging.handlers.QueueListener(
+        queue_handler.queue, console_handler, file_handler, respect_handler_level=True
+    )
+    listener.start()
+    atexit.register(listener.stop)
+    if not isinstance(level, int):
+        logging.getLogger(__name__).warning(f"Unknown LOG_LEVEL {LOG_LEVEL!r}; using INFO")
+    return listener
@@ -0,0 +1,77 @@
+"""
+In-process metrics: counters and value summaries keyed by dotted names.
+
+Cheap enough to call on every turn from any thread. `snapshot()` returns
+count/mean/p50/p95/max per summary (over a recent window), counter totals
+and the latest value of each gauge; the server exposes it through the
+`get_metrics` message.
+"""
+
+import threading
+from collections import deque
+
+WINDOW = 500  # recent observations kept per summary for percentiles
+
+
+class _Summary:
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = float("-inf")
+        self.recent = deque(maxlen=WINDOW)
+
+    def add(self, value: float):
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+        self.recent.append(value)
+
+    def describe(self) -> dict:
+        ordered = sorted(self.recent)
+        return {
+            "count": self.count,
+            "mean": self.total / self.count,
+            "p50": ordered[len(ordered) // 2],
+            "p95": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+            "max": self.max,
+        }
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._summaries = {}
+        self._gauges = {}
+
+    def incr(self, name: str, n: int = 1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+
+    def observe(self, name: str, value: float):
+        with self._lock:
+            summary = self._summaries.get(name)
+            if summary is None:
+                summary = self._summaries[name] = _Summary()
+            summary.add(float(value))
+
+    def gauge(self, name: str, value: float):
+        with self._lock:
+            self._gauges[name] = value
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "counters": dict(self._counters),
+                "summaries": {name: s.describe() for name, s in self._summaries.items()},
+                "gauges": dict(self._gauges),
+            }
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._summaries.clear()
+            self._gauges.clear()
+
+
+metrics = Metrics()
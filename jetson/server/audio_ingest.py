@@ -0,0 +1,217 @@
+"""
+Server-side audio ingestion: VAD, segmentation and STT for streamed audio.
+
+With AUDIO_INGEST=server, clients (including the HoloLens) stream binary
+audio frames (16-bit mono PCM or Opus packets, see docs/message_formats.md)
+instead of the server launching mic_vad_sender as a subprocess that connects
+back just to deliver text.
+
+All sessions share one AudioIngestPool:
+    - each session is pinned to one of VAD_WORKERS segmentation shards, so
+      its frames are always processed in order
+    - a shard drains every chunk queued for it (across sessions) and runs
+      them in a single executor call, so concurrent headsets share one
+      thread hop; each chunk is still gated and segmented on its own, by its
+      session's segmenter
+    - finished utterances are transcribed by the shared SttEngine with at
+      most STT_WORKERS requests in flight; transcripts are delivered per
+      session in utterance order
+"""
+
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from jetson.context.transcription import LOCAL_SAMPLE_RATE, build_engine, resample_pcm
+
+logger = logging.getLogger(__name__)
+
+AUDIO_INGEST = os.getenv("AUDIO_INGEST", "sender").lower()  # "sender" (subprocess) or "server"
+VAD_WORKERS = int(os.getenv("VAD_WORKERS", "2"))
+STT_WORKERS = int(os.getenv("STT_WORKERS", "2"))
+FRAME_MS = 30
+MAX_BATCH_CHUNKS = 64
+MIN_TRANSCRIPT_CHARS = 3  # same cutoff as mic_vad_sender
+
+
+def server_ingest_enabled() -> bool:
+    return AUDIO_INGEST == "server"
+
+
+class AudioSession:
+    """Per-connection decoding state, segmenter and ordered transcript queue."""
+
+    def __init__(self, key, shard: int):
+        from jetson.client.segmenter import StreamingSegmenter  # lazy import; needs webrtcvad
+
+        self.key = key
+        self.shard = shard
+        self.frame_samples = LOCAL_SAMPLE_RATE * FRAME_MS // 1000
+        self.segmenter = StreamingSegmenter(sample_rate=LOCAL_SAMPLE_RATE, frame_ms=FRAME_MS)
+        self.paused = False
+        self.closed = False
+        self._carry = bytearray()
+        self._opus = None
+        self._reset_pending = False
+        self.transcripts = asyncio.Queue()
+        self.delivery_task = None
+
+    def _decode(self, payload, codec: str, sample_rate: int) -> bytes:
+        if codec == "opus":
+            # Opus decoders only run at 8/12/16/24/48 kHz; decode straight to 16 kHz.
+            if self._opus is None:
+                import opuslib  # lazy import; only needed for Opus clients
+
+                self._opus = opuslib.Decoder(LOCAL_SAMPLE_RATE, 1)
+            return self._opus.decode(bytes(payload), LOCAL_SAMPLE_RATE * 120 // 1000)
+        if codec != "pcm":
+            raise ValueError(f"Unsupported audio codec: {codec}")
+        return resample_pcm(payload, sample_rate, LOCAL_SAMPLE_RATE)
+
+    def segment(self, payload, codec: str, sample_rate: int, received_at: float) -> list:
+        """Decode a chunk and feed whole frames to the segmenter (runs in a worker thread)."""
+        if self._reset_pending:
+            self._reset_pending = False
+            self._carry.clear()
+            self.segmenter.reset()
+        self._carry += self._decode(payload, codec, sample_rate)
+        frame_bytes = self.frame_samples * 2
+        usable = len(self._carry) // frame_bytes * frame_bytes
+        if not usable:
+            return []
+        frames = np.frombuffer(self._carry, dtype=np.int16, count=usable // 2).reshape(-1, self.frame_samples).copy()
+        del self._carry[:usable]
+        # Frames arrived together; back-date earlier ones so endpoint latency stays meaningful.
+        times = received_at - FRAME_MS / 1000 * np.arange(len(frames) - 1, -1, -1)
+        return self.segmenter.process_block(frames, times)
+
+    def reset(self):
+        # Applied by the worker thread before the next chunk, never concurrently with segment().
+        self._reset_pending = True
+
+
+class AudioIngestPool:
+    """Shared VAD/STT workers for all sessions streaming audio to the server."""
+
+    def __init__(self, on_transcript, vad_workers: int = VAD_WORKERS, stt_workers: int = STT_WORKERS, engine=None):
+        self.on_transcript = on_transcript  # async (key, text)
+        self.engine = engine or build_engine()
+        self.sessions = {}
+        self._executor = ThreadPoolExecutor(max_workers=vad_workers, thread_name_prefix="audio-vad")
+        self._queues = [asyncio.Queue() for _ in range(vad_workers)]
+        self._workers = []
+        self._stt_slots = asyncio.Semaphore(stt_workers)
+        self._next_shard = 0
+        self.batches = 0
+        self.chunks = 0
+
+    async def start(self):
+        if self._workers:
+            return
+        self._workers = [asyncio.create_task(self._vad_worker(q)) for q in self._queues]
+        await self.engine.warmup()
+
+    def session(self, key) -> AudioSession:
+        session = self.sessions.get(key)
+        if session is None:
+            session = AudioSession(key, self._next_shard % len(self._queues))
+            self._next_shard += 1
+            session.delivery_task = asyncio.create_task(self._deliver(session))
+            self.sessions[key] = session
+        return session
+
+    def set_paused(self, key, paused: bool):
+        session = self.sessions.get(key)
+        if session is None or session.paused == paused:
+            return
+        session.paused = paused
+        if paused:
+            # Anything heard while paused (TTS output, selection) is not a new utterance.
+            session.reset()
+
+    def submit(self, key, payload, codec: str = "pcm", sample_rate: int = LOCAL_SAMPLE_RATE):
+        session = self.session(key)
+        if session.paused:
+            return
+        self._queues[session.shard].put_nowait((session, payload, codec, sample_rate, time.monotonic()))
+
+    async def close_session(self, key):
+        session = self.sessions.pop(key, None)
+        if session is None:
+            return
+        session.closed = True
+        while not session.transcripts.empty():
+            session.transcripts.get_nowait().cancel()
+        if session.delivery_task:
+            session.delivery_task.cancel()
+            try:
+                await session.delivery_task
+            except (asyncio.CancelledError, Exception):
+                pass
+
+    async def aclose(self):
+        for key in list(self.sessions):
+            await self.close_session(key)
+        for task in self._workers:
+            task.cancel()
+        self._workers = []
+        self._executor.shutdown(wait=False)
+        await self.engine.aclose()
+
+    @staticmethod
+    def _segment_batch(batch: list) -> list:
+        results = []
+        for session, payload, codec, sample_rate, received_at in batch:
+            try:
+                utterances = session.segment(payload, codec, sample_rate, received_at)
+            except Exception as exc:
+                logger.warning(f"Dropping audio chunk: {exc}")
+                continue
+            if utterances:
+                results.append((session, utterances))
+        return results
+
+    async def _vad_worker(self, queue: asyncio.Queue):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await queue.get()]
+            while len(batch) < MAX_BATCH_CHUNKS and not queue.empty():
+                batch.append(queue.get_nowait())
+            batch = [item for item in batch if not item[0].closed and not item[0].paused]
+            if not batch:
+                continue
+            self.batches += 1
+            self.chunks += len(batch)
+            results = await loop.run_in_executor(self._executor, self._segment_batch, batch)
+            for session, utterances in results:
+                for utterance in utterances:
+                    if session.closed or session.paused:
+                        break
+                    logger.info(
+                        f"Utterance {utterance.duration:.2f}s from {session.key}; "
+                        f"endpoint {utterance.endpoint_latency * 1000:.0f} ms"
+                    )
+                    session.transcripts.put_nowait(asyncio.create_task(self._transcribe(utterance.pcm)))
+
+    async def _transcribe(self, pcm: bytes) -> str:
+        async with self._stt_slots:
+            try:
+                return await self.engine.transcribe(pcm, LOCAL_SAMPLE_RATE)
+            except Exception as exc:
+                logger.error(f"Server-side STT failed: {exc}")
+                return ""
+
+    async def _deliver(self, session: AudioSession):
+        while True:
+            task = await session.transcripts.get()
+            text = (await task).strip()
+            if session.closed or session.paused or len(text) < MIN_TRANSCRIPT_CHARS:
+                continue
+            try:
+                await self.on_transcript(session.key, text)
+            except Exception as exc:
+                logger.error(f"Failed to handle transcript: {exc}")
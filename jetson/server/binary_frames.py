@@ -0,0 +1,66 @@
+"""
+Binary websocket frames for image and audio payloads.
+
+A binary frame is a length-prefixed envelope:
+
+    | header_len (uint32, big-endian) | header (UTF-8 JSON) | payload (raw bytes) |
+
+The header is a normal JSON message (e.g. `{"audio_data": "..."}`) plus a
+`payload` field naming what the trailing bytes are ("image" or "audio").
+The payload is handed to consumers as a memoryview over the received frame,
+so megabyte-sized images are never copied or base64-decoded on the server.
+See docs/message_formats.md for the full format.
+"""
+
+import json
+import struct
+
+HEADER_LEN = struct.Struct(">I")
+MAX_HEADER_BYTES = 64 * 1024
+MAX_FRAME_BYTES = 16 * 1024 * 1024
+
+# payload kind -> message key the bytes are attached under
+PAYLOAD_KEYS = {
+    "image": "image_data",
+    "audio": "audio_pcm",
+}
+
+
+def decode_frame(frame: bytes | bytearray | memoryview) -> dict:
+    """
+    Split a binary frame into its JSON header and a zero-copy payload view.
+
+    Returns the header dict with the payload attached under `image_data`
+    (images) or `audio_pcm` (audio). Raises ValueError on malformed frames.
+    """
+    view = memoryview(frame)
+    if len(view) < HEADER_LEN.size:
+        raise ValueError("Binary frame too short for header length")
+    (header_len,) = HEADER_LEN.unpack_from(view)
+    if header_len > MAX_HEADER_BYTES or HEADER_LEN.size + header_len > len(view):
+        raise ValueError(f"Invalid binary frame header length: {header_len}")
+
+    header_end = HEADER_LEN.size + header_len
+    try:
+        header = json.loads(bytes(view[HEADER_LEN.size:header_end]))
+    except Exception as exc:
+        raise ValueError(f"Invalid binary frame header: {exc}") from exc
+    if not isinstance(header, dict):
+        raise ValueError("Binary frame header must be a JSON object")
+
+    kind = header.pop("payload", "image")
+    key = PAYLOAD_KEYS.get(kind)
+    if key is None:
+        raise ValueError(f"Unknown binary payload kind: {kind}")
+    header[key] = view[header_end:]
+    if kind == "image":
+        header.setdefault("image_mime", "image/jpeg")
+    return header
+
+
+def encode_frame(header: dict, payload: bytes | bytearray | memoryview, kind: str = "image") -> bytes:
+    """Build a binary frame (used by clients and test scripts)."""
+    if kind not in PAYLOAD_KEYS:
+        raise ValueError(f"Unknown binary payload kind: {kind}")
+    header_bytes = json.dumps({**header, "payload": kind}).encode("utf-8")
+    return HEADER_LEN.pack(len(header_bytes)) + header_bytes + bytes(payload)
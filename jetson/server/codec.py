@@ -0,0 +1,56 @@
+"""
+Pluggable JSON codec for websocket messages.
+
+Uses orjson when it is installed (several times faster for both parsing and
+serializing) and falls back to the stdlib json module otherwise. Set
+JSON_CODEC=stdlib to force the fallback.
+"""
+
+import json
+import logging
+import os
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+
+def _stdlib_dumps(obj) -> str:
+    return json.dumps(obj)
+
+
+def _orjson_loads(data):
+    # orjson does not accept memoryview; bytes(...) only copies the (small) text.
+    if isinstance(data, memoryview):
+        data = bytes(data)
+    return orjson.loads(data)
+
+
+def _orjson_dumps(obj) -> str:
+    # Websocket text frames need str; decoding the UTF-8 output is cheap.
+    return orjson.dumps(obj).decode("utf-8")
+
+
+CODECS = {"stdlib": (json.loads, _stdlib_dumps)}
+if orjson is not None:
+    CODECS["orjson"] = (_orjson_loads, _orjson_dumps)
+
+name = ""
+loads = json.loads
+dumps = _stdlib_dumps
+
+
+def use_codec(codec_name: str | None = None):
+    """Select the active codec by name; defaults to orjson when available."""
+    global name, loads, dumps
+    if not codec_name:
+        codec_name = "orjson" if "orjson" in CODECS else "stdlib"
+    if codec_name not in CODECS:
+        logging.getLogger(__name__).warning(f"JSON codec '{codec_name}' unavailable; using stdlib.")
+        codec_name = "stdlib"
+    name = codec_name
+    loads, dumps = CODECS[codec_name]
+
+
+use_codec(os.getenv("JSON_CODEC"))
@@ -0,0 +1,112 @@
+"""
+Versioned sections for `get_context` delta sync.
+
+Each context artifact (core lines, highlights, calendar events, schedule
+summary, event contexts) is a section with a version string. File-backed
+sections are versioned by the file's mtime and size, so checking whether
+anything changed costs one stat() per file; the section is only re-read
+and re-serialized when its version moves. The schedule summary depends on
+the current time as well as the calendar, so it is versioned by a hash of
+the (cheap, index-backed) summary text. Calendar events are expanded
+relative to today, so their version also carries the date.
+
+Clients send the versions they hold and get back only sections that
+changed. Highlights can be paged with an offset/limit.
+"""
+
+import hashlib
+import os
+import threading
+
+MISSING = "0"  # version of a section whose file does not exist
+
+
+def file_version(path: str) -> str:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return MISSING
+    return f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+
+
+def text_version(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:12]
+
+
+class Section:
+    """
+    A payload loaded from `path` by `load()` and reused until the file changes.
+
+    `pending(path)` (optional) returns a generation number while a newer,
+    not yet written copy of the file exists in memory. `scope()` (optional)
+    returns whatever else the payload depends on, e.g. today's date, and is
+    made part of the version.
+    """
+
+    def __init__(self, path: str, load, pending=None, scope=None):
+        self.path = path
+        self.load = load
+        self.pending = pending
+        self.scope = scope
+        self._lock = threading.Lock()
+        self._version = None
+        self._value = None
+
+    def version(self) -> str:
+        generation = self.pending(self.path) if self.pending else None
+        version = f"m{generation:x}" if generation is not None else file_version(self.path)
+        if self.scope is not None:
+            version += f"@{self.scope()}"
+        return version
+
+    def get(self) -> tuple[str, object]:
+        version = self.version()
+        with self._lock:
+            if version != self._version:
+                self._value = self.load()
+                self._version = version
+            return self._version, self._value
+
+
+class ComputedSection:
+    """A payload computed on every request, versioned by its content."""
+
+    def __init__(self, compute):
+        self.compute = compute
+
+    def get(self) -> tuple[str, object]:
+        value = self.compute()
+        return text_version(str(value)), value
+
+
+class ContextSync:
+    def __init__(self, sections: dict, paged: tuple[str, ...] = ()):
+        self.sections = sections  # name -> Section | ComputedSection
+        self.paged = paged  # list sections that may be returned a page at a time
+
+    def delta(self, known: dict | None = None, page: dict | None = None) -> tuple[dict, dict]:
+        """
+        Return (versions of all sections, payload of sections whose version
+        differs from `known`). `page` maps a paged section to (offset, limit);
+        for those, the payload holds `<name>` (the page), `<name>_offset` and
+        `<name>_total`.
+        """
+        known = known or {}
+        page = page or {}
+        versions, payload = {}, {}
+        for name, section in self.sections.items():
+            version, value = section.get()
+            versions[name] = version
+            if known.get(name) == version:
+                continue
+            if name in page:
+                payload.update(self.page(name, *page[name])[1])
+            else:
+                payload[name] = value
+        return versions, payload
+
+    def page(self, name: str, offset: int, limit: int | None) -> tuple[str, dict]:
+        version, items = self.sections[name].get()
+        offset = max(0, offset)
+        end = len(items) if limit is None else offset + max(0, limit)
+        return version, {name: items[offset:end], f"{name}_offset": offset, f"{name}_total": len(items)}
@@ -0,0 +1,190 @@
+"""
+Event-loop lag monitoring and an on-demand sampling profiler.
+
+LoopMonitor runs a heartbeat coroutine that sleeps `interval` and records
+how late it woke up (`loop.lag_seconds`). A watchdog thread notices when
+the heartbeat is overdue by more than `threshold` while the loop is still
+blocked, and captures the loop thread's stack and the message type its
+current task is handling (tagged by the dispatcher), so the stall is
+logged with its culprit.
+
+SamplingProfiler samples every thread's stack at PROFILE_HZ and writes
+folded stacks ("frame;frame;frame count" per line), the input format of
+flamegraph.pl, speedscope and similar tools. It is started and stopped by
+the `profile` admin message or by SIGUSR2 (toggle).
+"""
+
+import asyncio
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+import traceback
+import weakref
+from collections import Counter
+from datetime import datetime
+
+from jetson.metrics import metrics
+
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", "0.05"))  # seconds between heartbeats
+LOOP_LAG_THRESHOLD = float(os.getenv("LOOP_LAG_THRESHOLD", "0.25"))  # lag reported as a stall
+PROFILE_HZ = int(os.getenv("PROFILE_HZ", "100"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+
+logger = logging.getLogger(__name__)
+
+_task_messages = weakref.WeakKeyDictionary()  # asyncio.Task -> message type being handled
+
+
+def set_current_message(msg_type: str | None):
+    """Tag the running task with the message type it is handling (None when done)."""
+    task = asyncio.current_task()
+    if task is None:
+        return
+    if msg_type is None:
+        _task_messages.pop(task, None)
+    else:
+        _task_messages[task] = msg_type
+
+
+def _format_frame(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class LoopMonitor:
+    def __init__(self, interval: float = LOOP_LAG_INTERVAL, threshold: float = LOOP_LAG_THRESHOLD):
+        self.interval = interval
+        self.threshold = threshold
+        self.stalls = 0
+        self._loop = None
+        self._loop_thread = None
+        self._last_beat = time.monotonic()
+        self._stall = None  # (message type, stack) captured by the watchdog
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._task = None
+
+    def start(self):
+        """Start monitoring the running loop (call from inside it)."""
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._task = self._loop.create_task(self._heartbeat())
+        threading.Thread(target=self._watchdog, name="loop-watchdog", daemon=True).start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._task is not None:
+            self._task.cancel()
+
+    async def _heartbeat(self):
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - started - self.interval)
+            with self._lock:
+                self._last_beat = now
+                stall, self._stall = self._stall, None
+            metrics.observe("loop.lag_seconds", lag)
+            if lag < self.threshold:
+                continue
+            self.stalls += 1
+            metrics.incr("loop.stalls")
+            if stall is None:
+                logger.warning(f"Event loop blocked for {lag * 1000:.0f} ms")
+            else:
+                msg_type, stack = stall
+                logger.warning(
+                    f"Event loop blocked for {lag * 1000:.0f} ms while handling {msg_type or 'no message'}; "
+                    f"loop thread was at:\n{stack}"
+                )
+
+    def _watchdog(self):
+        while not self._stopped.wait(self.interval / 2):
+            with self._lock:
+                overdue = time.monotonic() - self._last_beat > self.interval + self.threshold
+                if not overdue or self._stall is not None:
+                    continue
+            frame = sys._current_frames().get(self._loop_thread)
+            if frame is None:
+                continue
+            stack = "".join(traceback.format_stack(frame, limit=12))
+            task = asyncio.current_task(self._loop)
+            msg_type = _task_messages.get(task) if task is not None else None
+            with self._lock:
+                self._stall = (msg_type, stack)
+
+
+class SamplingProfiler:
+    def __init__(self, hz: int = PROFILE_HZ, out_dir: str = PROFILE_DIR):
+        self.hz = hz
+        self.out_dir = out_dir
+        self._stacks = Counter()
+        self._thread = None
+        self._stopped = threading.Event()
+        self.started_at = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self) -> bool:
+        if self.running:
+            return False
+        self._stacks.clear()
+        self._stopped.clear()
+        self.started_at = datetime.now()
+        self._thread = threading.Thread(target=self._sample, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        logger.info(f"Sampling profiler started at {self.hz} Hz")
+        return True
+
+    def stop(self) -> str | None:
+        """Stop sampling and write the folded stacks; returns the file path."""
+        if not self.running:
+            return None
+        self._stopped.set()
+        self._thread.join()
+        self._thread = None
+        os.makedirs(self.out_dir, exist_ok=True)
+        path = os.path.join(self.out_dir, f"profile-{self.started_at:%Y%m%d-%H%M%S}.folded")
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self._stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        logger.info(f"Sampling profiler wrote {sum(self._stacks.values())} samples to {path}")
+        return path
+
+    def _sample(self):
+        me = threading.get_ident()
+        names = {}
+        period = 1.0 / self.hz
+        while not self._stopped.wait(period):
+            if len(names) != threading.active_count():
+                names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                frames = []
+                while frame is not None:
+                    frames.append(_format_frame(frame))
+                    frame = frame.f_back
+                frames.append(names.get(ident, str(ident)))
+                self._stacks[";".join(reversed(frames))] += 1
+
+
+monitor = LoopMonitor()
+profiler = SamplingProfiler()
+
+
+def install_signal_handler(loop: asyncio.AbstractEventLoop):
+    """SIGUSR2 starts the profiler, or stops it and writes the profile."""
+    if not hasattr(signal, "SIGUSR2"):
+        return
+    try:
+        loop.add_signal_handler(signal.SIGUSR2, lambda: profiler.stop() if profiler.running else profiler.start())
+    except (NotImplementedError, RuntimeError):
+        pass
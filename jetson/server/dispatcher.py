@@ -0,0 +1,110 @@
+"""
+Table-driven dispatch of websocket messages to handler coroutines.
+
+Handlers are registered per message type, optionally with a schema mapping
+required fields to their accepted types. Messages without a `type` (e.g.
+`{"audio_data": ...}`) are routed by fallback predicates.
+"""
+
+import asyncio
+import logging
+
+from jetson.server import codec
+from jetson.server.diagnostics import set_current_message
+from jetson.server.session_recorder import recorder
+
+logger = logging.getLogger(__name__)
+
+
+class MessageDispatcher:
+    """Registry mapping message types to `async def handler(ws, data)` coroutines."""
+
+    def __init__(self):
+        self._handlers = {}
+        self._fallbacks = []
+
+    def route(self, *msg_types: str, schema: dict | None = None):
+        """Register the decorated coroutine for one or more message types."""
+        def decorator(handler):
+            for msg_type in msg_types:
+                self._handlers[msg_type] = (handler, schema)
+            return handler
+        return decorator
+
+    def fallback(self, predicate):
+        """Register the decorated coroutine for untyped messages matching predicate(data)."""
+        def decorator(handler):
+            self._fallbacks.append((predicate, handler))
+            return handler
+        return decorator
+
+    @staticmethod
+    def validate(data: dict, schema: dict) -> str | None:
+        """Return an error description if data does not match schema, else None."""
+        for field, expected in schema.items():
+            if field not in data:
+                return f"missing '{field}'"
+            if not isinstance(data[field], expected):
+                return f"'{field}' has wrong type"
+        return None
+
+    async def dispatch(self, ws, data) -> bool:
+        """Run the handler for data; returns False if no handler matched."""
+        # Plain string control messages ("start conversation", "stop conversation").
+        if isinstance(data, str):
+            data = {"type": data.strip().lower().replace(" ", "_")}
+        if not isinstance(data, dict):
+            return False
+
+        entry = self._handlers.get(data.get("type"))
+        if entry is not None:
+            handler, schema = entry
+            if schema:
+                error = self.validate(data, schema)
+                if error:
+                    logger.warning(f"Rejected {data.get('type')} message: {error}")
+                    await send(ws, {"type": "error", "message": f"Invalid {data.get('type')} message: {error}"})
+                    return True
+            await self._run(handler, ws, data, data.get("type"))
+            return True
+
+        for predicate, handler in self._fallbacks:
+            if predicate(data):
+                await self._run(handler, ws, data, handler.__name__)
+                return True
+        return False
+
+    @staticmethod
+    async def _run(handler, ws, data, label: str):
+        # The loop monitor reports this label if the handler stalls the event loop.
+        set_current_message(label)
+        try:
+            await handler(ws, data)
+        finally:
+            set_current_message(None)
+
+
+async def send(ws, payload: dict | str) -> bool:
+    """Send one message, logging instead of raising on failure."""
+    recorder.outbound(payload)
+    return await _send(ws, payload)
+
+
+async def _send(ws, payload: dict | str) -> bool:
+    message = payload if isinstance(payload, str) else codec.dumps(payload)
+    try:
+        await ws.send(message)
+        return True
+    except Exception as exc:
+        logger.error(f"Failed to send message to {getattr(ws, 'remote_address', ws)}: {exc}")
+        return False
+
+
+async def broadcast(recipients, payload: dict | str):
+    """Serialize payload once and send the same message to every recipient."""
+    recipients = list(recipients)
+    if not recipients:
+        return
+    recorder.outbound(payload)
+    message = payload if isinstance(payload, str) else codec.dumps(payload)
+    await asyncio.gather(*(_send(ws, message) for ws in recipients))
@@ -0,0 +1,117 @@
+"""
+Dedicated, instrumented executors for blocking server work.
+
+Separate pools keep one kind of work from starving another (a TTS playback
+holding a thread for the whole clip no longer delays option generation):
+
+    io_executor        blocking API calls: Gemini, OpenAI TTS synthesis,
+                       memory retrieval (IO_WORKERS, default 8)
+    playback_executor  blocking audio playback (PLAYBACK_WORKERS, default 2)
+    cpu_executor       process pool for CPU-heavy pure functions such as
+                       frame hashing (CPU_WORKERS, default 2; 0 runs them in
+                       io_executor instead). Started on first use, from a
+                       forkserver rather than by forking the server, whose
+                       logging and watchdog threads may hold locks.
+
+Each pool records `executor.<name>.queue_wait_seconds` (submit to start),
+`executor.<name>.run_seconds`, and gauges `executor.<name>.busy`,
+`executor.<name>.queued` and `executor.<name>.utilization` (busy / workers).
+"""
+
+import asyncio
+import functools
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from jetson.metrics import metrics
+
+IO_WORKERS = int(os.getenv("IO_WORKERS", "8"))
+PLAYBACK_WORKERS = int(os.getenv("PLAYBACK_WORKERS", "2"))
+CPU_WORKERS = int(os.getenv("CPU_WORKERS", "2"))
+CPU_PRELOAD = ["jetson.context.scene_cache"]  # imported once by the forkserver, not per worker
+
+
+def _timed_call(fn, args, kwargs):
+    # Runs in the worker (thread or process); wall-clock time is comparable across processes.
+    started = time.time()
+    return started, fn(*args, **kwargs)
+
+
+class InstrumentedExecutor:
+    def __init__(self, name: str, workers: int, factory):
+        self.name = name
+        self.workers = workers
+        self._factory = factory  # callable(workers) -> concurrent.futures.Executor
+        self._executor = None
+        self._lock = threading.Lock()
+        self._in_flight = 0  # submitted, not finished
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = self._factory(self.workers)
+            return self._executor
+
+    def _update(self, delta: int):
+        # Pools run calls FIFO, so the first `workers` calls in flight are running.
+        with self._lock:
+            self._in_flight += delta
+            busy = min(self._in_flight, self.workers)
+            queued = self._in_flight - busy
+        metrics.gauge(f"executor.{self.name}.queued", queued)
+        metrics.gauge(f"executor.{self.name}.busy", busy)
+        metrics.gauge(f"executor.{self.name}.utilization", min(1.0, busy / self.workers))
+
+    async def run(self, fn, *args, **kwargs):
+        """Run fn(*args, **kwargs) in this pool and return its result."""
+        loop = asyncio.get_running_loop()
+        submitted = time.time()
+        self._update(1)
+        try:
+            started, result = await loop.run_in_executor(
+                self._get_executor(), functools.partial(_timed_call, fn, args, kwargs)
+            )
+        finally:
+            self._update(-1)
+        finished = time.time()
+        metrics.observe(f"executor.{self.name}.queue_wait_seconds", max(0.0, started - submitted))
+        metrics.observe(f"executor.{self.name}.run_seconds", finished - started)
+        return result
+
+    def shutdown(self, wait: bool = True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+
+def _threads(prefix: str):
+    return lambda workers: ThreadPoolExecutor(max_workers=workers, thread_name_prefix=prefix)
+
+
+def _processes(workers: int) -> ProcessPoolExecutor:
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        # The default preload is __main__, which would re-run the server's module setup
+        # (logging, rotating the log file) in the forkserver.
+        context.set_forkserver_preload(CPU_PRELOAD)
+    else:
+        context = multiprocessing.get_context("spawn")
+    return ProcessPoolExecutor(max_workers=workers, mp_context=context)
+
+
+io_executor = InstrumentedExecutor("io", IO_WORKERS, _threads("io"))
+playback_executor = InstrumentedExecutor("playback", PLAYBACK_WORKERS, _threads("playback"))
+cpu_executor = (
+    InstrumentedExecutor("cpu", CPU_WORKERS, _processes)
+    if CPU_WORKERS > 0
+    else io_executor
+)
+
+
+def shutdown():
+    for executor in {io_executor, playback_executor, cpu_executor}:
+        executor.shutdown(wait=False)
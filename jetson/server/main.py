@@ -1,32 +1,48 @@
 import asyncio
+import hmac
 import json
 import logging
+import multiprocessing
 import os
-from datetime import datetime
+from datetime import date, datetime
 import sys
 import pathlib
+import time
 import websockets
 
 from jetson.context.context import Context
-from jetson.context.response_creator import create_context, set_response
+from jetson.context.response_creator import create_context, set_response, warm_prompt_cache
 from jetson.context.llm_interface import query_gemini
-from jetson.context.calendar import load_and_summarize_schedule, load_events_from_ics
-from jetson.server.speech import speak_openai
-
-
-logger = logging.getLogger()
-logger.setLevel(logging.DEBUG)
-console_handler = logging.StreamHandler(sys.stdout)
-console_handler.setLevel(logging.DEBUG)
-file_handler = logging.FileHandler("jetson_server.log", mode="w")
-file_handler.setLevel(logging.DEBUG)
-formatter = logging.Formatter(
-    "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+from jetson.context.scene_cache import SceneCache, frame_signature
+from jetson.context.prompt_cache import prefix_version
+from jetson.context.prompt_template import PromptTemplate
+from jetson.context.memory_index import MEMORY_TOP_K, JsonlMemory, highlight_text, turn_text
+from jetson.context.quick_replies import QuickReplyIndex
+from jetson.context.calendar import (
+    EventContextIndex,
+    load_event_context_index,
+    load_schedule_index,
+    summarize_schedule,
 )
-console_handler.setFormatter(formatter)
-file_handler.setFormatter(formatter)
-logger.addHandler(console_handler)
-logger.addHandler(file_handler)
+from jetson.server.speech import play_wav, synthesize_openai
+from jetson.server.binary_frames import MAX_FRAME_BYTES, decode_frame
+from jetson.server import codec
+from jetson.metrics import metrics
+from jetson.logging_setup import configure_logging
+from jetson.server.dispatcher import MessageDispatcher, broadcast, send
+from jetson.client.transport import PAUSE_TIMEOUT
+from jetson.server.audio_ingest import AudioIngestPool, server_ingest_enabled
+from jetson.server.context_sync import ComputedSection, ContextSync, Section
+from jetson.server.persistence import store
+from jetson.server import diagnostics, executors
+from jetson.server.executors import cpu_executor, io_executor, playback_executor
+from jetson.server.session_recorder import recorder
+
+
+# CPU pool workers re-import the entry module while they start; only the server owns the log file.
+if multiprocessing.current_process().name == "MainProcess":
+    configure_logging("jetson_server.log")
+logger = logging.getLogger()
 
 
 clients = set()
@@ -35,19 +51,65 @@ conversation_state = {}
 event_contexts = {}
 active_session = None
 mic_process = None
+audio_pool = None
+background_tasks = set()  # fire-and-forget tasks, referenced until they finish
+
+memories = [JsonlMemory("user_context/conversation_highlights.log", highlight_text)]
+if os.getenv("MEMORY_INCLUDE_TURNS", "0") == "1":
+    memories.append(JsonlMemory("user_context/conversation_logs.log", turn_text))
+
+# Provisional options from past selections, shown while the LLM call runs.
+quick_replies = QuickReplyIndex() if os.getenv("QUICK_REPLIES", "1") == "1" else None
+
+SUMMARY_DEADLINE = 30.0  # seconds for the end-of-conversation highlight
+# An unchanged prompt prefix is re-warmed at most this often: often enough to
+# land in the cache's renew-before-expiry minute, rarely enough not to run per turn.
+PROMPT_WARM_INTERVAL = 30.0
+SUMMARY_PROMPT = PromptTemplate(
+    "summary",
+    """
+    Summarize this conversation between the device user (one is who is selecting responses) and the addressee (the person who the speech is heard from) into 1-3 concise bullet highlights that capture key points, mentions, and next steps. Keep it concise, clear and meaningful. Directly give the summary without any additional text. Do not mention the word 'assitant'.
+    {history}
+    """,
+)
+
+
+def _spawn(coro, name: str) -> asyncio.Task:
+    """Run a coroutine in the background, keeping it referenced and logging its failure."""
+    task = asyncio.create_task(coro, name=name)
+    background_tasks.add(task)
+    task.add_done_callback(_background_done)
+    return task
+
+
+def _background_done(task: asyncio.Task):
+    background_tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"Background task {task.get_name()} failed: {task.exception()}")
+
+
+def _warm_prompt_cache(state: dict):
+    """Register or renew the session's prompt prefix in the background, unless nothing changed."""
+    sections = (state.get("schedule_context", ""), state.get("core_context", ""), state.get("event_context") or "")
+    version = prefix_version("\x00".join(sections))
+    now = time.monotonic()
+    warmed = state.get("prompt_warmed")
+    if warmed is not None and warmed[0] == version and now - warmed[1] < PROMPT_WARM_INTERVAL:
+        return
+    state["prompt_warmed"] = (version, now)
+    _spawn(io_executor.run(warm_prompt_cache, *sections), "warm_prompt_cache")
 
 
 async def notify_hololens(event_type: str):
     """Send an event to all connected HoloLens clients."""
-    if clients:
-        message = json.dumps({"type": event_type})
-        await asyncio.gather(*(client.send(message) for client in clients))
+    await broadcast(clients, {"type": event_type})
 
 
 def _normalize_options(raw_response):
     """
     Turn a raw response into a list of options.
-    - Gemini returns comma-separated options; parse and enforce exactly 3.
+    - set_response returns a validated list of 3; legacy '|'-separated strings
+      are parsed and padded/truncated to exactly 3.
     """
     if isinstance(raw_response, list):
         opts = [o.strip() for o in raw_response if isinstance(o, str) and o.strip()]
@@ -86,39 +148,43 @@ def _summarize_history(history: list) -> str:
         prefix = f"[{ts_str}] " if ts_str else ""
         lines.append(f"{prefix}{role}: {text}")
 
-    history_text = "\n".join(lines)
-    prompt = (
-        "Summarize this conversation between the device user (one is who is selecting responses) and the addressee (the person who the speech is heard from) into 1-3 concise bullet highlights that capture key points, "
-        "mentions, and next steps. Keep it concise, clear and meaningful. Directly give the summary without any additional text. Do not mention the word 'assitant'."
-        f"{history_text}"
-    )
+    prompt = SUMMARY_PROMPT.render(history="\n".join(lines))
+    SUMMARY_PROMPT.record(prompt)
     try:
-        return query_gemini(prompt)
+        # Runs once at conversation stop, so it gets a longer deadline than a turn.
+        return query_gemini(prompt.text, deadline=time.monotonic() + SUMMARY_DEADLINE)
     except Exception as exc:
         logger.error(f"Failed to summarize history: {exc}")
         return "Highlight unavailable due to summarization error."
 
 
-def _load_recent_highlights(max_entries: int = 5) -> list:
-    """Load recent highlights from the log file."""
-    log_path = pathlib.Path("user_context/conversation_highlights.log")
-    if not log_path.exists():
-        return []
-    highlights = []
-    try:
-        with log_path.open("r", encoding="utf-8") as f:
-            lines = f.readlines()[-max_entries:]
-        for line in lines:
-            try:
-                highlights.append(json.loads(line))
-            except Exception:
-                continue
-    except Exception as exc:
-        logger.error(f"Failed to read highlights: {exc}")
-    return highlights
+def _last_addressee_text(history: list) -> str:
+    for turn in reversed(history):
+        if turn.get("role") == "addressee" and turn.get("text"):
+            return turn["text"]
+    return ""
+
+
+def _retrieve_memories(query: str, session_id: str | None = None) -> str:
+    """Top-k past highlights (and turns, if enabled) most similar to the query."""
+    if not query:
+        return ""
+    hits = []
+    for memory in memories:
+        try:
+            hits.extend(memory.search(query))
+        except Exception as exc:
+            logger.error(f"Memory search failed: {exc}")
+    # Turns from the current session are already in the prompt's history.
+    hits = [hit for hit in hits if not session_id or hit[2].get("session_id") != session_id]
+    hits.sort(key=lambda hit: hit[0], reverse=True)
+    return "\n".join(f"- {text}" for _, text, _ in hits[:MEMORY_TOP_K])
 
 
 def _load_core_context() -> str:
+    pending = store.get("user_context/core_context.txt")
+    if pending is not None:
+        return pending.strip()
     path = pathlib.Path("user_context/core_context.txt")
     if not path.exists():
         return ""
@@ -135,40 +201,32 @@ def _load_core_lines() -> list[str]:
 
 
 def _write_core_lines(lines: list[str]):
-    path = pathlib.Path("user_context/core_context.txt")
-    try:
-        path.parent.mkdir(parents=True, exist_ok=True)
-        path.write_text("\n".join(lines), encoding="utf-8")
-    except Exception as exc:
-        logger.error(f"Failed to write core context: {exc}")
+    # Written to disk atomically after a short coalescing window (jetson/server/persistence.py).
+    store.set("user_context/core_context.txt", "\n".join(lines))
 
 
 def _read_highlights() -> list[dict]:
-    log_path = pathlib.Path("user_context/conversation_highlights.log")
-    if not log_path.exists():
-        return []
+    text = store.get("user_context/conversation_highlights.log")
+    if text is None:
+        log_path = pathlib.Path("user_context/conversation_highlights.log")
+        if not log_path.exists():
+            return []
+        try:
+            text = log_path.read_text(encoding="utf-8")
+        except Exception as exc:
+            logger.error(f"Failed to read highlights: {exc}")
+            return []
     entries = []
-    try:
-        with log_path.open("r", encoding="utf-8") as f:
-            for line in f:
-                try:
-                    entries.append(json.loads(line))
-                except Exception:
-                    continue
-    except Exception as exc:
-        logger.error(f"Failed to read highlights: {exc}")
+    for line in text.splitlines():
+        try:
+            entries.append(json.loads(line))
+        except Exception:
+            continue
     return entries
 
 
 def _write_highlights(entries: list[dict]):
-    log_path = pathlib.Path("user_context/conversation_highlights.log")
-    try:
-        log_path.parent.mkdir(parents=True, exist_ok=True)
-        with log_path.open("w", encoding="utf-8") as f:
-            for entry in entries:
-                f.write(json.dumps(entry) + "\n")
-    except Exception as exc:
-        logger.error(f"Failed to write highlights: {exc}")
+    store.set("user_context/conversation_highlights.log", "".join(json.dumps(entry) + "\n" for entry in entries))
 
 
 def _append_conversation_log(record: dict):
@@ -199,10 +257,11 @@ async def _start_mic_sender():
         log_path = pathlib.Path("user_context/mic_vad_sender.log")
         log_path.parent.mkdir(parents=True, exist_ok=True)
         log_file = log_path.open("ab")
-        logger.info(f"Launching mic_vad_sender: {sys.executable} {script_path} --ws {ws_url} (cwd={repo_root})")
+        logger.info(f"Launching mic_vad_sender: {sys.executable} -m jetson.client.mic_vad_sender --ws {ws_url} (cwd={repo_root})")
         mic_process = await asyncio.create_subprocess_exec(
             sys.executable,
-            str(script_path),
+            "-m",
+            "jetson.client.mic_vad_sender",
             "--ws",
             ws_url,
             stdout=log_file,
@@ -230,358 +289,547 @@ async def _stop_mic_sender():
 
 def _load_event_contexts() -> dict:
     path = pathlib.Path("user_context/event_contexts.json")
-    if not path.exists():
+    text = store.get(str(path))
+    if text is None and not path.exists():
         return {}
     try:
-        return json.loads(path.read_text(encoding="utf-8"))
+        return json.loads(text if text is not None else path.read_text(encoding="utf-8"))
     except Exception as exc:
         logger.error(f"Failed to read event contexts: {exc}")
         return {}
 
 
+def _event_context_index() -> EventContextIndex:
+    """The mtime-cached index of the file, unless an edit is still pending in the store."""
+    path = "user_context/event_contexts.json"
+    if store.get(path) is None:
+        return load_event_context_index(path)
+    mapping = _load_event_contexts()
+    return EventContextIndex(mapping if isinstance(mapping, dict) else {})
+
+
 def _save_event_contexts(data: dict):
-    path = pathlib.Path("user_context/event_contexts.json")
+    store.set("user_context/event_contexts.json", json.dumps(data, indent=2))
+
+def _load_events_payload() -> list[dict]:
+    return [
+        {
+            "summary": ev.get("summary", ""),
+            "start": ev.get("start").isoformat() if ev.get("start") else "",
+            "end": ev.get("end").isoformat() if ev.get("end") else "",
+            "location": ev.get("location", ""),
+        }
+        for ev in load_schedule_index("user_context/events.ics").events
+    ]
+
+
+context_sync = ContextSync(
+    {
+        "core": Section("user_context/core_context.txt", _load_core_lines, store.pending_generation),
+        "highlights": Section("user_context/conversation_highlights.log", _read_highlights, store.pending_generation),
+        "schedule": ComputedSection(lambda: summarize_schedule(load_schedule_index("user_context/events.ics"))),
+        # Recurring events are expanded around today, so a new day is a new version.
+        "events": Section("user_context/events.ics", _load_events_payload, scope=lambda: date.today().isoformat()),
+        "event_contexts": Section("user_context/event_contexts.json", _load_event_contexts, store.pending_generation),
+    },
+    paged=("highlights",),
+)
+
+dispatcher = MessageDispatcher()
+
+
+@dispatcher.route("start_conversation")
+async def _handle_start_conversation(ws, data):
+    logger.info("***** Starting new conversation session. *****")
+    now = datetime.now()
+    recorder.start(now.isoformat(), data)
+    await send(ws, {"type": "conversation_started"})
+    logger.info("***** Clearing conversation state and speaker. *****")
+    if not server_ingest_enabled():
+        await _start_mic_sender()
+    schedule_index = load_schedule_index("user_context/events.ics", now=now)
+    schedule_context = summarize_schedule(schedule_index, now=now)
+    core_context = _load_core_context()
+    session_id = now.isoformat()
+    # Determine active event context
+    active_event_ctx = _event_context_index().get(schedule_index.active_at(now))
+    conversation_state[ws] = {
+        "active": True,
+        # Past highlights are retrieved per turn by relevance (_retrieve_memories).
+        "history": [],
+        "start_at": datetime.now(),
+        "schedule_context": schedule_context,
+        "core_context": core_context,
+        "session_id": session_id,
+        "event_context": active_event_ctx,
+        "speaking": False,
+        "awaiting_selection": False,
+        "scene_cache": SceneCache(),
+    }
+    global active_session
+    active_session = conversation_state[ws]
+    options_map[ws] = []
+    # Register the static prompt prefix with Gemini's cache before the first turn needs it.
+    _warm_prompt_cache(conversation_state[ws])
+
+
+@dispatcher.route("send_audio")
+async def _handle_send_audio(ws, data):
+    logger.info("***** Stopping conversation session. *****")
+    await send(ws, {"type": "conversation_stopped"})
+
+
+def _page_param(data: dict, prefix: str) -> tuple[int, int | None]:
+    offset = int(data.get(f"{prefix}offset") or 0)
+    limit = data.get(f"{prefix}limit")
+    return offset, None if limit is None else int(limit)
+
+
+@dispatcher.route("get_context")
+async def _handle_get_context(ws, data):
+    """
+    Send the context sections that changed since the versions the client holds.
+
+    Optional fields: `versions` ({section: version} from an earlier snapshot)
+    and `highlights_offset`/`highlights_limit` to page highlights.
+    """
+    known = data.get("versions")
     try:
-        path.parent.mkdir(parents=True, exist_ok=True)
-        path.write_text(json.dumps(data, indent=2), encoding="utf-8")
+        page = {}
+        if "highlights_limit" in data or "highlights_offset" in data:
+            page["highlights"] = _page_param(data, "highlights_")
+        versions, payload = await asyncio.to_thread(
+            context_sync.delta, known if isinstance(known, dict) else None, page
+        )
+    except (TypeError, ValueError):
+        await send(ws, {"type": "error", "message": "Invalid get_context message"})
+        return
     except Exception as exc:
-        logger.error(f"Failed to write event contexts: {exc}")
+        logger.error(f"Failed to send context snapshot: {exc}")
+        return
+    if not payload:
+        await send(ws, {"type": "context_not_modified", "versions": versions})
+        return
+    await send(ws, {"type": "context_snapshot", "versions": versions, **payload})
 
 
-async def handle_hololens(ws):
-    """Receive messages from HoloLens clients."""
-    async for message in ws:
-        data = json.loads(message)        
+@dispatcher.route("get_highlights")
+async def _handle_get_highlights(ws, data):
+    """One page of highlights: `offset` (default 0) and `limit` (default all)."""
+    try:
+        offset, limit = _page_param(data, "")
+        version, page = await asyncio.to_thread(context_sync.page, "highlights", offset, limit)
+    except (TypeError, ValueError):
+        await send(ws, {"type": "error", "message": "Invalid get_highlights message"})
+        return
+    await send(
+        ws,
+        {
+            "type": "highlights_page",
+            "version": version,
+            "data": page["highlights"],
+            "offset": page["highlights_offset"],
+            "total": page["highlights_total"],
+        },
+    )
 
-        msg_type = data.get("type")
 
-        # Handle conversation control.
-        if isinstance(data, str) and data.lower() in {"start conversation", "stop conversation"}:
-            msg_type = data.lower().replace(" ", "_")
+@dispatcher.route("set_core_context", schema={"data": list})
+async def _handle_set_core_context(ws, data):
+    lines = data["data"]
+    _write_core_lines([str(ln).strip() for ln in lines if str(ln).strip()])
+    await send(ws, {"type": "core_context_updated"})
 
-        if msg_type == "start_conversation":
-            logger.info("***** Starting new conversation session. *****")
-            try:
-                await ws.send(json.dumps({"type": "conversation_started"}))
-            except Exception as exc:
-                logger.error(f"Failed to send conversation_started: {exc}")
-            logger.info("***** Clearing conversation state and speaker. *****")
-            await _start_mic_sender()
-            recent_highlights = _load_recent_highlights()
-            schedule_context = load_and_summarize_schedule("user_context/events.ics")
-            core_context = _load_core_context()
-            session_id = datetime.now().isoformat()
-            # Determine active event context
-            events = load_events_from_ics("user_context/events.ics")
-            now = datetime.now()
-            active_event_ctx = ""
-            ctx_map = _load_event_contexts()
-            for ev in events:
-                if ev.get("start") and ev.get("end") and ev["start"] <= now < ev["end"]:
-                    key = f"{ev['summary']}|{ev['start'].isoformat()}|{ev['end'].isoformat()}"
-                    if key in ctx_map:
-                        active_event_ctx = ctx_map[key]
-                    break
-            history_seed = [
-                {
-                    "timestamp": None,
-                    "role": "recent_highlights",
-                    "text": h.get("highlight", ""),
-                }
-                for h in recent_highlights
-                if h.get("highlight")
+
+@dispatcher.route("add_highlight", schema={"data": str})
+async def _handle_add_highlight(ws, data):
+    text = data["data"]
+    if text:
+        entries = _read_highlights()
+        entries.append(
+            {
+                "start_at": datetime.now().isoformat(),
+                "stop_at": datetime.now().isoformat(),
+                "highlight": str(text),
+            }
+        )
+        _write_highlights(entries)
+        await send(ws, {"type": "highlight_added"})
+
+
+@dispatcher.route("delete_highlight", schema={"data": (int, str)})
+async def _handle_delete_highlight(ws, data):
+    """Delete by index; with `start_at` (and `highlight`), the entry matching them wherever it now is."""
+    try:
+        idx = int(data["data"])
+        entries = _read_highlights()
+        if data.get("start_at"):
+            # A paged client's index can be stale; the entry it showed is the one to delete.
+            matches = [
+                i
+                for i, entry in enumerate(entries)
+                if entry.get("start_at") == data["start_at"]
+                and ("highlight" not in data or entry.get("highlight") == data["highlight"])
             ]
-            conversation_state[ws] = {
-                "active": True,
-                "history": history_seed,
-                "start_at": datetime.now(),
-                "schedule_context": schedule_context,
-                "core_context": core_context,
-                "session_id": session_id,
-                "event_context": active_event_ctx,
-                "speaking": False,
+            idx = idx if idx in matches else (matches[0] if matches else -1)
+        if 0 <= idx < len(entries):
+            entries.pop(idx)
+            _write_highlights(entries)
+            await send(ws, {"type": "highlight_deleted"})
+    except Exception as exc:
+        logger.error(f"Failed to delete highlight: {exc}")
+
+
+@dispatcher.route("set_calendar", schema={"data": str})
+async def _handle_set_calendar(ws, data):
+    ics_text = data["data"]
+    # The calendar is parsed from disk, so write it (atomically, off the loop) before confirming.
+    store.set("user_context/events.ics", ics_text)
+    await store.flush("user_context/events.ics")
+    if store.get("user_context/events.ics") is None:
+        await send(ws, {"type": "calendar_updated"})
+
+
+@dispatcher.route("set_event_context", schema={"data": dict})
+async def _handle_set_event_context(ws, data):
+    # Expect data: { summary, start, end, context }
+    payload = data["data"]
+    try:
+        summary = payload.get("summary", "")
+        start = payload.get("start", "")
+        end = payload.get("end", "")
+        ctx = payload.get("context", "")
+        if summary and start and end:
+            ctx_map = _load_event_contexts()
+            key = f"{summary}|{start}|{end}"
+            ctx_map[key] = ctx
+            _save_event_contexts(ctx_map)
+            await send(ws, {"type": "event_context_updated"})
+    except Exception as exc:
+        logger.error(f"Failed to set event context: {exc}")
+
+
+@dispatcher.route("stop_conversation")
+async def _handle_stop_conversation(ws, data):
+    global active_session
+    state = conversation_state.get(ws) or active_session or {"history": [], "start_at": datetime.now()}
+    history = state.get("history", [])
+    start_at = state.get("start_at") or datetime.now()
+    stop_at = datetime.now()
+    started = time.monotonic()
+    highlight_text = await io_executor.run(_summarize_history, history)
+    recorder.backend("summary", text=highlight_text, seconds=time.monotonic() - started)
+
+    try:
+        record = {
+            "start_at": start_at.isoformat(),
+            "stop_at": stop_at.isoformat(),
+            "highlight": highlight_text,
+        }
+        await store.append("user_context/conversation_highlights.log", json.dumps(record) + "\n")
+    except Exception as exc:
+        logger.error(f"Failed to write conversation highlight: {exc}")
+
+    conversation_state[ws] = {
+        "active": False,
+        "history": [],
+        "start_at": None,
+        "schedule_context": "",
+        "core_context": "",
+        "session_id": None,
+        "event_context": "",
+        "speaking": False,
+        "awaiting_selection": False,
+    }
+    active_session = None
+    options_map[ws] = []
+    if await send(ws, {"type": "conversation_highlight", "data": highlight_text}):
+        await send(ws, {"type": "conversation_stopped"})
+    recorder.stop()
+    await _stop_mic_sender()
+
+
+@dispatcher.route("select")
+async def _handle_select(ws, data):
+    selection_raw = data.get("data") or data.get("selection")
+    try:
+        idx = int(selection_raw) - 1
+        logger.info(f"User selected option index: {idx}")
+        opts = options_map.get(ws, [])
+        logger.info(f"Available options: {opts}")
+        if idx < 0 or idx >= len(opts):
+            raise ValueError("Selection out of bounds")
+        selected = opts[idx]
+        logger.info(f"User selected option: {selected}")
+        if not isinstance(selected, str) or not selected.strip():
+            raise ValueError("Empty selection")
+        state = conversation_state.get(ws) or active_session
+        if not state:
+            raise ValueError("No active conversation for selection")
+        state.setdefault("history", []).append(
+            {"timestamp": asyncio.get_event_loop().time(), "role": "user", "text": selected}
+        )
+        _append_conversation_log(
+            {
+                "session_id": state.get("session_id"),
+                "timestamp": datetime.now().isoformat(),
+                "role": "user",
+                "text": selected,
             }
-            global active_session
-            active_session = conversation_state[ws]
-            options_map[ws] = []
-            continue
+        )
+        state["speaking"] = True
+        state["awaiting_selection"] = False
+        state["answered_turn"] = state.get("turn")
+    except Exception:
+        await send(ws, {"type": "error", "message": "Invalid selection"})
+        return
 
-        if msg_type == "send_audio":
-            logger.info("***** Stopping conversation session. *****")
-            try:
-                # await ws.send(json.dumps({"type": "conversation_highlight", "data": highlight_text}))
-                await ws.send(json.dumps({"type": "conversation_stopped"}))
-            except Exception as exc:
-                logger.error(f"Failed to send conversation_started: {exc}")
-            continue
+    # Send selection back immediately, then perform TTS in the background to avoid blocking/ping timeouts.
+    await broadcast(clients, {"type": "selected", "data": selected})
 
-        if msg_type == "get_context":
+    try:
+        # Run TTS without blocking the event loop.
+        logger.info(f"Performing TTS for selection: {selected}")
+        async def _run_tts():
             try:
-                highlights_entries = _read_highlights()
-                core_lines = _load_core_lines()
-                schedule_context = load_and_summarize_schedule("user_context/events.ics")
-                events = load_events_from_ics("user_context/events.ics")
-                ctx_map = _load_event_contexts()
-                events_payload = [
-                    {
-                        "summary": ev.get("summary", ""),
-                        "start": ev.get("start").isoformat() if ev.get("start") else "",
-                        "end": ev.get("end").isoformat() if ev.get("end") else "",
-                        "location": ev.get("location", ""),
-                    }
-                    for ev in events
-                ]
-                await ws.send(
-                    json.dumps(
-                        {
-                            "type": "context_snapshot",
-                            "core": core_lines,
-                            "highlights": highlights_entries,
-                            "schedule": schedule_context,
-                            "events": events_payload,
-                            "event_contexts": ctx_map,
-                        }
-                    )
+                # Synthesis is an API call; playback holds a thread for the whole clip.
+                started = time.monotonic()
+                audio = await io_executor.run(synthesize_openai, selected)
+                synthesized = time.monotonic()
+                await playback_executor.run(play_wav, audio)
+                recorder.backend(
+                    "tts", synth_seconds=synthesized - started, play_seconds=time.monotonic() - synthesized
                 )
-            except Exception as exc:
-                logger.error(f"Failed to send context snapshot: {exc}")
-            continue
+            finally:
+                state["speaking"] = False
+                await broadcast(clients, {"type": "tts_done"})
+                await broadcast(clients, {"type": "resume_listening"})
+        _spawn(_run_tts(), "tts")
+    except Exception as exc:
+        logger.error(f"TTS failed: {exc}")
+        await send(ws, {"type": "error", "message": "TTS failed"})
 
-        if msg_type == "set_core_context":
-            lines = data.get("data") or []
-            if isinstance(lines, list):
-                _write_core_lines([str(ln).strip() for ln in lines if str(ln).strip()])
-                await ws.send(json.dumps({"type": "core_context_updated"}))
-            continue
 
-        if msg_type == "add_highlight":
-            text = data.get("data") or ""
-            if text:
-                entries = _read_highlights()
-                entries.append(
-                    {
-                        "start_at": datetime.now().isoformat(),
-                        "stop_at": datetime.now().isoformat(),
-                        "highlight": str(text),
-                    }
-                )
-                _write_highlights(entries)
-                await ws.send(json.dumps({"type": "highlight_added"}))
-            continue
+@dispatcher.route("get_metrics")
+async def _handle_get_metrics(ws, data):
+    await send(ws, {"type": "metrics", "data": metrics.snapshot()})
 
-        if msg_type == "delete_highlight":
-            try:
-                idx = int(data.get("data"))
-                entries = _read_highlights()
-                if 0 <= idx < len(entries):
-                    entries.pop(idx)
-                    _write_highlights(entries)
-                    await ws.send(json.dumps({"type": "highlight_deleted"}))
-            except Exception as exc:
-                logger.error(f"Failed to delete highlight: {exc}")
-            continue
 
-        if msg_type == "set_calendar":
-            ics_text = data.get("data") or ""
-            try:
-                path = pathlib.Path("user_context/events.ics")
-                path.parent.mkdir(parents=True, exist_ok=True)
-                path.write_text(ics_text, encoding="utf-8")
-                await ws.send(json.dumps({"type": "calendar_updated"}))
-            except Exception as exc:
-                logger.error(f"Failed to update calendar: {exc}")
-            continue
+@dispatcher.route("profile", schema={"action": str})
+async def _handle_profile(ws, data):
+    """Admin: start/stop the sampling profiler; stop returns the folded-stack file path."""
+    token = os.getenv("ADMIN_TOKEN")
+    if not token:
+        # Without a configured token there is no admin; SIGUSR2 still works locally.
+        await send(ws, {"type": "error", "message": "Profiling over the websocket requires ADMIN_TOKEN"})
+        return
+    if not hmac.compare_digest(str(data.get("token", "")), token):
+        await send(ws, {"type": "error", "message": "Not authorized"})
+        return
+    action = data["action"].lower()
+    if action == "start":
+        started = diagnostics.profiler.start()
+        await send(ws, {"type": "profile", "running": True, "started": started})
+    elif action == "stop":
+        path = await asyncio.to_thread(diagnostics.profiler.stop)
+        await send(ws, {"type": "profile", "running": False, "path": path})
+    else:
+        await send(ws, {"type": "error", "message": "Invalid profile action"})
 
-        if msg_type == "set_event_context":
-            # Expect data: { summary, start, end, context }
-            payload = data.get("data") or {}
-            try:
-                summary = payload.get("summary", "")
-                start = payload.get("start", "")
-                end = payload.get("end", "")
-                ctx = payload.get("context", "")
-                if summary and start and end:
-                    ctx_map = _load_event_contexts()
-                    key = f"{summary}|{start}|{end}"
-                    ctx_map[key] = ctx
-                    _save_event_contexts(ctx_map)
-                    await ws.send(json.dumps({"type": "event_context_updated"}))
-            except Exception as exc:
-                logger.error(f"Failed to set event context: {exc}")
-            continue
 
-        if msg_type == "stop_conversation":
-            state = conversation_state.get(ws) or active_session or {"history": [], "start_at": datetime.now()}
-            history = state.get("history", [])
-            start_at = state.get("start_at", datetime.now())
-            stop_at = datetime.now()
-            session_id = state.get("session_id")
-            highlight_text = await asyncio.to_thread(_summarize_history, history)
+def _awaiting_selection(state: dict) -> bool:
+    """Options are shown and unanswered; lapses PAUSE_TIMEOUT after the turn, as the sender's pause does."""
+    if not state.get("awaiting_selection"):
+        return False
+    return time.monotonic() - state.get("turn_started_at", 0.0) <= PAUSE_TIMEOUT
 
-            try:
-                log_path = pathlib.Path("user_context/conversation_highlights.log")
-                record = {
-                    "start_at": start_at.isoformat(),
-                    "stop_at": stop_at.isoformat(),
-                    "highlight": highlight_text,
-                }
-                log_path.parent.mkdir(parents=True, exist_ok=True)
-                with log_path.open("a", encoding="utf-8") as f:
-                    f.write(json.dumps(record) + "\n")
-            except Exception as exc:
-                logger.error(f"Failed to write conversation highlight: {exc}")
-
-            conversation_state[ws] = {
-                "active": False,
-                "history": [],
-                "start_at": None,
-                "schedule_context": "",
-                "core_context": "",
-                "session_id": None,
-                "event_context": "",
-                "speaking": False,
+
+@dispatcher.route("sender_hello")
+async def _handle_sender_hello(ws, data):
+    """Tell a (re)connecting sender whether to stay paused (TTS or pending selection)."""
+    state = active_session or {}
+    if state.get("speaking"):
+        reason = "speaking"
+    elif _awaiting_selection(state):
+        reason = "awaiting_selection"
+    else:
+        reason = None
+    logger.info(f"Sender connected ({data.get('client', 'unknown')}); paused={reason is not None}")
+    await send(ws, {"type": "sender_state", "paused": reason is not None, "reason": reason})
+
+
+async def _get_audio_pool() -> AudioIngestPool:
+    global audio_pool
+    if audio_pool is None:
+        audio_pool = AudioIngestPool(on_transcript=lambda ws, text: _handle_audio_image(ws, {"audio_data": text}))
+        await audio_pool.start()
+    return audio_pool
+
+
+@dispatcher.fallback(lambda data: "audio_pcm" in data)
+async def _handle_audio_frame(ws, data):
+    """Queue streamed audio for server-side VAD/STT (AUDIO_INGEST=server)."""
+    if not server_ingest_enabled():
+        logger.warning("Received raw audio frame but server-side STT is disabled.")
+        await send(ws, {"type": "error", "message": "Audio frames not supported"})
+        return
+    state = conversation_state.get(ws) or active_session
+    if not state or not state.get("active"):
+        if audio_pool is not None:
+            audio_pool.set_paused(ws, True)
+        return
+    try:
+        sample_rate = int(data.get("sample_rate", 16000))
+    except (TypeError, ValueError):
+        await send(ws, {"type": "error", "message": "Invalid sample_rate"})
+        return
+    pool = await _get_audio_pool()
+    # Same rule as the mic sender: nothing heard during TTS or option selection is a new utterance.
+    pool.set_paused(ws, bool(state.get("speaking")) or _awaiting_selection(state))
+    pool.submit(ws, data["audio_pcm"], str(data.get("codec", "pcm")).lower(), sample_rate)
+
+
+@dispatcher.fallback(lambda data: "audio_data" in data or "image_data" in data)
+async def _handle_audio_image(ws, data):
+    """Handle incoming context (audio/image)."""
+    state = conversation_state.get(ws) or active_session
+    if not state or not state.get("active"):
+        logger.warning("Received audio/image without an active conversation.")
+        await send(ws, {"type": "error", "message": "Conversation not started"})
+        return
+    if state.get("speaking"):
+        logger.info("Dropping audio input while TTS is in progress.")
+        await send(ws, {"type": "error", "message": "TTS in progress"})
+        return
+
+    context = create_context(data)
+    state["turn"] = turn = state.get("turn", 0) + 1
+    state["turn_started_at"] = time.monotonic()
+    state.setdefault("history", []).append(
+        {
+            "timestamp": asyncio.get_event_loop().time(),
+            "role": "addressee",
+            "text": context.audio_text,
+        }
+    )
+    _append_conversation_log(
+        {
+            "session_id": state.get("session_id"),
+            "timestamp": datetime.now().isoformat(),
+            "role": "addressee",
+            "text": context.audio_text,
+        }
+    )
+    # Near-identical camera frames with the same utterance reuse the previous response.
+    signature = None
+    cached_response = None
+    if context.image is not None:
+        scene_cache = state.setdefault("scene_cache", SceneCache())
+        image = context.image
+        if isinstance(image, (memoryview, bytearray)):
+            image = bytes(image)  # binary frames arrive as memoryviews, which cannot be pickled
+        try:
+            signature = await cpu_executor.run(frame_signature, image)
+        except Exception as exc:
+            logger.warning(f"Frame hashing failed ({exc}); answering without the scene cache.")
+        if signature is not None:
+            cached_response = scene_cache.match(signature, context.audio_text)
+
+    if cached_response is not None:
+        logger.info("Scene unchanged; reusing previous response without an LLM call.")
+        context.response = cached_response
+        success = True
+    else:
+        if quick_replies is not None and context.audio_text:
+            await _send_provisional_options(state, context.audio_text)
+        # Registers the prefix in the background if it is missing or about to expire;
+        # until then this turn sends the prefix inline.
+        _warm_prompt_cache(state)
+        query = context.audio_text or _last_addressee_text(state.get("history", []))
+        memory_text = await io_executor.run(_retrieve_memories, query, state.get("session_id"))
+        started = time.monotonic()
+        success = await io_executor.run(
+            set_response,
+            context,
+            state.get("history"),
+            state.get("schedule_context", ""),
+            state.get("core_context", ""),
+            state.get("event_context", ""),
+            memory_text,
+        )
+        recorder.backend(
+            "llm",
+            ok=success,
+            response=context.response,
+            source=context.source,
+            fallback_reason=context.fallback_reason,
+            seconds=time.monotonic() - started,
+        )
+        if context.source == "fallback":
+            logger.warning(f"Sending fallback options: {context.fallback_reason}")
+        elif success and signature is not None:
+            state["scene_cache"].add(signature, context.audio_text, context.response)
+
+    if state.get("answered_turn") == turn:
+        logger.info("User already picked a provisional option this turn; dropping LLM options.")
+    elif success:
+        opts = _normalize_options(context.response)
+        for client in clients:
+            options_map[client] = opts
+        state["history"].append(
+            {
+                "timestamp": asyncio.get_event_loop().time(),
+                "role": "assistant_options",
+                "text": opts,
             }
-            active_session = None
-            options_map[ws] = []
-            try:
-                await ws.send(json.dumps({"type": "conversation_highlight", "data": highlight_text}))
-                await ws.send(json.dumps({"type": "conversation_stopped"}))
-            except Exception as exc:
-                logger.error(f"Failed to send conversation summary: {exc}")
-            await _stop_mic_sender()
-            continue
+        )
+        state["awaiting_selection"] = True
+        await broadcast(clients, {"type": "options", "data": opts})
+    else:
+        logger.error("Failed to get response from LLM.")
+        await broadcast(clients, {"type": "error", "message": "Could not generate options"})
 
-        # Handle selection messages.
-        if msg_type == "select":
-            selection_raw = data.get("data") or data.get("selection")
-            try:
-                idx = int(selection_raw) - 1
-                logger.info(f"User selected option index: {idx}")
-                opts = options_map.get(ws, [])
-                logger.info(f"Available options: {opts}")
-                if idx < 0 or idx >= len(opts):
-                    raise ValueError("Selection out of bounds")
-                selected = opts[idx]
-                logger.info(f"User selected option: {selected}")
-                if not isinstance(selected, str) or not selected.strip():
-                    raise ValueError("Empty selection")
-                state = conversation_state.get(ws) or active_session
-                if not state:
-                    raise ValueError("No active conversation for selection")
-                state.setdefault("history", []).append(
-                    {"timestamp": asyncio.get_event_loop().time(), "role": "user", "text": selected}
-                )
-                _append_conversation_log(
-                    {
-                        "session_id": state.get("session_id"),
-                        "timestamp": datetime.now().isoformat(),
-                        "role": "user",
-                        "text": selected,
-                    }
-                )
-                state["speaking"] = True
-            except Exception:
-                try:
-                    await ws.send(json.dumps({"type": "error", "message": "Invalid selection"}))
-                except Exception as exc:
-                    logger.error(f"Failed to send selection error: {exc}")
-                continue
 
-            # Send selection back immediately, then perform TTS in the background to avoid blocking/ping timeouts.
-            try:
-                for client in list(clients):
-                    await client.send(json.dumps({"type": "selected", "data": selected}))
-            except Exception as exc:
-                logger.error(f"Failed to send selected response: {exc}")
-                continue
+async def _send_provisional_options(state: dict, utterance: str):
+    """Broadcast quick replies learned from past selections; the LLM's options replace them."""
+    started = time.perf_counter()
+    try:
+        opts = await asyncio.to_thread(quick_replies.provisional_options, utterance)
+    except Exception as exc:
+        logger.error(f"Quick reply lookup failed: {exc}")
+        return
+    metrics.observe("quick_replies.seconds", time.perf_counter() - started)
+    if not opts:
+        return
+    metrics.incr("quick_replies.served")
+    for client in clients:
+        options_map[client] = opts
+    state["awaiting_selection"] = True
+    await broadcast(clients, {"type": "options", "data": opts, "provisional": True})
 
-            try:
-                # Run TTS without blocking the event loop.
-                logger.info(f"Performing TTS for selection: {selected}")
-                async def _run_tts():
-                    try:
-                        await asyncio.to_thread(speak_openai, selected)
-                    finally:
-                        state["speaking"] = False
-                        for client in list(clients):
-                            try:
-                                await client.send(json.dumps({"type": "tts_done"}))
-                                await client.send(json.dumps({"type": "resume_listening"}))
-                            except Exception as exc_inner:
-                                logger.error(f"Failed to send tts_done: {exc_inner}")
-                asyncio.create_task(_run_tts())
-            except Exception as exc:
-                logger.error(f"TTS failed: {exc}")
-                try:
-                    await ws.send(json.dumps({"type": "error", "message": "TTS failed"}))
-                except Exception as send_exc:
-                    logger.error(f"Failed to send TTS error: {send_exc}")
-            continue
 
-        # Handle incoming context (audio/image).
-        if "audio_data" in data.keys() or "image_data" in data.keys():
-            state = conversation_state.get(ws) or active_session
-            if not state or not state.get("active"):
-                logger.warning("Received audio/image without an active conversation.")
-                try:
-                    await ws.send(json.dumps({"type": "error", "message": "Conversation not started"}))
-                except Exception as exc:
-                    logger.error(f"Failed to send conversation not started error: {exc}")
+async def handle_hololens(ws):
+    """Receive messages from HoloLens clients."""
+    async for message in ws:
+        if isinstance(message, (bytes, bytearray)):
+            # Binary envelope: JSON header + raw image/audio bytes (see docs/message_formats.md).
+            try:
+                data = decode_frame(message)
+            except ValueError as exc:
+                logger.warning(f"Dropping malformed binary frame: {exc}")
+                await send(ws, {"type": "error", "message": "Invalid binary frame"})
                 continue
-            if state.get("speaking"):
-                logger.info("Dropping audio input while TTS is in progress.")
-                try:
-                    await ws.send(json.dumps({"type": "error", "message": "TTS in progress"}))
-                except Exception as exc:
-                    logger.error(f"Failed to send TTS-in-progress error: {exc}")
+        else:
+            try:
+                data = codec.loads(message)
+            except ValueError as exc:
+                logger.warning(f"Dropping malformed JSON message: {exc}")
+                await send(ws, {"type": "error", "message": "Invalid JSON"})
                 continue
 
-            context = create_context(data)
-            state.setdefault("history", []).append(
-                {
-                    "timestamp": asyncio.get_event_loop().time(),
-                    "role": "addressee",
-                    "text": context.audio_text,
-                }
-            )
-            _append_conversation_log(
-                {
-                    "session_id": state.get("session_id"),
-                    "timestamp": datetime.now().isoformat(),
-                    "role": "addressee",
-                    "text": context.audio_text,
-                }
-            )
-            success = await asyncio.to_thread(
-                set_response,
-                context,
-                state.get("history"),
-                state.get("schedule_context", ""),
-                state.get("core_context", ""),
-                state.get("event_context", ""),
-            )
-
-            if success:
-                opts = _normalize_options(context.response)
-                for client in list(clients):
-                    try:
-                        options_map[client] = opts
-                        if client == ws:
-                            state["history"].append(
-                                {
-                                    "timestamp": asyncio.get_event_loop().time(),
-                                    "role": "assistant_options",
-                                    "text": opts,
-                                }
-                            )
-                        await client.send(json.dumps({"type": "options", "data": opts}))
-                    except Exception as exc:
-                        logger.error(f"Failed to send options to client {client}: {exc}")
-            else:
-                logger.error("Failed to get response from LLM.")
-            continue
-
-        logger.warning(f"Received a message with unknown type from HoloLens: {data}")
+        recorder.inbound(data)
+        if not await dispatcher.dispatch(ws, data):
+            logger.warning(f"Received a message with unknown type from HoloLens: {data}")
 
 
 async def handler(ws):
@@ -593,6 +841,8 @@ async def handler(ws):
         await handle_hololens(ws)
     finally:
         clients.remove(ws)
+        if audio_pool is not None:
+            await audio_pool.close_session(ws)
         options_map.pop(ws, None)
         conversation_state.pop(ws, None)
         logger.info(f"HoloLens disconnected: {ws.remote_address}")
@@ -605,10 +855,19 @@ async def main():
         8765,
         ping_interval=30,
         ping_timeout=180,  # allow longer LLM/TTS cycles before timing out
+        max_size=MAX_FRAME_BYTES,  # binary camera frames can exceed the 1 MiB default
     )
     logger.info("Server running on ws://0.0.0.0:8765")
+    diagnostics.monitor.start()
+    diagnostics.install_signal_handler(asyncio.get_running_loop())
 
-    await server.wait_closed()
+    try:
+        await server.wait_closed()
+    finally:
+        await store.flush()
+        if audio_pool is not None:
+            await audio_pool.aclose()
+        executors.shutdown()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,155 @@
+"""
+Write-behind persistence for user_context files.
+
+`set(path, text)` updates an in-memory copy that readers see immediately
+(`get(path)`), and schedules one write for the path after a short window,
+so a burst of edits from the frontend costs a single rewrite. Writes run in
+a worker thread and are atomic: the text goes to a temp file in the same
+directory, is fsynced, then renamed over the original, so a crash leaves
+either the old or the new file, never a truncated one.
+
+Appends to a file with a pending rewrite are folded into the in-memory
+copy; otherwise they go straight to disk under the same per-path lock as
+the rewrites, so an append cannot land on a file that is being replaced.
+"""
+
+import asyncio
+import logging
+import os
+import pathlib
+import tempfile
+import threading
+
+PERSIST_COALESCE_SECONDS = float(os.getenv("PERSIST_COALESCE_SECONDS", "0.25"))
+RETRY_SECONDS = 5.0  # after a failed write; the text stays in memory meanwhile
+
+logger = logging.getLogger(__name__)
+
+
+def write_atomic(path: str, text: str):
+    target = pathlib.Path(path)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix=f".{target.name}.", suffix=".tmp", dir=target.parent)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, target)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+class WriteBehindStore:
+    def __init__(self, delay: float = PERSIST_COALESCE_SECONDS):
+        self.delay = delay
+        self._lock = threading.Lock()
+        self._pending = {}  # path -> (generation, text) not yet on disk
+        self._generation = 0
+        self._timers = {}  # path -> asyncio.TimerHandle
+        self._file_locks = {}  # path -> threading.Lock serializing disk writes
+        self._tasks = set()
+        self.writes = 0
+        self.coalesced = 0
+
+    def _file_lock(self, path: str) -> threading.Lock:
+        with self._lock:
+            return self._file_locks.setdefault(path, threading.Lock())
+
+    def get(self, path: str) -> str | None:
+        """The pending text for path, or None if the file on disk is current."""
+        with self._lock:
+            entry = self._pending.get(path)
+        return entry[1] if entry else None
+
+    def pending_generation(self, path: str) -> int | None:
+        with self._lock:
+            entry = self._pending.get(path)
+        return entry[0] if entry else None
+
+    def set(self, path: str, text: str):
+        """Replace the file's content; written to disk after the coalescing window."""
+        with self._lock:
+            if path in self._pending:
+                self.coalesced += 1
+            self._generation += 1
+            self._pending[path] = (self._generation, text)
+        self._schedule(path)
+
+    async def append(self, path: str, text: str):
+        with self._lock:
+            entry = self._pending.get(path)
+            if entry is not None:
+                self._generation += 1
+                self._pending[path] = (self._generation, entry[1] + text)
+        if entry is not None:
+            self._schedule(path)
+            return
+        await asyncio.to_thread(self._append_now, path, text)
+
+    def _append_now(self, path: str, text: str):
+        with self._file_lock(path):
+            # A rewrite may have been scheduled while we waited for the lock.
+            with self._lock:
+                entry = self._pending.get(path)
+                if entry is not None:
+                    self._generation += 1
+                    self._pending[path] = (self._generation, entry[1] + text)
+                    return
+            target = pathlib.Path(path)
+            target.parent.mkdir(parents=True, exist_ok=True)
+            with target.open("a", encoding="utf-8") as f:
+                f.write(text)
+
+    def _schedule(self, path: str, delay: float | None = None):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if path in self._timers:
+                return
+            self._timers[path] = loop.call_later(self.delay if delay is None else delay, self._start_flush, path)
+
+    def _start_flush(self, path: str):
+        task = asyncio.get_running_loop().create_task(self.flush(path))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def flush(self, path: str | None = None):
+        """Write pending text now (for one path, or all)."""
+        if path is None:
+            with self._lock:
+                paths = list(self._pending)
+            for p in paths:
+                await self.flush(p)
+            return
+        with self._lock:
+            timer = self._timers.pop(path, None)
+        if timer is not None:
+            timer.cancel()
+        if not await asyncio.to_thread(self._flush_now, path):
+            self._schedule(path, RETRY_SECONDS)
+
+    def _flush_now(self, path: str) -> bool:
+        with self._file_lock(path):
+            with self._lock:
+                entry = self._pending.get(path)
+            if entry is None:
+                return True
+            generation, text = entry
+            try:
+                write_atomic(path, text)
+            except Exception as exc:
+                logger.error(f"Failed to write {path}: {exc}")
+                return False
+            self.writes += 1
+            with self._lock:
+                # Keep newer text set during the write; its own timer writes it.
+                if self._pending.get(path, (None,))[0] == generation:
+                    del self._pending[path]
+            return True
+
+
+store = WriteBehindStore()
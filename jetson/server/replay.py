@@ -0,0 +1,315 @@
+"""
+Replay a recorded session against the server and compare per-turn latency.
+
+    python -m jetson.server.replay user_context/recordings/<session>.jsonl
+    python -m jetson.server.replay --from-log user_context/conversation_logs.log --session <session_id>
+
+The server (jetson.server.main) runs in-process on a local port, inside a
+scratch copy of user_context/ so the replay does not touch real logs. The
+recorded inbound messages are sent in order; gaps between them (the
+addressee talking, the user choosing) are divided by --speed, and a
+selection waits for options and the next utterance waits for TTS to finish,
+as on the device.
+
+Backends (--backends):
+    recorded  LLM, summary and TTS return the recorded results after the
+              recorded durations, so latency differences come from the server
+    stub      instant canned options; measures server overhead only
+    live      real Gemini/OpenAI calls
+
+A turn's latency is the time from an utterance/frame to its final (non
+provisional) options or error. Recordings from --from-log have no timings
+of their own, so only the replay column is filled.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import websockets
+
+from jetson.server.binary_frames import MAX_FRAME_BYTES, PAYLOAD_KEYS, encode_frame
+from jetson.server.session_recorder import decode, load_recording
+
+PAYLOAD_KINDS = {key: kind for kind, key in PAYLOAD_KEYS.items()}
+TURN_TIMEOUT = 60.0  # seconds to wait for options / TTS before moving on
+
+
+def events_from_log(log_path: str, session_id: str) -> list[dict]:
+    """Build replay events from conversation_logs.log (utterances and selections)."""
+    records = []
+    with open(log_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(record, dict) and record.get("session_id") == session_id:
+                records.append(record)
+    if not records:
+        raise SystemExit(f"No records for session {session_id} in {log_path}")
+    t0 = datetime.fromisoformat(records[0]["timestamp"])
+    events = [{"t": 0.0, "dir": "in", "msg": {"type": "start_conversation"}}]
+    t = 0.0
+    for record in records:
+        t = max(t, (datetime.fromisoformat(record["timestamp"]) - t0).total_seconds())
+        if record.get("role") == "addressee":
+            events.append({"t": t, "dir": "in", "msg": {"audio_data": record.get("text", "")}})
+        elif record.get("role") == "user":
+            # The log has the chosen text, not its index; match it against the replayed options.
+            events.append({"t": t, "dir": "in", "msg": {"type": "select", "data": 1}, "select_text": record.get("text")})
+    events.append({"t": t + 1.0, "dir": "in", "msg": {"type": "stop_conversation"}})
+    return events
+
+
+def is_turn(msg) -> bool:
+    return isinstance(msg, dict) and ("audio_data" in msg or "image_data" in msg)
+
+
+def turn_latencies(events: list[dict]) -> list[dict]:
+    """Per turn: utterance, seconds to provisional options (if any) and to final options/error."""
+    turns = []
+    current = None
+    for event in events:
+        msg = event.get("msg")
+        if event.get("dir") == "in" and is_turn(msg):
+            current = {"t": event["t"], "text": str(msg.get("audio_data") or "[image]"), "provisional": None, "final": None}
+            turns.append(current)
+        elif event.get("dir") == "out" and current is not None and isinstance(msg, dict):
+            if msg.get("type") == "options" and msg.get("provisional"):
+                if current["provisional"] is None:
+                    current["provisional"] = event["t"] - current["t"]
+            elif msg.get("type") in ("options", "error") and current["final"] is None:
+                current["final"] = event["t"] - current["t"]
+                current["status"] = msg.get("type")
+    return turns
+
+
+def patch_backends(server, mode: str, events: list[dict], speed: float):
+    """Replace the server's LLM/summary/TTS calls according to --backends."""
+    async def _noop():
+        return None
+
+    server._start_mic_sender = _noop
+    server._stop_mic_sender = _noop
+    if mode == "live":
+        return
+    server.warm_prompt_cache = lambda *args, **kwargs: None
+    recorded = {"llm": [], "summary": [], "tts": []}
+    for event in events:
+        if event.get("dir") == "backend" and event.get("kind") in recorded:
+            recorded[event["kind"]].append(event)
+
+    def next_event(kind: str) -> dict | None:
+        if mode == "recorded" and recorded[kind]:
+            event = recorded[kind].pop(0)
+            time.sleep(event.get("seconds", event.get("synth_seconds", 0.0)))
+            return event
+        return None
+
+    def set_response(context, *args, **kwargs):
+        event = next_event("llm")
+        if event is None:
+            context.response = ["Yes, that sounds good.", "No, thank you.", "Could you say that again?"]
+            context.source = "stub"
+            return True
+        context.response = event.get("response")
+        context.source = event.get("source")
+        context.fallback_reason = event.get("fallback_reason")
+        return bool(event.get("ok"))
+
+    def summarize(history):
+        event = next_event("summary")
+        return event.get("text", "") if event else "Replayed session."
+
+    def synthesize(text, *args, **kwargs):
+        event = next_event("tts")
+        return event.get("play_seconds", 0.0) if event else 0.0
+
+    def play(play_seconds):
+        # Playback is idle time for the user, so it is compressed like the gaps.
+        time.sleep(play_seconds / speed)
+
+    server.set_response = set_response
+    server._summarize_history = summarize
+    server.synthesize_openai = synthesize
+    server.play_wav = play
+
+
+class ReplayClient:
+    def __init__(self, url: str, speed: float):
+        self.url = url
+        self.speed = speed
+        self.events = []  # replayed timeline, same shape as a recording
+        self._started = 0.0
+        self._options = []
+        self._options_event = asyncio.Event()
+        self._final_event = asyncio.Event()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._stopped = asyncio.Event()
+
+    def _now(self) -> float:
+        return time.monotonic() - self._started
+
+    async def _recv(self, ws):
+        async for raw in ws:
+            try:
+                msg = json.loads(raw)
+            except ValueError:
+                continue
+            self.events.append({"t": self._now(), "dir": "out", "msg": msg})
+            kind = msg.get("type") if isinstance(msg, dict) else None
+            if kind == "options":
+                self._options = msg.get("data") or []
+                self._options_event.set()
+                if not msg.get("provisional"):
+                    self._final_event.set()
+            elif kind == "tts_done":
+                self._idle.set()
+            elif kind == "conversation_stopped":
+                self._stopped.set()
+
+    async def _send(self, ws, event: dict):
+        msg = decode(event["msg"])
+        if isinstance(msg, dict) and msg.get("type") == "select":
+            # Pick from the final options if that is what the user originally saw.
+            ready = self._final_event if event.get("after_final") else self._options_event
+            await self._wait(ready.wait(), "options")
+            text = event.get("select_text")
+            if text in self._options:
+                msg = {**msg, "data": self._options.index(text) + 1}
+            self._options_event.clear()
+            self._final_event.clear()
+            self._idle.clear()
+        elif is_turn(msg):
+            await self._wait(self._idle.wait(), "TTS to finish")
+            self._options_event.clear()
+            self._final_event.clear()
+        self.events.append({"t": self._now(), "dir": "in", "msg": event["msg"]})
+        binary = [key for key, value in msg.items() if isinstance(value, bytes)] if isinstance(msg, dict) else []
+        if binary:
+            header = {k: v for k, v in msg.items() if k != binary[0]}
+            await ws.send(encode_frame(header, msg[binary[0]], PAYLOAD_KINDS.get(binary[0], "image")))
+        else:
+            await ws.send(json.dumps(msg))
+
+    async def _wait(self, awaitable, what: str):
+        try:
+            await asyncio.wait_for(awaitable, TURN_TIMEOUT)
+        except asyncio.TimeoutError:
+            print(f"[replay] Timed out waiting for {what}; continuing", file=sys.stderr)
+
+    async def run(self, events: list[dict]):
+        final_seen = False
+        for event in events:
+            msg = event.get("msg")
+            if event.get("dir") == "out" and isinstance(msg, dict) and msg.get("type") == "options":
+                final_seen = final_seen or not msg.get("provisional")
+            elif event.get("dir") == "in" and is_turn(msg):
+                final_seen = False
+            elif event.get("dir") == "in" and isinstance(msg, dict) and msg.get("type") == "select":
+                event["after_final"] = final_seen
+        inbound = [e for e in events if e.get("dir") == "in"]
+        async with websockets.connect(self.url, max_size=MAX_FRAME_BYTES) as ws:
+            recv_task = asyncio.create_task(self._recv(ws))
+            self._started = time.monotonic()
+            previous_t, previous_sent = 0.0, 0.0
+            for event in inbound:
+                # Keep the recorded gap after the previous message (scaled), counted from when it was sent.
+                delay = (event["t"] - previous_t) / self.speed - (self._now() - previous_sent)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                await self._send(ws, event)
+                previous_t, previous_sent = event["t"], self._now()
+            if any(isinstance(e["msg"], dict) and e["msg"].get("type") == "stop_conversation" for e in inbound):
+                await self._wait(self._stopped.wait(), "conversation_stopped")
+            else:
+                await asyncio.sleep(1.0)
+            recv_task.cancel()
+
+
+def _ms(value) -> str:
+    return "-" if value is None else f"{value * 1000:.0f}"
+
+
+def report(original: list[dict], replayed: list[dict]) -> tuple[float | None, float | None]:
+    print(f"{'turn':>4}  {'original ms':>11}  {'replay ms':>9}  {'delta ms':>8}  {'quick ms':>8}  utterance")
+    for i, turn in enumerate(replayed):
+        before = original[i]["final"] if i < len(original) else None
+        after = turn["final"]
+        delta = None if before is None or after is None else after - before
+        print(
+            f"{i + 1:>4}  {_ms(before):>11}  {_ms(after):>9}  {_ms(delta):>8}  "
+            f"{_ms(turn['provisional']):>8}  {turn['text'][:50]}"
+        )
+    medians = []
+    for name, turns in (("original", original), ("replay", replayed)):
+        values = sorted(t["final"] for t in turns if t["final"] is not None)
+        if not values:
+            medians.append(None)
+            continue
+        p95 = values[min(len(values) - 1, int(len(values) * 0.95))]
+        medians.append(statistics.median(values))
+        print(f"{name:>8}: p50 {_ms(medians[-1])} ms, p95 {_ms(p95)} ms over {len(values)} turns")
+    return medians[0], medians[1]
+
+
+async def replay(events: list[dict], backends: str, speed: float, port: int):
+    from jetson.server import main as server  # imported after chdir; it opens logs relative to cwd
+
+    patch_backends(server, backends, events, speed)
+    async with websockets.serve(server.handler, "127.0.0.1", port, max_size=MAX_FRAME_BYTES):
+        client = ReplayClient(f"ws://127.0.0.1:{port}", speed)
+        await client.run(events)
+    await server.store.flush()
+    return client.events
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a recorded session and compare per-turn latency.")
+    parser.add_argument("recording", nargs="?", help="Session recording (.jsonl) written with RECORD_SESSIONS=1")
+    parser.add_argument("--from-log", help="Build the session from conversation_logs.log instead")
+    parser.add_argument("--session", help="session_id to take from --from-log")
+    parser.add_argument("--backends", choices=("recorded", "stub", "live"), default="recorded")
+    parser.add_argument("--speed", type=float, default=1.0, help="Divide the gaps between messages by this")
+    parser.add_argument("--port", type=int, default=8799)
+    parser.add_argument("--workdir", help="Run in this directory instead of a scratch copy of user_context/")
+    parser.add_argument("--max-regression", type=float, help="Exit 1 if the replay p50 exceeds the original by this fraction")
+    args = parser.parse_args()
+
+    if args.from_log:
+        if not args.session:
+            parser.error("--from-log needs --session")
+        events = events_from_log(args.from_log, args.session)
+    elif args.recording:
+        events = load_recording(args.recording)
+    else:
+        parser.error("give a recording or --from-log")
+    if args.speed <= 0:
+        parser.error("--speed must be positive")
+
+    workdir = args.workdir
+    if workdir is None:
+        workdir = tempfile.mkdtemp(prefix="replay-")
+        if os.path.isdir("user_context"):
+            shutil.copytree("user_context", os.path.join(workdir, "user_context"), ignore=shutil.ignore_patterns("recordings"))
+    os.chdir(workdir)
+    print(f"[replay] {len(events)} events, backends={args.backends}, speed={args.speed}x, workdir={workdir}")
+
+    replayed = asyncio.run(replay(events, args.backends, args.speed, args.port))
+    base, new = report(turn_latencies(events), turn_latencies(replayed))
+    if args.max_regression is not None and base and new and new > base * (1 + args.max_regression):
+        print(f"[replay] p50 regressed by {(new / base - 1) * 100:.0f}%", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
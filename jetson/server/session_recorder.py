@@ -0,0 +1,134 @@
+"""
+Record conversation sessions for replay (see jetson/server/replay.py).
+
+With RECORD_SESSIONS=1, every conversation (start_conversation to
+stop_conversation) is written to RECORDINGS_DIR/<session_id>.jsonl, one
+event per line, timed from the start of the session:
+
+    {"t": 0.0, "dir": "header", "session_id": "...", "started_at": "..."}
+    {"t": 1.52, "dir": "in", "msg": {...}}            inbound websocket message
+    {"t": 3.08, "dir": "out", "msg": {...}}           outbound message
+    {"t": 3.07, "dir": "backend", "kind": "llm", ...} LLM / summary / TTS result
+
+The session_id is the same one used in conversation_logs.log. Binary
+payloads (camera frames, audio) are stored as {"$b64": "..."}.
+"""
+
+import base64
+import json
+import logging
+import os
+import pathlib
+import re
+import threading
+import time
+from datetime import datetime
+
+RECORD_SESSIONS = os.getenv("RECORD_SESSIONS", "0") == "1"
+RECORDINGS_DIR = os.getenv("RECORDINGS_DIR", "user_context/recordings")
+
+logger = logging.getLogger(__name__)
+
+
+def _encode(value):
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return {"$b64": base64.b64encode(value).decode("ascii")}
+    if isinstance(value, dict):
+        return {k: _encode(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_encode(v) for v in value]
+    return value
+
+
+def decode(value):
+    """Inverse of the recorder's encoding: {"$b64": ...} back to bytes."""
+    if isinstance(value, dict):
+        if set(value) == {"$b64"}:
+            return base64.b64decode(value["$b64"])
+        return {k: decode(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [decode(v) for v in value]
+    return value
+
+
+class SessionRecorder:
+    def __init__(self, enabled: bool = RECORD_SESSIONS, out_dir: str = RECORDINGS_DIR):
+        self.enabled = enabled
+        self.out_dir = out_dir
+        self._file = None
+        self._started = 0.0
+        self._lock = threading.Lock()
+        self.path = None
+
+    @property
+    def active(self) -> bool:
+        return self._file is not None
+
+    def start(self, session_id: str, first_message: dict | None = None):
+        """Begin a recording (closing any previous one)."""
+        if not self.enabled:
+            return
+        self.stop()
+        name = re.sub(r"[^0-9A-Za-z_.-]", "-", session_id)
+        path = pathlib.Path(self.out_dir) / f"{name}.jsonl"
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            file = path.open("w", encoding="utf-8", buffering=1 << 16)
+        except OSError as exc:
+            logger.error(f"Cannot record session to {path}: {exc}")
+            return
+        with self._lock:
+            self._file = file
+            self._started = time.monotonic()
+            self.path = str(path)
+        self._write({"dir": "header", "session_id": session_id, "started_at": datetime.now().isoformat()})
+        if first_message is not None:
+            self.inbound(first_message)
+        logger.info(f"Recording session to {path}")
+
+    def stop(self):
+        with self._lock:
+            file, self._file = self._file, None
+        if file is not None:
+            file.close()
+
+    def _write(self, event: dict):
+        with self._lock:
+            if self._file is None:
+                return
+            event = {"t": round(time.monotonic() - self._started, 4), **event}
+            try:
+                self._file.write(json.dumps(_encode(event)) + "\n")
+            except (TypeError, ValueError, OSError) as exc:
+                logger.warning(f"Dropped recording event: {exc}")
+
+    def inbound(self, message):
+        if self._file is not None:
+            self._write({"dir": "in", "msg": message})
+
+    def outbound(self, message):
+        if self._file is not None:
+            if isinstance(message, str):
+                try:
+                    message = json.loads(message)
+                except ValueError:
+                    pass
+            self._write({"dir": "out", "msg": message})
+
+    def backend(self, kind: str, **fields):
+        if self._file is not None:
+            self._write({"dir": "backend", "kind": kind, **fields})
+
+
+def load_recording(path: str) -> list[dict]:
+    events = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                events.append(json.loads(line))
+            except ValueError:
+                continue
+    return events
+
+
+recorder = SessionRecorder()
@@ -18,18 +18,16 @@ def speak(text: str):
     tts.runAndWait()
 
 
-def speak_openai(
+def synthesize_openai(
     text: str,
     voice: str = "ash",
     model: str = "gpt-4o-mini-tts",
     silence_sec: float = 0.3,
-):
+) -> bytes:
     """
-    Generate speech via OpenAI TTS and play it immediately.
+    Generate speech via OpenAI TTS and return it as WAV bytes.
 
     Requires OPENAI_API_KEY in the environment.
-    Uses a temporary WAV and plays with afplay (macOS) or aplay (Linux);
-    if no player is available, the file path is printed.
     """
     api_key = os.getenv("OPENAI_API_KEY")
     if not api_key:
@@ -53,13 +51,25 @@ def speak_openai(
     silence_frames = int(framerate * silence_sec)
     silence_bytes = b"\x00" * silence_frames * n_channels * sampwidth
 
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as out:
+        out.setnchannels(n_channels)
+        out.setsampwidth(sampwidth)
+        out.setframerate(framerate)
+        out.writeframes(silence_bytes + frames)
+    return buf.getvalue()
+
+
+def play_wav(wav_bytes: bytes):
+    """
+    Play WAV bytes, blocking until playback ends.
+
+    Uses a temporary WAV and plays with afplay (macOS) or aplay (Linux);
+    if no player is available, the file path is printed.
+    """
     with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as tmp:
         tmp_path = tmp.name
-        with wave.open(tmp, "wb") as out:
-            out.setnchannels(n_channels)
-            out.setsampwidth(sampwidth)
-            out.setframerate(framerate)
-            out.writeframes(silence_bytes + frames)
+        tmp.write(wav_bytes)
 
     player = None
     if shutil.which("afplay"):
@@ -77,3 +87,13 @@ def speak_openai(
             os.remove(tmp_path)
         except OSError:
             pass
+
+
+def speak_openai(
+    text: str,
+    voice: str = "ash",
+    model: str = "gpt-4o-mini-tts",
+    silence_sec: float = 0.3,
+):
+    """Generate speech via OpenAI TTS and play it immediately."""
+    play_wav(synthesize_openai(text, voice, model, silence_sec))
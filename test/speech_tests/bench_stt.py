@@ -0,0 +1,120 @@
+"""
+STT benchmark: word error rate vs. latency per backend on recorded clips.
+
+Expects a directory of mono 16-bit WAV clips, each with a reference
+transcript next to it (clip01.wav + clip01.txt).
+
+Usage:
+    PYTHONPATH=. python test/speech_tests/bench_stt.py <clips_dir> [--backends whisper,pocketsphinx,google_web]
+
+Cloud backends need their API keys (OPENAI_API_KEY for Whisper) and network access.
+"""
+
+import argparse
+import asyncio
+import pathlib
+import re
+import statistics
+import time
+
+from jetson.context.transcription import (
+    GoogleWebBackend,
+    PocketSphinxBackend,
+    WhisperBackend,
+    read_wav_pcm,
+)
+
+BACKENDS = {
+    "whisper": WhisperBackend,
+    "pocketsphinx": PocketSphinxBackend,
+    "google_web": GoogleWebBackend,
+}
+
+
+def _words(text: str) -> list[str]:
+    return re.findall(r"[a-z0-9']+", text.lower())
+
+
+def word_error_rate(reference: str, hypothesis: str) -> float:
+    """(substitutions + deletions + insertions) / reference words, via edit distance."""
+    ref, hyp = _words(reference), _words(hypothesis)
+    if not ref:
+        return 0.0 if not hyp else 1.0
+    prev = list(range(len(hyp) + 1))
+    for i, r in enumerate(ref, start=1):
+        cur = [i] + [0] * len(hyp)
+        for j, h in enumerate(hyp, start=1):
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (r != h))
+        prev = cur
+    return prev[-1] / len(ref)
+
+
+def _load_clips(clips_dir: pathlib.Path) -> list[tuple[str, bytes, int, str]]:
+    clips = []
+    for wav_path in sorted(clips_dir.glob("*.wav")):
+        ref_path = wav_path.with_suffix(".txt")
+        if not ref_path.exists():
+            print(f"Skipping {wav_path.name}: no reference transcript")
+            continue
+        pcm, rate = read_wav_pcm(str(wav_path))
+        clips.append((wav_path.name, pcm, rate, ref_path.read_text(encoding="utf-8").strip()))
+    return clips
+
+
+async def bench_backend(backend, clips) -> dict:
+    await backend.warmup()
+    wers, latencies = [], []
+    for name, pcm, rate, reference in clips:
+        start = time.perf_counter()
+        try:
+            hypothesis = await backend.transcribe(pcm, rate)
+        except Exception as exc:
+            print(f"  {backend.name} failed on {name}: {exc}")
+            continue
+        latency = time.perf_counter() - start
+        wer = word_error_rate(reference, hypothesis)
+        wers.append(wer)
+        latencies.append(latency)
+        print(f"  {backend.name:<13} {name:<24} WER {wer:5.1%}  {latency * 1000:7.0f} ms  '{hypothesis}'")
+    await backend.aclose()
+    if not latencies:
+        return {}
+    latencies.sort()
+    return {
+        "clips": len(latencies),
+        "wer": statistics.mean(wers),
+        "p50": latencies[len(latencies) // 2],
+        "p95": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Compare STT backends on recorded clips.")
+    parser.add_argument("clips_dir", help="Directory with <clip>.wav and <clip>.txt pairs.")
+    parser.add_argument("--backends", default="whisper,pocketsphinx", help="Comma-separated backend names.")
+    args = parser.parse_args()
+
+    clips = _load_clips(pathlib.Path(args.clips_dir))
+    if not clips:
+        print("No clips found.")
+        return
+
+    results = {}
+    for name in args.backends.split(","):
+        name = name.strip()
+        if name not in BACKENDS:
+            print(f"Unknown backend '{name}' (choose from {', '.join(BACKENDS)})")
+            continue
+        print(f"Running {name} on {len(clips)} clips...")
+        results[name] = await bench_backend(BACKENDS[name](), clips)
+
+    print(f"\n{'backend':<14}{'clips':>6}{'WER':>9}{'p50 ms':>10}{'p95 ms':>10}")
+    for name, res in results.items():
+        if not res:
+            print(f"{name:<14}{'-':>6}")
+            continue
+        print(f"{name:<14}{res['clips']:>6}{res['wer']:>9.1%}{res['p50'] * 1000:>10.0f}{res['p95'] * 1000:>10.0f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())